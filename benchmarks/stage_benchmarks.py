@@ -0,0 +1,261 @@
+# benchmarks/stage_benchmarks.py
+"""
+Stage-level benchmarks on synthetic surveys.
+
+Each pipeline stage is timed and memory-profiled (tracemalloc peak) at the
+requested sizes, using a deterministic stub embedder so nothing has to be
+downloaded: BERTopic only gets its precomputed embeddings. Stages whose
+modules are not installed (e.g. the spaCy model or BERTopic) are recorded as
+skipped; any other failure is recorded as an error, and the run exits
+non-zero. Every run is appended to a JSON history and compared with the
+previous run of the same size.
+
+    python -m benchmarks.stage_benchmarks --sizes 1000 100000 1000000
+"""
+
+import argparse
+import datetime
+import hashlib
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import traceback
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+HISTORY_PATH = "benchmarks/history.json"
+DEFAULT_SIZES = (1_000, 100_000, 1_000_000)
+
+
+class StubEmbedder:
+    """
+    Offline stand-in for a SentenceTransformer: each text maps to a fixed
+    unit vector derived from its hash, so equal texts get equal embeddings.
+    """
+
+    def __init__(self, dim=64):
+        self.dim = dim
+
+    def encode(self, texts, show_progress_bar=False, **kwargs):
+        embeddings = np.empty((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.blake2b(str(text).encode("utf-8"), digest_size=8).digest(), "little")
+            embeddings[i] = np.random.default_rng(seed).standard_normal(self.dim)
+        return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def _stand_in_topics(embeddings, n_topics=8, seed=0):
+    """Nearest of n_topics random directions, used when BERTopic cannot be fitted."""
+    directions = np.random.default_rng(seed).standard_normal((n_topics, embeddings.shape[1]))
+    return np.argmax(embeddings @ directions.T, axis=1)
+
+
+def _missing_modules(modules):
+    return [module for module in modules if importlib.util.find_spec(module) is None]
+
+
+class StageTimer:
+    """
+    Runs stages, recording seconds and peak traced memory for each.
+
+    A stage whose required modules are not installed is skipped; a stage
+    that raises is recorded as an error with its traceback. Either way run
+    returns None so later stages can fall back.
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.results = {}
+
+    def run(self, name, func, *args, requires=(), **kwargs):
+        missing = _missing_modules(requires)
+        if missing:
+            self.results[name] = {"status": "skipped", "reason": f"not installed: {', '.join(missing)}"}
+            return None
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            value = func(*args, **kwargs)
+        except Exception as e:
+            self.results[name] = {"status": "error", "reason": f"{type(e).__name__}: {e}"[:200],
+                                  "traceback": traceback.format_exc()}
+            return None
+        finally:
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] if self.trace_memory else 0
+            if self.trace_memory:
+                tracemalloc.stop()
+        self.results[name] = {"status": "ok", "seconds": round(seconds, 4),
+                              "peak_mb": round(peak / 2**20, 2)}
+        return value
+
+
+def _plot(cube, topic_words, output_dir):
+    import matplotlib
+    matplotlib.use("Agg")
+    from src.visualization import InsightVisualizer
+
+    viz = InsightVisualizer(output_dir=output_dir)
+    viz.plot_topic_distribution(cube)
+    viz.plot_region_topic_heatmap(cube)
+    viz.plot_group_insights(cube)
+    viz.generate_wordclouds(cube, topic_words)
+
+
+def benchmark_size(n, seed=0, trace_memory=True):
+    """Run every stage on n synthetic rows; returns {stage: result}."""
+    from src.modeling import deduplicate_docs, preprocess_texts, train_topic_model, topic_keywords
+    from src.post_process_topic_model import assign_topics_to_docs, summarize_topics
+    from src.preprocessing import clean_responses
+    from src.synthetic_data_generator import generate_dataset
+    from src.topic_cube import TopicCube
+
+    timer = StageTimer(trace_memory=trace_memory)
+    df = timer.run("generate", generate_dataset, n, seed=seed, duplicate_rate=0.2)
+    clean = timer.run("clean", clean_responses, df["response"])
+
+    def lemmatize():
+        # Same as TextPipeline.transform after cleaning: each distinct text once
+        codes, uniques = pd.factorize(clean)
+        lemmas = np.asarray(preprocess_texts(uniques), dtype=object)
+        return pd.Series(lemmas[codes], index=clean.index)
+
+    tokens = timer.run("lemmatize", lemmatize, requires=("spacy", "es_core_news_sm"))
+    if tokens is None:
+        tokens = clean
+
+    embedding_docs, inverse, counts = timer.run("deduplicate", deduplicate_docs, clean)
+    first_rows = np.unique(inverse, return_index=True)[1]
+    docs = tokens.to_numpy()[first_rows].tolist()
+
+    embedder = StubEmbedder()
+    embeddings = timer.run("embed", embedder.encode, embedding_docs)
+
+    # The stub only embeds; train_topic_model hands BERTopic embedding_model=None
+    # for non-transformer backends, so nothing is downloaded
+    fitted = timer.run("fit", train_topic_model, docs, model_name="stub", requires=("bertopic",),
+                       embeddings=embeddings, weights=counts, embedding_model=embedder)
+    if fitted is not None:
+        _, topics, probs = fitted
+    else:
+        topics = _stand_in_topics(embeddings)
+        probs = np.ones(len(topics), dtype=np.float32)
+
+    def keywords():
+        from sklearn.feature_extraction.text import CountVectorizer
+        vectorizer = CountVectorizer(min_df=2, max_df=0.95).fit(docs)
+        return topic_keywords(docs, topics, vectorizer, weights=counts)
+
+    topic_words = timer.run("keywords", keywords) or {}
+
+    def post_process():
+        df_with_topics = assign_topics_to_docs(df, topics, probs, inverse=inverse)
+        summarize_topics(df_with_topics)
+        return df_with_topics
+
+    df_with_topics = timer.run("post_process", post_process)
+    cube = timer.run("aggregate", TopicCube.from_frame, df_with_topics)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        weighted_words = {topic: [(word, 1.0) for word in words] for topic, words in topic_words.items()}
+        timer.run("plot", _plot, cube, weighted_words, output_dir, requires=("matplotlib", "wordcloud"))
+    return timer.results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path=HISTORY_PATH):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(current, previous, threshold=1.2):
+    """Stages at least threshold times slower than in previous, as {stage: ratio}."""
+    regressions = {}
+    for stage, result in current.items():
+        before = previous.get(stage, {})
+        if result.get("status") == "ok" and before.get("status") == "ok" and before["seconds"] > 0:
+            ratio = result["seconds"] / before["seconds"]
+            if ratio >= threshold:
+                regressions[stage] = round(ratio, 2)
+    return regressions
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, history_path=HISTORY_PATH, seed=0, trace_memory=True,
+                   threshold=1.2):
+    """Benchmark each size, append the run to the history and return (run, regressions)."""
+    history = load_history(history_path)
+    run = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "seed": seed,
+        "results": {},
+    }
+    regressions = {}
+    for n in sizes:
+        results = benchmark_size(n, seed=seed, trace_memory=trace_memory)
+        run["results"][str(n)] = results
+        previous = next((past["results"][str(n)] for past in reversed(history)
+                         if str(n) in past["results"]), None)
+        if previous is not None:
+            slower = compare(results, previous, threshold)
+            if slower:
+                regressions[str(n)] = slower
+
+    history.append(run)
+    os.makedirs(os.path.dirname(history_path) or ".", exist_ok=True)
+    with open(history_path, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=2)
+    return run, regressions
+
+
+def _print_run(run, regressions):
+    for n, results in run["results"].items():
+        print(f"\n{int(n):,} rows")
+        for stage, result in results.items():
+            if result["status"] == "ok":
+                flag = f"  ⚠️ {regressions[n][stage]}x slower" if stage in regressions.get(n, {}) else ""
+                print(f"  {stage:<14} {result['seconds']:9.3f}s {result['peak_mb']:9.1f} MB{flag}")
+            else:
+                print(f"  {stage:<14} {result['status']} ({result['reason']})")
+                if result["status"] == "error":
+                    print(result["traceback"])
+
+
+def failed_stages(run):
+    return [f"{n}:{stage}" for n, results in run["results"].items()
+            for stage, result in results.items() if result["status"] == "error"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time and memory-profile each pipeline stage")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--history", default=HISTORY_PATH, help="JSON file the run is appended to")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="Skip tracemalloc (faster, no peak_mb)")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="Slowdown ratio against the previous run that counts as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    run, regressions = run_benchmarks(args.sizes, args.history, args.seed,
+                                      trace_memory=not args.no_memory, threshold=args.threshold)
+    _print_run(run, regressions)
+    if failed_stages(run) or (regressions and args.fail_on_regression):
+        raise SystemExit(1)
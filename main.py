@@ -1,43 +1,326 @@
-from src.modeling import train_topic_model
+from src.modeling import (DEFAULT_EMBEDDING_MODEL, document_strata, fit_on_sample, load_topic_model,
+                          model_fingerprint, train_topic_model, save_topic_model)
+from src.assignment import assign_wave
+from src.pipeline import run_pipeline
+from src.text_pipeline import TextPipeline
+from src.incremental import AnalysisState
+from src.table_io import FORMATS, table_path, write_table
+from src.instrumentation import span, tracer
+from src.similarity_index import SimilarityIndex, build_index
+from src.segmented import fit_segments, save_segments
+from src.service import run_service
+from src.sweep import HDBSCAN_PARAMS, UMAP_PARAMS, VECTORIZER_PARAMS, sweep
 from src.post_process_topic_model import extract_topic_info, assign_topics_to_docs, summarize_topics
 import pandas as pd
+import argparse
+import logging
 import os
 
-def main():
+logger = logging.getLogger("surveynlp")
+
+def main(output_format="csv", trace_dir="outputs/traces", sample_size=None, holdout_size=1000,
+         model_name=DEFAULT_EMBEDDING_MODEL, min_topic_size=5, min_df=2, max_df=0.95, dedup=False):
     try:
         # Create output directory
         os.makedirs("outputs", exist_ok=True)
 
-        # Read the synthetic survey data
+        # Read the synthetic survey data and clean, tokenize and lemmatize it once
         print("Loading data...")
-        df = pd.read_csv("data/raw/survey_data.csv")
-        
+        with span("load") as s:
+            pipeline = TextPipeline()
+            df = pipeline.load("data/raw/survey_data.csv")
+            s.rows = len(df)
+
+        # Collapse repeated responses so each distinct text is embedded once
+        with span("deduplicate", rows=len(df)):
+            embedding_docs, docs, inverse, counts = TextPipeline.unique_documents(df)
+        print(f"Deduplicated {len(df)} responses into {len(docs)} unique documents")
+
         # Train the topic model
         print("Training topic model...")
-        topic_model, topics, probs = train_topic_model(df["response"].tolist())
+        with span("fit", rows=len(docs)):
+            if sample_size is not None and sample_size < len(docs):
+                # Fit on a stratified sample and assign the rest by nearest centroid
+                strata = document_strata(df[["region", "group", "question"]], inverse)
+                topic_model, topics, probs, report = fit_on_sample(
+                    docs, strata, sample_size, holdout_size=holdout_size, embedding_docs=embedding_docs,
+                    cache_dir="data/cache/embeddings", weights=counts, model_name=model_name,
+                    stop_words=pipeline.stop_words, min_topic_size=min_topic_size, min_df=min_df, max_df=max_df
+                )
+                print(f"Fitted on {report['sample_size']} of {report['documents']} documents; "
+                      f"held-out agreement {report['agreement']}")
+                topics_inverse = inverse
+            else:
+                # Clustering sees every row unless dedup is asked for: distinct
+                # documents alone lose the weight of repeated answers
+                topic_model, topics, probs = train_topic_model(
+                    docs, embedding_docs=embedding_docs, cache_dir="data/cache/embeddings",
+                    weights=counts if dedup else None, inverse=None if dedup else inverse,
+                    model_name=model_name, stop_words=pipeline.stop_words, min_topic_size=min_topic_size,
+                    min_df=min_df, max_df=max_df
+                )
+                topics_inverse = inverse if dedup else None
 
         # Get labeled data
         print("Processing results...")
-        df_with_topics = assign_topics_to_docs(df, topics, probs)
+        with span("post_process", rows=len(df)):
+            df_with_topics = assign_topics_to_docs(df, topics, probs, inverse=topics_inverse)
 
-        # Extract topic-word mappings
-        topic_info = extract_topic_info(topic_model)
+            # Extract topic-word mappings
+            topic_info = extract_topic_info(topic_model)
 
-        # Create basic summaries
-        topic_summaries = summarize_topics(df_with_topics)
+            # Create basic summaries
+            topic_summaries = summarize_topics(df_with_topics)
+
+        # Aggregate counts once for all distribution tables and plots
+        with span("aggregate", rows=len(df_with_topics)):
+            analysis_state = AnalysisState(fingerprint=model_fingerprint(topic_model)).update(df_with_topics)
+            topic_cube = analysis_state.cube
 
         # Save results
         print("Saving results...")
-        topic_info.to_csv("outputs/topic_info.csv", index=False)
-        df_with_topics.to_csv("outputs/df_with_topics.csv", index=False)
-        topic_summaries.to_csv("outputs/topic_summaries.csv", index=False)
+        with span("save", format=output_format):
+            write_table(topic_info, table_path("topic_info", output_format))
+            write_table(df_with_topics, table_path("df_with_topics", output_format))
+            write_table(topic_summaries, table_path("topic_summaries", output_format))
+            analysis_state.save()
+            save_topic_model(topic_model)
+
+        # Index the fitted documents for "responses like this one" queries
+        with span("similarity_index", rows=len(docs)):
+            build_index(topic_model, embedding_docs, df_with_topics, inverse,
+                        cache_dir="data/cache/embeddings", pipeline=pipeline).save()
         
         print("✅ Topic modeling completed successfully!")
-        
+
+        # Run additional analysis
+        print("\nRunning topic analysis...")
+        with span("analysis", rows=len(df_with_topics)):
+            from src.topic_analysis import run_analysis
+            run_analysis(df=df_with_topics, cube=topic_cube)
+        return 0
     except FileNotFoundError as e:
-        print(f"❌ Error: Input file not found - {e}")
+        logger.error(f"❌ Error: Input file not found - {e}")
+        return 1
     except Exception as e:
-        print(f"❌ Error: {str(e)}")
+        logger.exception(f"❌ Error: {type(e).__name__}: {e}")
+        return 1
+    finally:
+        _export_trace(trace_dir, "fit")
+
+def assign(input_path, output_format="csv", trace_dir="outputs/traces"):
+    """Label newly arrived responses with the saved model, without refitting."""
+    try:
+        print(f"Assigning topics to {input_path}...")
+        output_path = table_path("df_with_topics", output_format)
+        with span("assign") as s:
+            topic_model = load_topic_model()
+            df_new = assign_wave(input_path, output_path=output_path, topic_model=topic_model)
+            s.rows = len(df_new)
+        print(f"✅ Appended {len(df_new)} labeled responses to {output_path}")
+
+        # Fold just the new rows into the saved aggregates
+        with span("analysis", rows=len(df_new)):
+            from src.topic_analysis import run_incremental_analysis
+            run_incremental_analysis(df_new, output_path, fingerprint=model_fingerprint(topic_model))
+        return 0
+    except FileNotFoundError as e:
+        logger.error(f"❌ Error: Input file not found - {e}")
+        return 1
+    except Exception as e:
+        logger.exception(f"❌ Error: {type(e).__name__}: {e}")
+        return 1
+    finally:
+        _export_trace(trace_dir, "assign")
+
+def segments(by=("question",), n_jobs=None, min_docs=10, output_format="csv", model_name=DEFAULT_EMBEDDING_MODEL,
+             trace_dir="outputs/traces"):
+    """Fit one topic model per segment, embedding the responses only once."""
+    try:
+        print(f"Fitting one topic model per {' x '.join(by)}...")
+        pipeline = TextPipeline()
+        df = pipeline.load("data/raw/survey_data.csv")
+        embedding_docs, docs, inverse, counts = TextPipeline.unique_documents(df)
+        df_with_topics, segment_topics, failed = fit_segments(
+            df, embedding_docs, docs, inverse, by=by, model_name=model_name,
+            cache_dir="data/cache/embeddings", n_jobs=n_jobs, min_docs=min_docs, stop_words=pipeline.stop_words
+        )
+        save_segments(df_with_topics, segment_topics, output_format)
+        print(f"✅ {segment_topics['Segment'].nunique()} segment models with "
+              f"{len(segment_topics)} topics saved to outputs/segments")
+        for slug, error in failed.items():
+            logger.error(f"❌ Segment {slug} failed, its responses are labeled -1: {error}")
+        return 1 if failed else 0
+    except FileNotFoundError as e:
+        logger.error(f"❌ Error: Input file not found - {e}")
+        return 1
+    except Exception as e:
+        logger.exception(f"❌ Error: {type(e).__name__}: {e}")
+        return 1
+    finally:
+        _export_trace(trace_dir, "segments")
+
+def tune(grid, n_jobs=None, output_format="csv", model_name=DEFAULT_EMBEDDING_MODEL, trace_dir="outputs/traces"):
+    """Score a grid of UMAP, HDBSCAN and vectorizer settings, embedding and reducing only once each."""
+    try:
+        print(f"Sweeping {', '.join(f'{key}={values}' for key, values in grid.items())}...")
+        pipeline = TextPipeline()
+        df = pipeline.load("data/raw/survey_data.csv")
+        embedding_docs, docs, inverse, counts = TextPipeline.unique_documents(df)
+        results = sweep(docs, grid, embedding_docs=embedding_docs, weights=counts, model_name=model_name,
+                        cache_dir="data/cache/embeddings", n_jobs=n_jobs, stop_words=pipeline.stop_words)
+        output_path = table_path("sweep_results", output_format)
+        write_table(results, output_path)
+        print(results.sort_values("coherence", ascending=False).head(10).to_string(index=False))
+        print(f"✅ {len(results)} configurations scored, results saved to {output_path}")
+        return 0
+    except FileNotFoundError as e:
+        logger.error(f"❌ Error: Input file not found - {e}")
+        return 1
+    except Exception as e:
+        logger.exception(f"❌ Error: {type(e).__name__}: {e}")
+        return 1
+    finally:
+        _export_trace(trace_dir, "sweep")
+
+def _number(value):
+    """Integer if written as one (an absolute count for min_df/max_df), float otherwise."""
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+def search(texts, k=10, n_probe=None, **filters):
+    """Print the responses most similar to each text, with their metadata."""
+    try:
+        results = SimilarityIndex.load().query(texts, k=k, n_probe=n_probe, **filters)
+        print(results.to_string(index=False))
+        return 0
+    except FileNotFoundError as e:
+        logger.error(f"❌ Error: {e}")
+        return 1
+
+def _export_trace(trace_dir, run_name):
+    """Write the spans of this run as JSON lines and a Chrome trace."""
+    if trace_dir and tracer.records:
+        log_path, trace_path = tracer.export(trace_dir, run_name)
+        print(f"Stage timings written to {log_path} and {trace_path}")
+
+def _add_fit_arguments(parser):
+    """Clustering and vectorizer settings of a single fit; see the sweep command to compare them."""
+    parser.add_argument("--min-topic-size", type=int, default=HDBSCAN_PARAMS["min_topic_size"],
+                        help="HDBSCAN minimum cluster size")
+    parser.add_argument("--min-df", type=_number, default=VECTORIZER_PARAMS["min_df"],
+                        help="Vectorizer min_df per topic (integers count topics, floats are shares)")
+    parser.add_argument("--max-df", type=_number, default=VECTORIZER_PARAMS["max_df"],
+                        help="Vectorizer max_df per topic")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Cluster each distinct response once (faster, but repeated answers lose their weight)")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Topic modeling pipeline for survey responses")
+    parser.add_argument("--format", choices=FORMATS, default="csv",
+                        help="Format of the output tables (parquet keeps categorical dtypes)")
+    parser.add_argument("--embedding-model", default=DEFAULT_EMBEDDING_MODEL,
+                        help='Sentence-transformers model, or "hashing" for fast local n-gram embeddings')
+    parser.add_argument("--trace-dir", default="outputs/traces",
+                        help="Directory for per-stage timing logs and Chrome traces (empty to disable)")
+    subparsers = parser.add_subparsers(dest="command")
+    fit_parser = subparsers.add_parser("fit", help="Refit the topic model on the full survey (default)")
+    fit_parser.add_argument("--sample-size", type=int, default=None,
+                            help="Fit on a stratified sample of this many documents and assign the rest by centroid")
+    fit_parser.add_argument("--holdout-size", type=int, default=1000,
+                            help="Unsampled documents used to check centroid assignment against the model")
+    _add_fit_arguments(fit_parser)
+    assign_parser = subparsers.add_parser(
+        "assign", help="Label new responses with the saved model and append them to the outputs"
+    )
+    assign_parser.add_argument("input", help="CSV with the new responses")
+    search_parser = subparsers.add_parser(
+        "search", help="Find responses similar to a text using the index saved by the last fit"
+    )
+    search_parser.add_argument("text", nargs="+", help="Query text(s)")
+    search_parser.add_argument("-k", type=int, default=10, help="Number of responses per query")
+    search_parser.add_argument("--n-probe", type=int, default=None,
+                               help="IVF lists to scan for approximate search on large indexes")
+    search_parser.add_argument("--region", default=None, help="Only return responses from this region")
+    search_parser.add_argument("--group", default=None, help="Only return responses from this group")
+    segments_parser = subparsers.add_parser(
+        "segments", help="Fit one topic model per question (or other segments) in parallel"
+    )
+    segments_parser.add_argument("--by", nargs="+", default=["question"],
+                                 choices=["question", "region", "group"], help="Columns defining the segments")
+    segments_parser.add_argument("--jobs", type=int, default=None, help="Parallel fits (default: all cores)")
+    segments_parser.add_argument("--min-docs", type=int, default=10,
+                                 help="Segments with fewer distinct responses are not modeled")
+    sweep_parser = subparsers.add_parser(
+        "sweep", help="Compare clustering and vectorizer settings, reusing embeddings and reductions"
+    )
+    sweep_parser.add_argument("--n-neighbors", type=int, nargs="+", help="UMAP neighbourhood sizes")
+    sweep_parser.add_argument("--n-components", type=int, nargs="+", help="UMAP output dimensions")
+    sweep_parser.add_argument("--min-dist", type=float, nargs="+", help="UMAP minimum distances")
+    sweep_parser.add_argument("--min-topic-size", type=int, nargs="+", help="HDBSCAN minimum cluster sizes")
+    sweep_parser.add_argument("--min-samples", type=int, nargs="+", help="HDBSCAN min_samples")
+    sweep_parser.add_argument("--cluster-selection-method", nargs="+", choices=["eom", "leaf"])
+    sweep_parser.add_argument("--min-df", type=_number, nargs="+",
+                              help="Vectorizer min_df per topic (integers count topics, floats are shares)")
+    sweep_parser.add_argument("--max-df", type=_number, nargs="+", help="Vectorizer max_df per topic")
+    sweep_parser.add_argument("--jobs", type=int, default=None, help="Parallel clusterings (default: all cores)")
+    serve_parser = subparsers.add_parser(
+        "serve", help="Label responses posted over HTTP with the saved model, in micro-batches"
+    )
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8080)
+    serve_parser.add_argument("--max-batch", type=int, default=64, help="Largest micro-batch")
+    serve_parser.add_argument("--max-wait-ms", type=float, default=20,
+                              help="Longest a response waits for its batch to fill")
+    serve_parser.add_argument("--max-queue", type=int, default=10_000,
+                              help="Most responses waiting at once; requests beyond it get 503")
+    pipeline_parser = subparsers.add_parser(
+        "pipeline", help="Run the cached stage graph, skipping stages whose inputs are unchanged"
+    )
+    pipeline_parser.add_argument("--force", nargs="*", default=[], metavar="STAGE",
+                                 help="Stages to rerun even if cached")
+    _add_fit_arguments(pipeline_parser)
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    main()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args = parse_args()
+    status = 0
+    if args.command == "assign":
+        status = assign(args.input, output_format=args.format, trace_dir=args.trace_dir)
+    elif args.command == "segments":
+        status = segments(by=args.by, n_jobs=args.jobs, min_docs=args.min_docs, output_format=args.format,
+                          model_name=args.embedding_model, trace_dir=args.trace_dir)
+    elif args.command == "sweep":
+        grid = {key: values for key, values in vars(args).items()
+                if key in (*UMAP_PARAMS, *HDBSCAN_PARAMS, *VECTORIZER_PARAMS) and values}
+        status = tune(grid, n_jobs=args.jobs, output_format=args.format, model_name=args.embedding_model,
+                      trace_dir=args.trace_dir)
+    elif args.command == "serve":
+        try:
+            run_service(host=args.host, port=args.port, max_batch_size=args.max_batch, max_wait_ms=args.max_wait_ms,
+                        max_queue=args.max_queue)
+        except FileNotFoundError as e:
+            logger.error(f"❌ Error: {e}")
+            status = 1
+    elif args.command == "search":
+        filters = {key: value for key, value in (("region", args.region), ("group", args.group)) if value}
+        status = search(args.text, k=args.k, n_probe=args.n_probe, **filters)
+    elif args.command == "pipeline":
+        try:
+            run_pipeline(force=args.force, output_format=args.format, model_name=args.embedding_model,
+                         min_topic_size=args.min_topic_size, min_df=args.min_df, max_df=args.max_df,
+                         dedup=args.dedup)
+        finally:
+            _export_trace(args.trace_dir, "pipeline")
+    else:
+        status = main(output_format=args.format, trace_dir=args.trace_dir,
+                      sample_size=getattr(args, "sample_size", None), holdout_size=getattr(args, "holdout_size", 1000),
+                      model_name=args.embedding_model,
+                      min_topic_size=getattr(args, "min_topic_size", HDBSCAN_PARAMS["min_topic_size"]),
+                      min_df=getattr(args, "min_df", VECTORIZER_PARAMS["min_df"]),
+                      max_df=getattr(args, "max_df", VECTORIZER_PARAMS["max_df"]),
+                      dedup=getattr(args, "dedup", False))
+    raise SystemExit(status)
@@ -0,0 +1,28 @@
+# src/assignment.py
+
+from src.modeling import MODEL_PATH, assign_topics, load_topic_model
+from src.post_process_topic_model import assign_topics_to_docs
+from src.table_io import append_table
+from src.text_pipeline import TextPipeline
+
+
+def assign_wave(input_path, model_path=MODEL_PATH, output_path="outputs/df_with_topics.csv",
+                cache_dir="data/cache/embeddings", topic_model=None):
+    """
+    Label a new wave of responses with the saved topic model.
+
+    Only transform is run, so existing topic IDs do not change; the labeled
+    rows are appended to output_path (CSV or Parquet). Use a fit run to
+    refit the model. Pass topic_model to reuse an already loaded model
+    instead of loading model_path.
+    """
+    if topic_model is None:
+        topic_model = load_topic_model(model_path)
+
+    df = TextPipeline().load(input_path)
+    embedding_docs, docs, inverse, counts = TextPipeline.unique_documents(df)
+    topics, probs = assign_topics(topic_model, docs, embedding_docs=embedding_docs, cache_dir=cache_dir)
+
+    df_with_topics = assign_topics_to_docs(df, topics, probs, inverse=inverse)
+    append_table(df_with_topics, output_path)
+    return df_with_topics
@@ -0,0 +1,113 @@
+# src/embedding_backends.py
+"""
+Embedding backends selectable per run.
+
+A backend has a ``name`` (used as the embedding cache key and stored with
+the topic model) and a sentence-transformers style ``encode(texts)``
+returning one row per text. Backends that learn from the corpus also have
+``fit(texts)``; their name includes a fingerprint of the fitted state, so
+cached vectors from a differently fitted backend are never reused.
+
+    get_backend("all-MiniLM-L6-v2")  # transformer, downloaded on first use
+    get_backend("hashing")           # local hashed n-grams + truncated SVD
+"""
+
+import hashlib
+
+import numpy as np
+
+from src.resources import get_sentence_transformer
+
+HASHING = "hashing"
+
+
+class TransformerBackend:
+    """
+    A sentence-transformers model, loaded on first encode, so runs whose
+    embeddings all come from the cache never load it.
+    """
+
+    def __init__(self, model_name):
+        self.name = model_name
+
+    @property
+    def model(self):
+        return get_sentence_transformer(self.name)
+
+    def encode(self, texts, show_progress_bar=False, **kwargs):
+        return self.model.encode(texts, show_progress_bar=show_progress_bar, **kwargs)
+
+
+class HashingBackend:
+    """
+    CPU-only embeddings without any download: character n-grams hashed into
+    a fixed number of features, TF-IDF weighted and reduced with truncated
+    SVD to dense unit vectors.
+
+    The TF-IDF weights and SVD are fitted on at most fit_size texts; encoding
+    runs in batches of batch_size texts, so memory stays bounded.
+    """
+
+    def __init__(self, n_components=128, n_features=2**16, ngram_range=(4, 4),
+                 fit_size=50_000, batch_size=50_000, seed=0):
+        self.n_components = n_components
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self.fit_size = fit_size
+        self.batch_size = batch_size
+        self.seed = seed
+        self.name = None
+        self.tfidf_ = None
+        self.svd_ = None
+
+    @property
+    def fitted(self):
+        return self.svd_ is not None
+
+    def _hash(self, texts):
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        vectorizer = HashingVectorizer(
+            analyzer="char_wb", ngram_range=self.ngram_range, n_features=self.n_features,
+            alternate_sign=False, norm=None
+        )
+        return vectorizer.transform(texts)
+
+    def fit(self, texts):
+        from sklearn.decomposition import TruncatedSVD
+        from sklearn.feature_extraction.text import TfidfTransformer
+
+        texts = list(texts)
+        if len(texts) > self.fit_size:
+            rng = np.random.default_rng(self.seed)
+            texts = [texts[i] for i in np.sort(rng.choice(len(texts), self.fit_size, replace=False))]
+        counts = self._hash(texts)
+        self.tfidf_ = TfidfTransformer(sublinear_tf=True).fit(counts)
+        n_components = max(1, min(self.n_components, len(texts) - 1))
+        self.svd_ = TruncatedSVD(n_components, algorithm="randomized", random_state=self.seed)
+        self.svd_.fit(self.tfidf_.transform(counts))
+        # float32 halves the size of the backend pickled with the topic model
+        self.svd_.components_ = self.svd_.components_.astype(np.float32)
+
+        fingerprint = hashlib.sha1(self.svd_.components_.tobytes()).hexdigest()[:12]
+        self.name = f"{HASHING}-svd{n_components}-{fingerprint}"
+        return self
+
+    def encode(self, texts, show_progress_bar=False, **kwargs):
+        texts = list(texts)
+        if not self.fitted:
+            self.fit(texts)
+        embeddings = np.empty((len(texts), self.svd_.n_components), dtype=np.float32)
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            reduced = self.svd_.transform(self.tfidf_.transform(self._hash(batch)))
+            norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+            embeddings[start:start + len(batch)] = reduced / np.maximum(norms, 1e-12)
+        return embeddings
+
+
+def get_backend(name):
+    """The backend for a model name: "hashing" or a sentence-transformers model."""
+    if name == HASHING:
+        return HashingBackend()
+    return TransformerBackend(name)
@@ -0,0 +1,192 @@
+# src/embedding_cache.py
+
+import contextlib
+import hashlib
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+_WHITESPACE = re.compile(r"\s+")
+# A sha1 hex digest and its newline
+_KEY_LINE = 41
+_open_caches = {}
+_open_caches_lock = threading.Lock()
+
+
+def normalize_text(text: str) -> str:
+    """Normalize a document for hashing: lowercase and collapse whitespace."""
+    return _WHITESPACE.sub(" ", str(text).lower()).strip()
+
+
+def text_key(text: str) -> str:
+    """Content hash of the normalized text."""
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def _safe_name(model_name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding store keyed by (model name, normalized text hash).
+
+    Each model gets its own directory holding a raw float32 matrix
+    (``vectors.f32``, read back as a memory map), an append-only
+    ``keys.txt`` with the text hash of each row and ``meta.json`` with the
+    dimension. Writers hold a file lock and append vectors before keys, so
+    a row only counts once both are complete on disk; anything a crashed
+    writer left past the last complete row is truncated by the next one.
+    Appending costs time proportional to the new rows only, and so does
+    picking up rows other writers appended; use open_cache to keep one
+    instance per directory and model instead of re-reading the keys.
+    """
+
+    def __init__(self, cache_dir, model_name):
+        self.model_name = model_name
+        self.path = os.path.join(cache_dir, _safe_name(model_name))
+        self.vectors_path = os.path.join(self.path, "vectors.f32")
+        self.keys_path = os.path.join(self.path, "keys.txt")
+        self.meta_path = os.path.join(self.path, "meta.json")
+        self.dim = None
+        self.keys = []
+        self._rows = {}
+        self._thread_lock = threading.RLock()
+        self._refresh()
+
+    def __len__(self):
+        return len(self.keys)
+
+    @contextlib.contextmanager
+    def _lock(self):
+        """Exclusive lock between writers in any process."""
+        import fcntl
+
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _write_meta(self, dim):
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"model_name": self.model_name, "dim": dim}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _committed_rows(self):
+        """Rows whose hash and vector are both complete on disk."""
+        if not os.path.exists(self.keys_path) or not os.path.exists(self.vectors_path):
+            return 0
+        n_keys = os.path.getsize(self.keys_path) // _KEY_LINE
+        n_vectors = os.path.getsize(self.vectors_path) // (self.dim * 4)
+        return min(n_keys, n_vectors)
+
+    def _refresh(self):
+        """Pick up rows appended since the last read, by this or another process."""
+        if self.keys and self._committed_rows() < len(self.keys):
+            # The cache was deleted or replaced on disk; start over from it
+            self.dim, self.keys, self._rows = None, [], {}
+        if self.dim is None:
+            if not os.path.exists(self.meta_path):
+                return
+            with open(self.meta_path) as f:
+                self.dim = json.load(f)["dim"]
+        n_rows = self._committed_rows()
+        if n_rows <= len(self.keys):
+            return
+        with open(self.keys_path) as f:
+            f.seek(len(self.keys) * _KEY_LINE)
+            new_keys = f.read((n_rows - len(self.keys)) * _KEY_LINE).split()
+        for key in new_keys:
+            self._rows.setdefault(key, len(self.keys))
+            self.keys.append(key)
+
+    def _vectors(self):
+        if not self.keys:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return np.memmap(self.vectors_path, dtype=np.float32, mode="r",
+                         shape=(len(self.keys), self.dim))
+
+    def lookup(self, texts):
+        """
+        Returns (embeddings, missing) where missing lists the positions of
+        texts not yet in the cache. Rows for missing texts are left as zeros.
+        """
+        keys = [text_key(text) for text in texts]
+        with self._thread_lock:
+            self._refresh()
+            rows = [self._rows.get(key, -1) for key in keys]
+        missing = [i for i, row in enumerate(rows) if row < 0]
+        if self.dim is None:
+            return None, missing
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        hits = np.array([i for i, row in enumerate(rows) if row >= 0], dtype=np.int64)
+        if len(hits):
+            embeddings[hits] = self._vectors()[np.asarray(rows, dtype=np.int64)[hits]]
+        return embeddings, missing
+
+    def add(self, texts, embeddings):
+        """Append embeddings for texts that are not stored yet."""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._thread_lock, self._lock():
+            self._refresh()
+            if self.dim is None:
+                self.dim = embeddings.shape[1]
+                self._write_meta(self.dim)
+            elif embeddings.shape[1] != self.dim:
+                raise ValueError(
+                    f"Embedding dimension {embeddings.shape[1]} does not match cache dimension {self.dim}"
+                )
+
+            new_keys, new_rows = [], []
+            for i, text in enumerate(texts):
+                key = text_key(text)
+                if key not in self._rows:
+                    self._rows[key] = len(self.keys) + len(new_keys)
+                    new_keys.append(key)
+                    new_rows.append(i)
+            if not new_keys:
+                return
+
+            # Cut off whatever a crashed writer left after the last complete
+            # row, then append vectors before their keys
+            n_rows = len(self.keys)
+            for path, size, data in (
+                (self.vectors_path, n_rows * self.dim * 4, np.ascontiguousarray(embeddings[new_rows]).tobytes()),
+                (self.keys_path, n_rows * _KEY_LINE, "".join(f"{key}\n" for key in new_keys).encode("ascii")),
+            ):
+                with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                    f.truncate(size)
+                    f.seek(size)
+                    f.write(data)
+            self.keys.extend(new_keys)
+
+    def encode(self, texts, encode_fn):
+        """
+        Embed texts, calling encode_fn only for the ones missing from the cache.
+        """
+        texts = list(texts)
+        embeddings, missing = self.lookup(texts)
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            new_embeddings = np.asarray(encode_fn(missing_texts), dtype=np.float32)
+            self.add(missing_texts, new_embeddings)
+            if embeddings is None:
+                embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+            embeddings[missing] = new_embeddings
+        return embeddings
+
+
+def open_cache(cache_dir, model_name) -> EmbeddingCache:
+    """The process-wide EmbeddingCache for cache_dir and model_name, opened on first use."""
+    key = (os.path.abspath(cache_dir), model_name)
+    with _open_caches_lock:
+        if key not in _open_caches:
+            _open_caches[key] = EmbeddingCache(cache_dir, model_name)
+        return _open_caches[key]
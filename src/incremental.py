@@ -0,0 +1,214 @@
+# src/incremental.py
+"""
+Analysis results maintained incrementally as new waves are appended.
+
+AnalysisState holds everything run_analysis derives from the labeled
+responses, in a form that can be updated from the new rows alone:
+
+- a TopicCube of counts per (region, group, question, topic), merged with
+  the cube of each delta;
+- per-topic response counts and confidence sums, for running means;
+- a HyperLogLog sketch of the distinct responses of each topic, for the
+  diversity metric (about 1% relative error);
+- the current top-k responses of each topic, which are re-ranked together
+  with the delta rows.
+
+Each update costs time proportional to the delta plus the number of topics.
+The state records the fingerprint of the model whose labels it aggregates
+(see modeling.model_fingerprint); update_analysis rebuilds it from the full
+table when the model has been refitted since.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.post_process_topic_model import top_k_per_topic
+from src.table_io import read_table
+from src.topic_cube import TopicCube
+
+STATE_PATH = "outputs/analysis_state"
+# The only cube on disk, kept current by every fit and assign
+CUBE_PATH = os.path.join(STATE_PATH, "topic_cube.npz")
+
+
+class DistinctSketch:
+    """
+    HyperLogLog distinct counts for many keys (here topics) at once.
+
+    Each key has 2**precision one-byte registers; sketches of separate
+    batches merge by taking the register-wise maximum.
+    """
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = {}
+
+    def _hash(self, values):
+        hashes = pd.util.hash_array(np.asarray(values, dtype=object))
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.intp)
+        # Rank = position of the first set bit in the remaining 64 - precision bits
+        rest = hashes & np.uint64((1 << (64 - self.precision)) - 1)
+        high = (rest >> np.uint64(32)).astype(np.float64)
+        low = (rest & np.uint64(0xFFFFFFFF)).astype(np.float64)
+        bit_length = np.where(high > 0, np.frexp(high)[1] + 32, np.frexp(low)[1])
+        rank = (64 - self.precision) - bit_length + 1
+        return index, rank.astype(np.uint8)
+
+    def update(self, keys, values):
+        unique_keys, codes = np.unique(np.asarray(keys), return_inverse=True)
+        index, rank = self._hash(values)
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(unique_keys) + 1))
+        for key, start, stop in zip(unique_keys.tolist(), bounds[:-1], bounds[1:]):
+            rows = order[start:stop]
+            registers = self.registers.setdefault(key, np.zeros(1 << self.precision, dtype=np.uint8))
+            np.maximum.at(registers, index[rows], rank[rows])
+        return self
+
+    def estimate(self, key):
+        registers = self.registers.get(key)
+        if registers is None:
+            return 0.0
+        m = len(registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+        zeros = np.count_nonzero(registers == 0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)  # linear counting for small sets
+        return float(estimate)
+
+
+class AnalysisState:
+    """
+    Aggregates behind run_analysis, updatable from appended rows only.
+    fingerprint identifies the fit that labeled the rows, if known.
+    """
+
+    def __init__(self, top_n=3, fingerprint=None):
+        self.top_n = top_n
+        self.fingerprint = fingerprint
+        self.cube = None
+        self.stats = pd.DataFrame(columns=["size", "probability_sum", "probability_count"],
+                                  index=pd.Index([], dtype=np.int64), dtype=np.float64)
+        self.sketch = DistinctSketch()
+        self.top = pd.DataFrame(columns=["Topic", "response", "Topic_Probability", "row"])
+        self.rows_seen = 0
+
+    def update(self, delta: pd.DataFrame) -> "AnalysisState":
+        """Fold newly labeled rows into the state."""
+        if len(delta) == 0:
+            return self
+        cube = TopicCube.from_frame(delta)
+        self.cube = cube if self.cube is None else self.cube.merge(cube)
+
+        probability = pd.to_numeric(delta["Topic_Probability"], errors="coerce")
+        stats = probability.groupby(delta["Topic"].to_numpy()).agg(["size", "sum", "count"])
+        stats.columns = self.stats.columns
+        self.stats = self.stats.add(stats, fill_value=0)
+
+        self.sketch.update(delta["Topic"].to_numpy(), delta["response"].to_numpy())
+
+        # Re-rank the kept rows together with the delta; row numbers keep ties
+        # in the order a full recomputation would use
+        rows = pd.DataFrame({
+            "Topic": delta["Topic"].to_numpy(),
+            "response": delta["response"].to_numpy(),
+            "Topic_Probability": probability.to_numpy(),
+            "row": np.arange(self.rows_seen, self.rows_seen + len(delta)),
+        })
+        candidates = pd.concat([self.top, rows], ignore_index=True) if len(self.top) else rows
+        self.top = top_k_per_topic(candidates, k=self.top_n, tie_breaker="row").reset_index(drop=True)
+        self.rows_seen += len(delta)
+        return self
+
+    def regional_distribution(self) -> pd.DataFrame:
+        return self.cube.crosstab("region", normalize="index")
+
+    def topic_metrics(self) -> pd.DataFrame:
+        """Same table as topic_analysis.evaluate_topic_quality, diversity estimated."""
+        stats = self.stats.sort_index()
+        distinct = pd.Series([self.sketch.estimate(topic) for topic in stats.index], index=stats.index)
+        size = stats["size"].astype(np.int64)
+        metrics = pd.DataFrame({
+            "avg_probability": stats["probability_sum"] / stats["probability_count"],
+            "size": size,
+            # A sketch can overshoot slightly; a topic has at most size distinct responses
+            "diversity": np.minimum(distinct.round(), size) / size,
+        }).round(3)
+        metrics.index.name = "Topic"
+        return metrics
+
+    def representative_responses(self):
+        return self.top
+
+    def save(self, path=STATE_PATH):
+        os.makedirs(path, exist_ok=True)
+        self.cube.save(os.path.join(path, "topic_cube.npz"))
+        topics = np.asarray(sorted(self.sketch.registers))
+        np.savez_compressed(
+            os.path.join(path, "state.npz"),
+            stats_index=self.stats.index.to_numpy(dtype=np.int64),
+            stats=self.stats.to_numpy(dtype=np.float64),
+            sketch_topics=topics,
+            registers=np.stack([self.sketch.registers[t] for t in topics]) if len(topics)
+            else np.zeros((0, 1 << self.sketch.precision), dtype=np.uint8),
+            meta=np.array([self.top_n, self.rows_seen, self.sketch.precision]),
+            fingerprint=np.array(self.fingerprint or ""),
+            # The top responses are kept as arrays, not a CSV that would read
+            # responses such as "NA" or "" back as missing
+            top_topic=self.top["Topic"].to_numpy(dtype=np.int64),
+            top_response=self.top["response"].fillna("").to_numpy(dtype=str),
+            top_response_missing=self.top["response"].isna().to_numpy(),
+            top_probability=self.top["Topic_Probability"].to_numpy(dtype=np.float64),
+            top_row=self.top["row"].to_numpy(dtype=np.int64),
+        )
+
+    @staticmethod
+    def saved_fingerprint(path=STATE_PATH):
+        """Fingerprint of the state saved at path, or None if there is none."""
+        if not os.path.exists(os.path.join(path, "state.npz")):
+            return None
+        with np.load(os.path.join(path, "state.npz")) as data:
+            if "fingerprint" not in data:
+                return None
+            return str(data["fingerprint"]) or None
+
+    @classmethod
+    def load(cls, path=STATE_PATH) -> "AnalysisState":
+        if not os.path.exists(os.path.join(path, "state.npz")):
+            raise FileNotFoundError(f"No analysis state at {path}")
+        with np.load(os.path.join(path, "state.npz")) as data:
+            top_n, rows_seen, precision = (int(value) for value in data["meta"])
+            state = cls(top_n=top_n, fingerprint=str(data["fingerprint"]) or None)
+            state.rows_seen = rows_seen
+            state.stats = pd.DataFrame(data["stats"], index=data["stats_index"], columns=state.stats.columns)
+            state.sketch = DistinctSketch(precision)
+            state.sketch.registers = {int(t): r.copy() for t, r in zip(data["sketch_topics"], data["registers"])}
+            response = data["top_response"].astype(object)
+            response[data["top_response_missing"]] = None
+            state.top = pd.DataFrame({
+                "Topic": data["top_topic"],
+                "response": response,
+                "Topic_Probability": data["top_probability"],
+                "row": data["top_row"],
+            })
+        state.cube = TopicCube.load(os.path.join(path, "topic_cube.npz"))
+        return state
+
+
+def update_analysis(delta, full_table_path, state_path=STATE_PATH, fingerprint=None):
+    """
+    Update the saved analysis state with delta rows that were just appended
+    to full_table_path. Without a saved state, or when fingerprint (of the
+    model that labeled delta) differs from the saved state's, it is built
+    once from the full table (which already contains the delta).
+    """
+    saved = os.path.exists(os.path.join(state_path, "state.npz"))
+    if saved and (fingerprint is None or AnalysisState.saved_fingerprint(state_path) == fingerprint):
+        state = AnalysisState.load(state_path).update(delta)
+    else:
+        state = AnalysisState(fingerprint=fingerprint).update(read_table(full_table_path))
+    state.save(state_path)
+    return state
@@ -0,0 +1,260 @@
+# src/instrumentation.py
+"""
+Lightweight spans for timing pipeline stages.
+
+A span records wall time, CPU time, resident memory at its end, its change
+and its peak over the span, and an optional row count. It works as a context manager or a
+decorator:
+
+    with span("embed", rows=len(docs)) as s:
+        ...
+        s.rows = len(embeddings)
+
+    @span("fit")
+    def fit_stage(...): ...
+
+Finished spans are collected by the module-level tracer and can be exported
+as JSON lines (one structured record per span) or as a Chrome trace file
+that opens in chrome://tracing or Perfetto. Spans recorded in process pool
+workers are sent back with each result (see run_traced) and merged into the
+parent's tracer. The peak is sampled every RSS_SAMPLE_INTERVAL_S by one
+background thread that runs only while spans are open, so allocations freed
+before the span ends still count, down to that resolution. Only the standard library is used, so importing this
+module is cheap.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger("surveynlp.trace")
+
+RSS_SAMPLE_INTERVAL_S = 0.01
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size over the whole life of this process in MB, or
+    None if unavailable. It never goes down, so it says little about a span
+    that starts after an earlier, larger one.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def current_rss_mb():
+    """Resident set size of this process right now in MB, or None if unavailable."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(resident_pages * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+
+
+class RssSampler:
+    """Polls the resident set size while spans are open, raising each open span's peak."""
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL_S):
+        self.interval = interval
+        self._spans = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def watch(self, span):
+        with self._lock:
+            self._spans.add(span)
+            # Also restarts the thread in a forked child, which does not inherit it
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def unwatch(self, span):
+        with self._lock:
+            self._spans.discard(span)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            rss = current_rss_mb()
+            with self._lock:
+                if not self._spans:
+                    # Sleep until the next span opens
+                    self._wake.clear()
+                    continue
+                for span in self._spans:
+                    span._peak_rss = max(span._peak_rss, rss)
+            time.sleep(self.interval)
+
+
+rss_sampler = RssSampler()
+
+
+class Tracer:
+    """Collects finished spans for the current process."""
+
+    def __init__(self):
+        self.records = []
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = time.perf_counter()
+        self._origin_unix = time.time()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(json.dumps(record, default=str))
+
+    def merge(self, records, origin_unix):
+        """
+        Add spans recorded by another process's tracer, whose clock started
+        at origin_unix. Their start times are shifted onto this tracer's
+        clock, and top-level spans become children of the current span.
+        """
+        shift_us = (origin_unix - self._origin_unix) * 1e6
+        stack = self._stack()
+        parent = stack[-1].name if stack else None
+        for record in records:
+            record = dict(record, start_us=round(record["start_us"] + shift_us, 1))
+            if record["parent"] is None:
+                record["parent"] = parent
+            self.add(record)
+
+    def clear(self):
+        with self._lock:
+            self.records = []
+
+    def write_json_lines(self, path):
+        """One JSON object per span, in the order the spans finished."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for record in self.records:
+                f.write(json.dumps(record, default=str) + "\n")
+
+    def write_chrome_trace(self, path):
+        """Spans as complete ("X") events in the Chrome trace event format."""
+        pid = os.getpid()
+        events = [{
+            "name": record["name"],
+            "ph": "X",
+            "ts": record["start_us"],
+            "dur": record["wall_s"] * 1e6,
+            "pid": record.get("pid", pid),
+            "tid": record["thread"],
+            "args": {key: value for key, value in record.items()
+                     if key not in ("name", "start_us", "thread", "pid")},
+        } for record in self.records]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
+
+    def export(self, trace_dir, run_name):
+        """Write <run_name>-<timestamp>.jsonl and .trace.json to trace_dir; returns both paths."""
+        stem = os.path.join(trace_dir, f"{run_name}-{time.strftime('%Y%m%d-%H%M%S')}")
+        self.write_json_lines(stem + ".jsonl")
+        self.write_chrome_trace(stem + ".trace.json")
+        return stem + ".jsonl", stem + ".trace.json"
+
+
+tracer = Tracer()
+
+
+def run_traced(func, *args, **kwargs):
+    """
+    Call func in a pool worker and return (result, spans, clock origin), so
+    the spans it records reach the parent; see collect_traced.
+    """
+    start = len(tracer.records)
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        with tracer._lock:
+            records = tracer.records[start:]
+            del tracer.records[start:]
+    return result, records, tracer._origin_unix
+
+
+def collect_traced(outputs, tracer=tracer):
+    """Yield the results of run_traced calls, merging their spans into tracer."""
+    for result, records, origin_unix in outputs:
+        tracer.merge(records, origin_unix)
+        yield result
+
+
+class span(contextlib.ContextDecorator):
+    """Times the enclosed block; set .rows or .attrs inside to record extra fields."""
+
+    def __init__(self, name, rows=None, tracer=tracer, **attrs):
+        self.name = name
+        self.rows = rows
+        self.attrs = attrs
+        self.tracer = tracer
+
+    def _recreate_cm(self):
+        # A fresh span per decorated call, so recursion and threads are safe
+        return span(self.name, self.rows, self.tracer, **self.attrs)
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self._rss = self._peak_rss = current_rss_mb()
+        if self._rss is not None and self.tracer.enabled:
+            rss_sampler.watch(self)
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        self.tracer._stack().pop()
+        rss_sampler.unwatch(self)
+        if not self.tracer.enabled:
+            return False
+
+        rss = current_rss_mb()
+        peak = None if rss is None or self._rss is None else max(self._peak_rss, rss)
+        record = {
+            "name": self.name,
+            "parent": self.parent,
+            "start_us": round((self._wall - self.tracer._origin) * 1e6, 1),
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            # Resident memory at the end of the span, its change and its
+            # sampled peak over the span; the lifetime peak is the process's
+            "rss_mb": rss,
+            "rss_delta_mb": None if rss is None or self._rss is None else round(rss - self._rss, 1),
+            "peak_rss_mb": peak,
+            "process_peak_rss_mb": peak_rss_mb(),
+            "rows": self.rows,
+            "status": "ok" if exc_type is None else "error",
+            "pid": os.getpid(),
+            "thread": threading.get_ident(),
+        }
+        if exc_type is not None:
+            record["error"] = f"{exc_type.__name__}: {exc}"
+        record.update(self.attrs)
+        self.tracer.add(record)
+        return False
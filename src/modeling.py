@@ -1,116 +1,510 @@
 import pandas as pd
+import numpy as np
+import hashlib
 import os
-import spacy
-from bertopic import BERTopic
-from sentence_transformers import SentenceTransformer
-from sklearn.feature_extraction.text import CountVectorizer
+from src.embedding_cache import normalize_text, open_cache
+from src.instrumentation import span
+from src.embedding_backends import TransformerBackend, get_backend
+from src.preprocessing import KEEP_WORDS, STOP_WORDS
+from src.resources import get_spacy_model
 
-# Load Spanish language model
-nlp = spacy.load('es_core_news_sm')
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+MODEL_PATH = "outputs/bertopic_model"
 
-# Custom stop words to keep
-KEEP_WORDS = {
-    'no', 'hay', 'sin', 'falta', 'cerca', 'lejos',
-    'mal', 'bien', 'mejor', 'peor', 'mucho', 'poco'
-}
-
-def preprocess_text(text):
-    """Process text using spaCy's Spanish model."""
-    doc = nlp(text.lower())
+def _doc_to_text(doc, keep_words=KEEP_WORDS):
     # Keep content words, numbers, and specific keep words
     tokens = [
         token.lemma_ for token in doc
-        if (not token.is_stop or token.text in KEEP_WORDS) and
+        if (not token.is_stop or token.text in keep_words) and
            (token.is_alpha or token.is_digit) and
            len(token.text) > 1
     ]
     return " ".join(tokens)
 
-def load_data(path="data/processed/survey_clean.csv"):
-    df = pd.read_csv(path)
-    # Apply spaCy preprocessing
-    texts = [preprocess_text(text) for text in df["response_clean"]]
-    return texts, df
+def preprocess_text(text, keep_words=KEEP_WORDS):
+    """Process text using spaCy's Spanish model."""
+    return _doc_to_text(get_spacy_model()(text.lower()), keep_words)
 
-def train_topic_model(docs, model_name="all-MiniLM-L6-v2", language="spanish"):
-    # Initialize sentence transformer for embeddings
-    embedding_model = SentenceTransformer(model_name)
-    
-    # Define Spanish stop words
-    spanish_stop_words = [
-        'el', 'la', 'los', 'las', 'un', 'una', 'unos', 'unas', 'y', 'o', 'pero', 'si',
-        'de', 'del', 'a', 'en', 'para', 'por', 'con', 'mi', 'tu', 'su', 'este',
-        'esta', 'ese', 'esa', 'aquel', 'aquella', 'que', 'quien', 'cual', 'cuando',
-        'donde', 'porque', 'como', 'segun', 'personalmente', 'hablando', 'experiencia'
+def preprocess_texts(texts, batch_size=1000, n_process=1, keep_words=KEEP_WORDS):
+    """
+    Batched version of preprocess_text built on nlp.pipe.
+
+    Results are returned in input order. n_process > 1 spreads the batches
+    over worker processes.
+    """
+    nlp = get_spacy_model()
+    lowered = (str(text).lower() for text in texts)
+    return [
+        _doc_to_text(doc, keep_words)
+        for doc in nlp.pipe(lowered, batch_size=batch_size, n_process=n_process)
     ]
-    
-    # Create custom vectorizer
-    vectorizer_model = CountVectorizer(
-        stop_words=spanish_stop_words,
-        min_df=2,
-        max_df=0.95,
+
+def load_data(path="data/raw/survey_data.csv", batch_size=1000, n_process=1):
+    """Vectorizer tokens and processed frame of a survey file, see TextPipeline."""
+    from src.text_pipeline import TextPipeline
+
+    df = TextPipeline(batch_size=batch_size, n_process=n_process).load(path)
+    return df["response_tokens"].tolist(), df
+
+def deduplicate_docs(docs):
+    """
+    Collapse identical normalized documents.
+
+    Returns (unique_docs, inverse, counts) where unique_docs keeps the first
+    original text of each group, inverse maps every input row to its unique
+    document and counts holds the multiplicity of each unique document.
+    """
+    docs = docs if isinstance(docs, pd.Series) else pd.Series(list(docs), dtype=object)
+    # Normalize each distinct text once; groups keep first-appearance order
+    codes, texts = pd.factorize(docs, use_na_sentinel=False)
+    groups, uniques = pd.factorize(pd.Series([normalize_text(text) for text in texts], dtype=object))
+    inverse = groups[codes]
+    first_rows = np.unique(inverse, return_index=True)[1]
+    unique_docs = docs.iloc[first_rows].tolist()
+    counts = np.bincount(inverse, minlength=len(uniques))
+    return unique_docs, inverse, counts
+
+def embed_documents(docs, embedding_model, model_name, cache_dir=None):
+    """Embed documents, reusing vectors stored in cache_dir when given."""
+    def encode(texts):
+        with span("encode", rows=len(texts), model=model_name):
+            return embedding_model.encode(texts, show_progress_bar=False)
+
+    if cache_dir is None:
+        return encode(docs)
+    return open_cache(cache_dir, model_name).encode(docs, encode)
+
+def resolve_embeddings(docs, model_name=DEFAULT_EMBEDDING_MODEL, embedding_model=None,
+                       embeddings=None, cache_dir=None):
+    """
+    Pick the embedding backend for a fit and embed docs with it.
+
+    model_name selects a backend (see embedding_backends.get_backend) unless
+    an embedding_model object is given. Backends that learn from the corpus
+    are fitted on docs first. Returns (backend, backend_name, embeddings).
+    """
+    backend = get_backend(model_name) if embedding_model is None else embedding_model
+    if hasattr(backend, "fit") and not backend.fitted:
+        backend.fit(docs)
+    name = getattr(backend, "name", None) or model_name
+    if embeddings is None:
+        embeddings = embed_documents(docs, backend, name, cache_dir)
+    return backend, name, embeddings
+
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+def topic_centroids(embeddings, topics, weights=None):
+    """
+    Unit-length mean direction of each topic's document embeddings.
+
+    Returns (topic_ids, centroids) sorted by topic id, outliers (-1) excluded.
+    All topics are aggregated at once with a sparse topic x document matmul.
+    """
+    from scipy import sparse
+
+    topics = np.asarray(topics)
+    topic_ids, codes = np.unique(topics, return_inverse=True)
+    values = np.ones(len(topics), dtype=np.float32) if weights is None else np.asarray(weights, dtype=np.float32)
+    membership = sparse.csr_matrix(
+        (values, (codes, np.arange(len(topics)))), shape=(len(topic_ids), len(topics))
+    )
+    centroids = normalize_rows(membership @ normalize_rows(embeddings))
+    keep = topic_ids != -1
+    return topic_ids[keep], centroids[keep]
+
+def topic_confidence(embeddings, topics, topic_ids, centroids):
+    """
+    Cosine similarity of each document to its topic centroid, computed in
+    one batched operation. Outliers and unknown topics get 0.
+    """
+    topics = np.asarray(topics)
+    confidence = np.zeros(len(topics), dtype=np.float32)
+    if len(topic_ids) == 0:
+        return confidence
+    position = np.minimum(np.searchsorted(topic_ids, topics), len(topic_ids) - 1)
+    known = topic_ids[position] == topics
+    if known.any():
+        normalized = normalize_rows(np.asarray(embeddings)[known])
+        confidence[known] = np.einsum("ij,ij->i", normalized, centroids[position[known]])
+    return confidence
+
+def make_vectorizer(min_df=2, max_df=0.95, stop_words=STOP_WORDS):
+    """
+    The topic vectorizer: stop words (see TextPipeline), words of two or more
+    letters. Fitted on fewer topics than min_df and max_df allow, it keeps
+    every term (see topic_vectorizer).
+    """
+    from src.topic_vectorizer import TopicVectorizer
+
+    return TopicVectorizer(
+        stop_words=sorted(stop_words),
+        min_df=min_df,
+        max_df=max_df,
         token_pattern=r'(?u)\b[a-záéíóúñ][a-záéíóúñ]+\b'
     )
+
+def train_topic_model(docs, model_name=DEFAULT_EMBEDDING_MODEL, language="spanish",
+                      embeddings=None, cache_dir=None, weights=None, embedding_docs=None,
+                      embedding_model=None, min_topic_size=5, min_df=2, max_df=0.95,
+                      umap_model=None, hdbscan_model=None, stop_words=STOP_WORDS, inverse=None):
+    """
+    Fit BERTopic on docs.
+
+    docs are the texts the topic vectorizer counts; when embedding_docs is
+    given (e.g. the cleaned text from TextPipeline), those are embedded
+    instead of docs. Precomputed embeddings skip embedding entirely.
+
+    model_name is a sentence-transformers model or "hashing" for the local
+    hashed n-gram backend; any object with a sentence-transformers style
+    encode() can be passed as embedding_model instead.
+
+    weights are the number of respondents behind each (deduplicated)
+    document. They only rescale topic sizes and centroids: UMAP, HDBSCAN
+    (including min_topic_size) and c-TF-IDF see each distinct document
+    once, so clusters can differ from a fit on every original row.
+    Passing inverse (mapping every original row to its document) instead
+    embeds each distinct document once but clusters every row, as a fit on
+    the original rows does; topics and probs are then returned per row.
+
+    min_topic_size, min_df and max_df tune clustering and the vectorizer
+    (see src.sweep to compare settings); umap_model and hdbscan_model
+    replace BERTopic's defaults outright. stop_words should be the
+    TextPipeline's that produced docs.
+    """
+    from bertopic import BERTopic
+
+    # Embed up front (only documents missing from the on-disk cache) so the
+    # embeddings can be reused for per-document confidence
+    backend, model_name, embeddings = resolve_embeddings(
+        docs if embedding_docs is None else embedding_docs,
+        model_name, embedding_model, embeddings, cache_dir
+    )
+    if inverse is not None:
+        # Each distinct document once per respondent, so duplicates keep
+        # their weight in UMAP, HDBSCAN and c-TF-IDF
+        inverse = np.asarray(inverse)
+        docs = [docs[i] for i in inverse]
+        embeddings = np.asarray(embeddings)[inverse]
+        weights = None
     
     # Initialize BERTopic with minimal settings
+    # Embeddings are always passed in explicitly, so BERTopic gets no
+    # embedding model: a transformer is only loaded when the backend has
+    # documents to encode
     topic_model = BERTopic(
-        embedding_model=embedding_model,
-        vectorizer_model=vectorizer_model,
+        embedding_model=None,
+        umap_model=umap_model,
+        hdbscan_model=hdbscan_model,
+        vectorizer_model=make_vectorizer(min_df, max_df, stop_words),
         language=language,
-        min_topic_size=5,
+        min_topic_size=min_topic_size,
         verbose=True
     )
     
     # Fit the model and transform documents
-    topics = topic_model.fit_transform(docs)
+    with span("bertopic_fit", rows=len(docs)):
+        topics = topic_model.fit_transform(docs, embeddings=embeddings)
     
     # Get the topic assignments (first element of tuple)
     if isinstance(topics, tuple):
         topics = topics[0]
+
+    # Remember which embedding model to use when the saved model labels new data
+    topic_model.embedding_model_name_ = model_name
+    if not isinstance(backend, TransformerBackend):
+        topic_model.embedding_backend_ = backend
+
+    # Clustering ran on distinct documents; sizes still count every respondent
+    if weights is not None:
+        sizes = pd.Series(weights).groupby(np.asarray(topics)).sum()
+        topic_model.topic_sizes_ = {int(topic): int(size) for topic, size in sizes.items()}
+
+    # Confidence as similarity to the topic centroid, instead of BERTopic's
+    # full HDBSCAN probability matrix; centroids are kept for new documents
+    topic_model.topic_ids_, topic_model.topic_centroids_ = topic_centroids(embeddings, topics, weights)
+    probs = topic_confidence(embeddings, topics, topic_model.topic_ids_, topic_model.topic_centroids_)
     
-    return topic_model, topics, None  # probabilities handled differently in newer versions
+    return topic_model, topics, probs
+
+def nearest_topics(embeddings, topic_ids, centroids, batch_size=50_000, min_similarity=None):
+    """
+    Assign each document to the topic with the most similar centroid.
 
-def save_topic_info(topic_model, df, topics, out_path="outputs/topics.csv"):
-    # Save document-topic assignments
-    df["Topic"] = topics
+    Documents whose best cosine similarity is below min_similarity are
+    outliers (-1), like the documents HDBSCAN leaves unclustered. Embeddings
+    are processed in batches of batch_size rows, so memory stays bounded by
+    batch_size x n_topics. Returns (topics, similarity).
+    """
+    topics = np.full(len(embeddings), -1, dtype=np.int64)
+    similarity = np.zeros(len(embeddings), dtype=np.float32)
+    if len(topic_ids) == 0:
+        return topics, similarity
+    for start in range(0, len(embeddings), batch_size):
+        with span("nearest_topics_batch", rows=min(batch_size, len(embeddings) - start)):
+            scores = normalize_rows(embeddings[start:start + batch_size]) @ centroids.T
+            best = scores.argmax(axis=1)
+            topics[start:start + batch_size] = topic_ids[best]
+            similarity[start:start + batch_size] = scores[np.arange(len(best)), best]
+    if min_similarity is not None:
+        topics[similarity < min_similarity] = -1
+    return topics, similarity
+
+def document_strata(strata: pd.DataFrame, inverse) -> pd.DataFrame:
+    """
+    One stratum row per distinct document (inverse maps rows to documents):
+    the stratum most of the document's respondents share, rather than the
+    first respondent's. Ties go to the stratum seen first.
+    """
+    keys = strata.groupby(list(strata.columns), sort=False, observed=True, dropna=False).ngroup().to_numpy()
+    pairs = pd.DataFrame({"doc": np.asarray(inverse), "stratum": keys, "row": np.arange(len(keys))})
+    sizes = pairs.groupby(["doc", "stratum"], sort=False)["row"].agg(["size", "first"])
+    best = sizes.sort_values(["size", "first"], ascending=[False, True]).groupby(level="doc").head(1)
+    rows = best["first"].sort_index(level="doc").to_numpy()
+    return strata.iloc[rows].reset_index(drop=True)
+
+def _allocate(share, counts, size):
+    """
+    Integer quotas close to share that sum to size: at most counts per
+    stratum, at least one per stratum when there is room for all of them,
+    and slots left by rounding go to the largest remainders.
+    """
+    quota = np.minimum(np.floor(share), counts).astype(np.int64)
+    if len(counts) <= size:
+        quota = np.maximum(quota, 1)
+    while quota.sum() > size:
+        # Take back from the strata most above their share
+        excess = np.where(quota > 1, quota - share, -np.inf)
+        quota[np.argmax(excess)] -= 1
+    while quota.sum() < size and (quota < counts).any():
+        room = np.where(quota < counts, share - quota, -np.inf)
+        missing = int(size - quota.sum())
+        top = np.argsort(-room, kind="stable")[:missing]
+        quota[top[np.isfinite(room[top])]] += 1
+    return quota
+
+def stratified_sample(strata, size, seed=0, weights=None):
+    """
+    Indices of a random sample of at most size rows, allocated to each
+    stratum in proportion to its share of the weights (e.g. respondents per
+    distinct document; rows when None), with at least one row per stratum
+    when size allows.
+
+    strata is a DataFrame of stratum columns (e.g. region, group, question)
+    or a 1-D array of labels. Returned indices are sorted.
+    """
+    if isinstance(strata, pd.DataFrame):
+        codes = strata.groupby(list(strata.columns), sort=False, observed=True, dropna=False).ngroup().to_numpy()
+    else:
+        codes = pd.factorize(np.asarray(strata), use_na_sentinel=False)[0]
+    n = len(codes)
+    if size >= n:
+        return np.arange(n)
+    if size <= 0:
+        return np.arange(0)
+
+    counts = np.bincount(codes)
+    totals = counts if weights is None else np.bincount(codes, weights=np.asarray(weights, dtype=np.float64))
+    quota = _allocate(totals / totals.sum() * size, counts, size)
+
+    # Shuffle, then keep the first quota rows of each stratum
+    order = np.random.default_rng(seed).permutation(n)
+    order = order[np.argsort(codes[order], kind="stable")]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    rank = np.arange(n) - starts[codes[order]]
+    return np.sort(order[rank < quota[codes[order]]])
+
+def fit_on_sample(docs, strata, sample_size, holdout_size=1000, seed=0, batch_size=50_000,
+                  embeddings=None, embedding_docs=None, cache_dir=None, weights=None,
+                  model_name=DEFAULT_EMBEDDING_MODEL, embedding_model=None, stop_words=STOP_WORDS,
+                  outlier_quantile=0.05, min_topic_size=5, min_df=2, max_df=0.95):
+    """
+    Fit the topic model on a stratified sample and assign the rest by centroid.
+
+    BERTopic (UMAP + HDBSCAN) only sees sample_size documents, so fit time
+    stays bounded as the corpus grows. All other documents are assigned to
+    the nearest topic centroid in batches. Documents less similar to their
+    nearest centroid than the outlier_quantile of the clustered sample
+    documents are outliers (-1). On a held-out slice of the unsampled
+    documents, the centroid assignment is compared with the model's own
+    transform, and the result is reported as agreement.
+
+    strata has one entry (or row) per doc (see document_strata) and is
+    weighted by weights when sampling. min_topic_size, min_df and max_df
+    are passed to train_topic_model. Returns (topic_model, topics, probs,
+    report).
+    """
+    backend, model_name, embeddings = resolve_embeddings(
+        docs if embedding_docs is None else embedding_docs,
+        model_name, embedding_model, embeddings, cache_dir
+    )
+    embeddings = np.asarray(embeddings)
+    weights = np.ones(len(docs), dtype=np.int64) if weights is None else np.asarray(weights)
+
+    sample = stratified_sample(strata, sample_size, seed=seed, weights=weights)
+    topic_model, sample_topics, _ = train_topic_model(
+        [docs[i] for i in sample], model_name=model_name, embeddings=embeddings[sample],
+        weights=weights[sample], embedding_model=backend, stop_words=stop_words,
+        min_topic_size=min_topic_size, min_df=min_df, max_df=max_df
+    )
+
+    sample_topics = np.asarray(sample_topics)
+    sample_probs = topic_confidence(
+        embeddings[sample], sample_topics, topic_model.topic_ids_, topic_model.topic_centroids_
+    )
+    clustered = sample_topics != -1
+    threshold = float(np.quantile(sample_probs[clustered], outlier_quantile)) if clustered.any() else None
+    topic_model.outlier_threshold_ = threshold
+
+    topics, probs = nearest_topics(embeddings, topic_model.topic_ids_, topic_model.topic_centroids_, batch_size,
+                                   min_similarity=threshold)
+    topics[sample] = sample_topics
+    probs[sample] = sample_probs
+    sizes = pd.Series(weights).groupby(topics).sum()
+    topic_model.topic_sizes_ = {int(topic): int(size) for topic, size in sizes.items()}
+
+    # Agreement between centroid assignment and BERTopic on unseen documents
+    rest = np.setdiff1d(np.arange(len(docs)), sample)
+    rest_strata = strata.iloc[rest] if isinstance(strata, pd.DataFrame) else np.asarray(strata)[rest]
+    holdout = rest[stratified_sample(rest_strata, holdout_size, seed=seed + 1, weights=weights[rest])]
+    report = {"documents": len(docs), "sample_size": len(sample), "holdout_size": len(holdout),
+              "outlier_threshold": threshold, "agreement": None, "holdout_outlier_share": None}
+    if len(holdout):
+        with span("holdout_check", rows=len(holdout)):
+            model_topics, _ = topic_model.transform([docs[i] for i in holdout], embeddings=embeddings[holdout])
+        model_topics = np.asarray(model_topics)
+        clustered = model_topics != -1
+        report["holdout_outlier_share"] = float(1 - clustered.mean())
+        if clustered.any():
+            report["agreement"] = float((model_topics[clustered] == topics[holdout][clustered]).mean())
+    return topic_model, topics, probs, report
+
+def save_topic_model(topic_model, path=MODEL_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    topic_model.save(path)
+
+def model_fingerprint(topic_model):
+    """
+    Short hash identifying a fit (embedding model, topic IDs and centroids).
+    Results derived from a model's labels store it, so they can tell when
+    the model was refitted. None for models saved before centroids were kept.
+    """
+    if not hasattr(topic_model, "topic_centroids_"):
+        return None
+    digest = hashlib.sha1(str(getattr(topic_model, "embedding_model_name_", "")).encode("utf-8"))
+    digest.update(np.ascontiguousarray(topic_model.topic_ids_, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(topic_model.topic_centroids_, dtype=np.float32).tobytes())
+    return digest.hexdigest()[:16]
+
+def load_topic_model(path=MODEL_PATH):
+    from bertopic import BERTopic
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No saved topic model at {path}, run a fit first")
+    return BERTopic.load(path)
+
+def assign_topics(topic_model, docs, embedding_docs=None, cache_dir=None):
+    """
+    Assign docs to the topics of an already fitted model without refitting.
+    Topic IDs stay stable across calls.
+    """
+    model_name = getattr(topic_model, "embedding_model_name_", DEFAULT_EMBEDDING_MODEL)
+    backend = getattr(topic_model, "embedding_backend_", None) or get_backend(model_name)
+    embeddings = embed_documents(
+        docs if embedding_docs is None else embedding_docs,
+        backend, model_name, cache_dir
+    )
+    topics, _ = topic_model.transform(docs, embeddings=embeddings)
+    if not hasattr(topic_model, "topic_centroids_"):
+        return topics, None  # model saved before centroids were stored
+    probs = topic_confidence(embeddings, topics, topic_model.topic_ids_, topic_model.topic_centroids_)
+    return topics, probs
+
+def topic_keywords(docs, topics, vectorizer, top_n=10, weights=None):
+    """
+    Top words per topic by class-based TF-IDF.
+
+    One sparse document-term matrix is aggregated into a topic-term matrix
+    with a sparse matmul, then weighted as tf * log(1 + A / f_t), where A is
+    the average number of words per topic and f_t the term's total count.
+    vectorizer must already be fitted (e.g. topic_model.vectorizer_model).
+    Returns {topic: [words]}.
+    """
+    from scipy import sparse
+
+    doc_term = vectorizer.transform(docs)
+    topic_ids, codes = np.unique(np.asarray(topics), return_inverse=True)
+    values = np.ones(len(codes)) if weights is None else np.asarray(weights, dtype=float)
+    membership = sparse.csr_matrix(
+        (values, (codes, np.arange(len(codes)))), shape=(len(topic_ids), len(codes))
+    )
+    topic_term = (membership @ doc_term).tocsr()
+
+    words = vectorizer.get_feature_names_out()
+    return {
+        topic_id: [words[column] for column in columns]
+        for topic_id, columns in zip(topic_ids, ctfidf_top_terms(topic_term, top_n))
+    }
+
+def ctfidf_top_terms(topic_term, top_n=10):
+    """
+    Column indices of the top_n class-based TF-IDF terms of each row of a
+    sparse topic-term count matrix, best first.
+    """
+    from scipy import sparse
+
+    avg_words = topic_term.sum() / max(topic_term.shape[0], 1)
+    term_freq = np.asarray(topic_term.sum(axis=0)).ravel()
+    idf = np.log1p(avg_words / np.maximum(term_freq, 1))
+    ctfidf = sparse.csr_matrix(topic_term.multiply(idf))
+
+    top_terms = []
+    for row in range(ctfidf.shape[0]):
+        start, end = ctfidf.indptr[row], ctfidf.indptr[row + 1]
+        scores, columns = ctfidf.data[start:end], ctfidf.indices[start:end]
+        top_terms.append(columns[np.argsort(-scores, kind="stable")[:top_n]])
+    return top_terms
+
+def save_topic_info(topic_model, df, topics, out_path="outputs/topics.csv", docs=None):
+    # Save document-topic assignments, leaving the caller's frame untouched
+    topics = pd.to_numeric(np.asarray(topics), downcast="integer")
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    df.to_csv(out_path, index=False)
+    df.assign(Topic=topics).to_csv(out_path, index=False)
     
-    # Get and save topic words
-    topic_words = {}
-    for topic_id in set(topics):
-        topic_docs = df[df["Topic"] == topic_id]["response_clean"]
-        # Use spaCy to extract key terms
-        doc = nlp(" ".join(topic_docs))
-        # Get most common content words
-        word_freq = {}
-        for token in doc:
-            if token.is_alpha and not token.is_stop:
-                word_freq[token.text] = word_freq.get(token.text, 0) + 1
-        # Sort by frequency
-        sorted_words = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)
-        topic_words[topic_id] = [word for word, _ in sorted_words[:10]]
+    # Get topic words with c-TF-IDF over the vectorizer fitted by BERTopic
+    if docs is None:
+        docs = df["response_tokens"] if "response_tokens" in df else df["response_clean"]
+    topic_words = topic_keywords(docs, topics, topic_model.vectorizer_model, top_n=10)
     
     # Create topic info DataFrame
     topic_info = pd.DataFrame({
-        'Topic': topic_words.keys(),
-        'Top_Words': [', '.join(words) for words in topic_words.values()],
-        'Count': df['Topic'].value_counts()
+        'Topic': list(topic_words.keys()),
+        'Top_Words': [', '.join(words) for words in topic_words.values()]
     })
+    topic_info['Count'] = topic_info['Topic'].map(pd.Series(topics).value_counts())
     
     # Save outputs
     os.makedirs("outputs", exist_ok=True)
     topic_info.to_csv("outputs/topic_info.csv", index=False)
     
     # Save model
-    topic_model.save("outputs/bertopic_model")
+    save_topic_model(topic_model)
     print(f"✅ Topics and model saved to outputs/")
     
     return topic_info
 
-def run_modeling_pipeline():
-    docs, df = load_data()
-    topic_model, topics, probs = train_topic_model(docs)
+def run_modeling_pipeline(input_path="data/raw/survey_data.csv"):
+    from src.text_pipeline import TextPipeline
+
+    # Clean, tokenize and lemmatize the raw responses in a single pass
+    pipeline = TextPipeline()
+    df = pipeline.load(input_path)
+    topic_model, topics, probs = train_topic_model(
+        df["response_tokens"].tolist(), embedding_docs=df["response_clean"].tolist(),
+        stop_words=pipeline.stop_words
+    )
     save_topic_info(topic_model, df, topics)
 
 if __name__ == "__main__":
@@ -0,0 +1,132 @@
+# src/pipeline.py
+"""Survey topic pipeline expressed as cached stages, see stage_graph."""
+
+import os
+
+import numpy as np
+
+from src.incremental import CUBE_PATH, STATE_PATH, AnalysisState
+from src.modeling import (DEFAULT_EMBEDDING_MODEL, MODEL_PATH, model_fingerprint, resolve_embeddings, train_topic_model,
+                          save_topic_model)
+from src.post_process_topic_model import extract_topic_info, assign_topics_to_docs, summarize_topics
+from src.preprocessing import STOP_WORDS
+from src.similarity_index import SimilarityIndex, INDEX_PATH, IVF_THRESHOLD
+from src.stage_graph import Stage, StageGraph
+from src.table_io import table_path, write_table
+from src.text_pipeline import TextPipeline
+
+
+def preprocess_stage(raw_path, lemmatize=True, stop_words=STOP_WORDS):
+    df = TextPipeline(lemmatize=lemmatize, stop_words=stop_words).load(raw_path)
+    embedding_docs, docs, inverse, counts = TextPipeline.unique_documents(df)
+    return {"df": df, "embedding_docs": embedding_docs, "docs": docs,
+            "inverse": inverse, "counts": counts}
+
+
+def embed_stage(embedding_docs, model_name=DEFAULT_EMBEDDING_MODEL, cache_dir="data/cache/embeddings"):
+    embedder, _, embeddings = resolve_embeddings(embedding_docs, model_name, cache_dir=cache_dir)
+    return {"embeddings": embeddings, "embedder": embedder}
+
+
+def fit_stage(docs, embeddings, embedder, counts, inverse, stop_words=STOP_WORDS, min_topic_size=5, min_df=2,
+              max_df=0.95, dedup=False):
+    """Fit on every row, or on the distinct documents with dedup; topics and probs are per row either way."""
+    topic_model, topics, probs = train_topic_model(
+        docs, embeddings=embeddings, weights=counts if dedup else None, inverse=None if dedup else inverse,
+        embedding_model=embedder, stop_words=stop_words, min_topic_size=min_topic_size, min_df=min_df, max_df=max_df
+    )
+    save_topic_model(topic_model)
+    if dedup:
+        topics, probs = np.asarray(topics)[inverse], np.asarray(probs)[inverse]
+    return {"topic_model": topic_model, "topics": topics, "probs": probs}
+
+
+def post_process_stage(df, topic_model, topics, probs, output_format="csv", output_dir="outputs"):
+    df_with_topics = assign_topics_to_docs(df, topics, probs)
+    topic_info = extract_topic_info(topic_model)
+    topic_summaries = summarize_topics(df_with_topics)
+    # The incremental analysis state is rebuilt with every fit, so assign
+    # runs never fold new waves into aggregates of an earlier model
+    analysis_state = AnalysisState(fingerprint=model_fingerprint(topic_model)).update(df_with_topics)
+    topic_cube = analysis_state.cube
+
+    os.makedirs(output_dir, exist_ok=True)
+    write_table(topic_info, table_path("topic_info", output_format, output_dir))
+    write_table(df_with_topics, table_path("df_with_topics", output_format, output_dir))
+    write_table(topic_summaries, table_path("topic_summaries", output_format, output_dir))
+    analysis_state.save(os.path.join(output_dir, "analysis_state"))
+    return {"df_with_topics": df_with_topics, "topic_info": topic_info,
+            "topic_summaries": topic_summaries, "topic_cube": topic_cube}
+
+
+def index_stage(embeddings, embedder, df_with_topics, inverse, stop_words=STOP_WORDS, output_dir="outputs"):
+    # Text queries are cleaned with the preprocess stage's stop list
+    index = SimilarityIndex.from_labeled(embeddings, df_with_topics, inverse, embedder,
+                                         TextPipeline(lemmatize=False, stop_words=stop_words))
+    if len(index) > IVF_THRESHOLD:
+        index.build_ivf()
+    index.save(os.path.join(output_dir, "similarity_index"))
+    return {"similarity_index": index}
+
+
+def analysis_stage(df_with_topics, topic_cube):
+    from src.topic_analysis import run_analysis
+
+    region_dist, topic_metrics, _ = run_analysis(df=df_with_topics, cube=topic_cube)
+    return {"region_distribution": region_dist, "topic_metrics": topic_metrics}
+
+
+def visualization_stage(topic_cube, topic_info):
+    from src.visualization import create_all_visualizations
+
+    create_all_visualizations(cube=topic_cube, topic_info=topic_info)
+    return {"figures": "visuals"}
+
+
+def build_graph(model_name=DEFAULT_EMBEDDING_MODEL, lemmatize=True, output_format="csv",
+                cache_dir="data/cache/stages", stop_words=STOP_WORDS, min_topic_size=5, min_df=2, max_df=0.95,
+                dedup=False):
+    # One stop list for cleaning and the vectorizer, as in TextPipeline
+    stop_words = sorted(TextPipeline(stop_words=stop_words).stop_words)
+    stages = [
+        Stage("preprocess", preprocess_stage, inputs=["raw_path"],
+              outputs=["df", "embedding_docs", "docs", "inverse", "counts"],
+              params={"lemmatize": lemmatize, "stop_words": stop_words}),
+        Stage("embed", embed_stage, inputs=["embedding_docs"], outputs=["embeddings", "embedder"],
+              params={"model_name": model_name}),
+        Stage("fit", fit_stage, inputs=["docs", "embeddings", "embedder", "counts", "inverse"],
+              outputs=["topic_model", "topics", "probs"],
+              params={"stop_words": stop_words, "min_topic_size": min_topic_size, "min_df": min_df, "max_df": max_df,
+                      "dedup": dedup},
+              files=[MODEL_PATH]),
+        Stage("post_process", post_process_stage, inputs=["df", "topic_model", "topics", "probs"],
+              outputs=["df_with_topics", "topic_info", "topic_summaries", "topic_cube"],
+              params={"output_format": output_format},
+              files=[table_path(name, output_format) for name in ("topic_info", "df_with_topics", "topic_summaries")]
+              + [CUBE_PATH, os.path.join(STATE_PATH, "state.npz")]),
+        Stage("index", index_stage, inputs=["embeddings", "embedder", "df_with_topics", "inverse"],
+              outputs=["similarity_index"], params={"stop_words": stop_words},
+              files=[os.path.join(INDEX_PATH, "vectors.npy")]),
+        Stage("analysis", analysis_stage, inputs=["df_with_topics", "topic_cube"],
+              outputs=["region_distribution", "topic_metrics"],
+              files=["visuals/topic_region_distribution.png", "visuals/topic_quality_metrics.png",
+                     "outputs/representative_responses.csv"]),
+        Stage("visualization", visualization_stage, inputs=["topic_cube", "topic_info"],
+              outputs=["figures"],
+              files=["visuals/topic_distribution.png", "visuals/region_topic_heatmap.png",
+                     "visuals/group_topic_distribution.png"]),
+    ]
+    return StageGraph(stages, cache_dir=cache_dir)
+
+
+def run_pipeline(raw_path="data/raw/survey_data.csv", force=(), **kwargs):
+    """
+    Run every stage, skipping the ones whose code, inputs and parameters are
+    unchanged and whose output files all exist. Stages named in force rerun
+    together with everything downstream of them.
+    """
+    graph = build_graph(**kwargs)
+    results = graph.run({"raw_path": raw_path}, force=force)
+    for name, status, seconds in graph.report:
+        print(f"  {name:<14} {status:<7} {seconds:7.2f}s")
+    return results
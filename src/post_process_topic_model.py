@@ -1,5 +1,6 @@
 # src/postprocess_topic_model.py
 
+import numpy as np
 import pandas as pd
 
 def extract_topic_info(topic_model, top_n_words: int = 5) -> pd.DataFrame:
@@ -23,25 +24,55 @@ def extract_topic_info(topic_model, top_n_words: int = 5) -> pd.DataFrame:
     
     return topic_info[["Topic", "Top_Words", "Count"]]
 
-def assign_topics_to_docs(df: pd.DataFrame, topics: list, probs: list) -> pd.DataFrame:
+def assign_topics_to_docs(df: pd.DataFrame, topics: list, probs: list, inverse=None) -> pd.DataFrame:
     """
     Adds topic and probability to each document in the DataFrame.
+
+    When the model was fitted on deduplicated documents, inverse maps each
+    row to its unique document and the assignments are broadcast back.
+    The existing columns are shared with df rather than copied, and topic
+    IDs are stored in the smallest integer type that holds them.
+    """
+    topics = pd.to_numeric(np.asarray(topics), downcast="integer")
+    if inverse is not None:
+        inverse = np.asarray(inverse)
+        topics = topics[inverse]
+        if probs is not None:
+            probs = np.asarray(probs)[inverse]
+    return df.assign(Topic=topics, Topic_Probability=probs)
+
+def top_k_per_topic(df: pd.DataFrame, k: int = 3, score_col: str = "Topic_Probability",
+                    topic_col: str = "Topic", tie_breaker: str = None, exclude=()) -> pd.DataFrame:
     """
-    df = df.copy()
-    df["Topic"] = topics
-    df["Topic_Probability"] = probs
-    return df
+    Returns the k highest-scoring rows of every topic, grouped by topic.
+
+    A single lexsort orders rows by topic, then score (descending, missing
+    scores last), then tie_breaker (ascending) and finally original row order,
+    so ties are deterministic. Topics listed in exclude are dropped.
+    """
+    topic_codes, topic_values = pd.factorize(df[topic_col], sort=True)
+    scores = -pd.to_numeric(df[score_col], errors="coerce").to_numpy(dtype=float)
+    keys = [np.arange(len(df))]
+    if tie_breaker is not None:
+        keys.append(pd.factorize(df[tie_breaker], sort=True)[0])
+    keys += [scores, topic_codes]
+    order = np.lexsort(keys)
+
+    # Rank of each row within its topic block of the sorted order
+    sorted_codes = topic_codes[order]
+    block_starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    block_sizes = np.diff(np.r_[block_starts, len(order)])
+    ranks = np.arange(len(order)) - np.repeat(block_starts, block_sizes)
+
+    selected = order[ranks < k]
+    if len(exclude):
+        selected = selected[~np.isin(np.asarray(topic_values)[topic_codes[selected]], list(exclude))]
+    return df.iloc[selected]
 
-def summarize_topics(df_with_topics: pd.DataFrame) -> pd.DataFrame:
+def summarize_topics(df_with_topics: pd.DataFrame, k: int = 3) -> pd.DataFrame:
     """
-    Simple summarization: top 3 documents by confidence per topic.
+    Simple summarization: top k documents by confidence per topic.
     """
-    summaries = []
-    for topic_id in df_with_topics["Topic"].unique():
-        if topic_id == -1:
-            continue
-        topic_df = df_with_topics[df_with_topics["Topic"] == topic_id]
-        top_docs = topic_df.sort_values("Topic_Probability", ascending=False).head(3)
-        summary = " | ".join(top_docs["response"].values)
-        summaries.append({"Topic": topic_id, "Summary": summary})
-    return pd.DataFrame(summaries)
+    top_docs = top_k_per_topic(df_with_topics, k=k, exclude=(-1,))
+    summaries = top_docs.groupby("Topic", sort=False)["response"].agg(" | ".join)
+    return pd.DataFrame({"Topic": summaries.index, "Summary": summaries.values})
@@ -1,38 +1,80 @@
 import pandas as pd
 import re
 import os
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 
-from nltk.tokenize import word_tokenize
-import nltk
-nltk.download('punkt')
+from src.instrumentation import collect_traced, run_traced, span
+from src.resources import get_word_tokenizer
+from src.table_io import TableWriter
 
-# Spanish stop words to exclude from removal
-KEEP_WORDS = {'no', 'hay', 'sin', 'sobre', 'muy', 'mucho', 'muchos', 'mucha', 'muchas'}
+# Words kept even though they are stop words: negations, quantities and
+# judgements that carry meaning in survey answers
+KEEP_WORDS = {
+    'no', 'hay', 'sin', 'sobre', 'muy', 'mucho', 'muchos', 'mucha', 'muchas', 'poco',
+    'falta', 'cerca', 'lejos', 'mal', 'bien', 'mejor', 'peor'
+}
 
-# Define Spanish stop words (excluding KEEP_WORDS)
+# Spanish stop words, the one list used for cleaning and by the topic
+# vectorizer (see TextPipeline)
 STOP_WORDS = {
-    'mi', 'segun', 'personalmente', 'hablando', 'la', 'el', 'en', 'y', 'a', 'los', 'del',
-    'se', 'las', 'por', 'un', 'para', 'con', 'una', 'su', 'al', 'lo', 'como',
-    'mas', 'pero', 'sus', 'le', 'ya', 'o', 'este', 'si', 'porque', 'esta',
-    'entre', 'cuando', 'este', 'esto', 'esta', 'estos', 'estas'
+    'mi', 'tu', 'su', 'sus', 'segun', 'personalmente', 'hablando', 'experiencia',
+    'el', 'la', 'los', 'las', 'un', 'una', 'unos', 'unas', 'lo', 'le', 'al', 'del',
+    'de', 'en', 'a', 'y', 'o', 'se', 'por', 'para', 'con', 'entre', 'como', 'mas',
+    'pero', 'ya', 'si', 'porque', 'cuando', 'donde', 'que', 'quien', 'cual',
+    'este', 'esta', 'esto', 'estos', 'estas', 'ese', 'esa', 'aquel', 'aquella'
 } - KEEP_WORDS
 
-def clean_response(text: str) -> str:
+# Filler phrases added to responses that carry no content
+NOISE_PATTERNS = [
+    r"\bsegun mi experiencia\b",
+    r"\ben mi comunidad\b",
+    r"\bpersonalmente hablando\b"
+]
+
+# Precompiled patterns for clean_responses
+_NOISE_RE = re.compile("|".join(NOISE_PATTERNS))
+
+# Regex equivalents of the NLTK word tokenizer rules that apply to
+# lowercased survey text, in the order NLTK applies them
+_STARTING_QUOTE_RE = re.compile(r'^"')
+_OPENING_QUOTE_RE = re.compile(r'(?<=[ (\[{<«“‘„`])(?:"|\'\')')
+_LEADING_APOSTROPHE_RE = re.compile(r"(?<!\w)'(?!(?:re|ve|ll|m|t|s|d|n)\b)(?=\w)")
+_TOKEN_SPLIT_RE = re.compile(
+    r"\.{2,}"                                  # ellipsis
+    r"|(?<=[^.])\.(?=[\]\)}>\"'»”’ ]*$)"        # final period
+    r"|[;@#$%&?!*«»“”‘’„\u2012-\u2015]"
+    r"|[\]\[(){}<>]"
+    r"|--"
+    r"|`+"
+)
+_COMMA_RE = re.compile(r"([:,])([^\d]|$)")  # comma/colon, except in numbers
+_CLOSING_QUOTE_RE = re.compile(r"''|\"")
+_CONTRACTION_RE = re.compile(r"(?<=[^' ])('[smd]|'ll|'re|'ve|n't|')(?=\s|$)")
+_WHITESPACE_RE = re.compile(r"\s+")
+# Places where NLTK's punkt sentence splitter considers a sentence break:
+# . ? or ! followed by more text or by one of punkt's trailing punctuation marks
+_SENTENCE_BREAK_RE = re.compile(r"[.?!](?=[?!)\";}\]*:@'({\[]|\s+\S)")
+
+@lru_cache(maxsize=8)
+def _stop_words_re(stop_words: frozenset):
+    """One pattern matching any of stop_words as a whole token."""
+    if not stop_words:
+        return re.compile(r"(?!)")
+    return re.compile(r"(?<!\S)(?:" + "|".join(map(re.escape, sorted(stop_words))) + r")(?!\S)")
+
+def clean_response(text: str, stop_words=STOP_WORDS) -> str:
     # Convert to lowercase
     text = text.lower()
     
     # Remove noise patterns
-    noise_patterns = [
-        r"\bsegun mi experiencia\b",
-        r"\ben mi comunidad\b",
-        r"\bpersonalmente hablando\b"
-    ]
-    for pattern in noise_patterns:
+    for pattern in NOISE_PATTERNS:
         text = re.sub(pattern, "", text)
     
     # Tokenize and remove stop words while keeping important negations and descriptors
-    tokens = word_tokenize(text)
-    tokens = [token for token in tokens if token not in STOP_WORDS]
+    tokens = get_word_tokenizer()(text)
+    tokens = [token for token in tokens if token not in stop_words]
     
     # Rejoin tokens and standardize spacing
     text = " ".join(tokens)
@@ -40,12 +82,97 @@ def clean_response(text: str) -> str:
     
     return text
 
-def preprocess_dataset(input_path="data/raw/survey_data.csv", output_path="data/processed/survey_clean.csv"):
-    df = pd.read_csv(input_path)
-    df["response_clean"] = df["response"].apply(clean_response)
+def clean_responses(responses: pd.Series, stop_words=STOP_WORDS) -> pd.Series:
+    """
+    Vectorized clean_response over a whole Series.
+
+    Noise phrases are removed with one compiled alternation, tokens are split
+    by precompiled regex passes that reproduce the NLTK word tokenizer rules,
+    and stop words are dropped in bulk with a single pattern. The regex
+    passes reproduce NLTK within one sentence, so responses that punkt may
+    split into several sentences go through clean_response itself; output
+    matches clean_response for every response. Each distinct response is
+    only cleaned once.
+    """
+    codes, uniques = pd.factorize(responses)
+    cleaned = _clean_unique(pd.Series(uniques, dtype=object), frozenset(stop_words)).to_numpy(dtype=object)
+    result = pd.Series(cleaned[codes], index=responses.index, dtype=object, name=responses.name)
+    return result.where(codes >= 0)
+
+def _clean_unique(responses: pd.Series, stop_words: frozenset) -> pd.Series:
+    text = responses.str.lower().str.replace(_NOISE_RE, "", regex=True)
+    multi_sentence = text.str.contains(_SENTENCE_BREAK_RE).to_numpy(dtype=bool)
+    if multi_sentence.any():
+        cleaned = _clean_single_sentences(text[~multi_sentence], stop_words)
+        slow = responses[multi_sentence].map(lambda response: clean_response(response, stop_words))
+        return pd.concat([cleaned, slow]).reindex(responses.index)
+    return _clean_single_sentences(text, stop_words)
+
+def _clean_single_sentences(text: pd.Series, stop_words: frozenset) -> pd.Series:
+    text = text.str.replace(_STARTING_QUOTE_RE, " `` ", regex=True)
+    text = text.str.replace(_OPENING_QUOTE_RE, " `` ", regex=True)
+    text = text.str.replace(_LEADING_APOSTROPHE_RE, "' ", regex=True)
+    text = text.str.replace(_COMMA_RE, r" \1 \2", regex=True)
+    text = text.str.replace(_TOKEN_SPLIT_RE, r" \g<0> ", regex=True)
+    text = text.str.replace(_CLOSING_QUOTE_RE, " '' ", regex=True)
+    text = text.str.replace(_CONTRACTION_RE, r" \1 ", regex=True)
+    text = text.str.replace(_stop_words_re(stop_words), " ", regex=True)
+    return text.str.replace(_WHITESPACE_RE, " ", regex=True).str.strip()
+
+def _clean_chunk(chunk: pd.DataFrame, pipeline) -> pd.DataFrame:
+    with span("clean_chunk", rows=len(chunk)):
+        chunk["response_clean"] = pipeline.clean(chunk[pipeline.text_column])
+    return chunk
+
+def _iter_cleaned_chunks(reader, pipeline, n_jobs):
+    """Yield cleaned chunks in input order, with at most 2 * n_jobs in flight."""
+    if n_jobs <= 1:
+        for chunk in reader:
+            yield _clean_chunk(chunk, pipeline)
+        return
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        pending = deque()
+        for chunk in reader:
+            # Workers send their clean_chunk spans back with the chunk
+            pending.append(executor.submit(run_traced, _clean_chunk, chunk, pipeline))
+            if len(pending) >= 2 * n_jobs:
+                yield from collect_traced([pending.popleft().result()])
+        while pending:
+            yield from collect_traced([pending.popleft().result()])
+
+def preprocess_dataset(input_path="data/raw/survey_data.csv", output_path="data/processed/survey_clean.csv",
+                       chunksize=None, n_jobs=1, pipeline=None):
+    """
+    Clean the raw survey responses and save them with a response_clean column.
+
+    Cleaning is TextPipeline.clean, with pipeline's stop words (a default
+    TextPipeline when None), so the file holds the same text the in-memory
+    pipeline embeds. With chunksize set, the input is streamed in chunks of
+    that many rows and each cleaned chunk is appended to the output, so
+    memory stays bounded by the chunk size instead of the file size.
+    n_jobs > 1 cleans chunks in a process pool. Output paths ending in
+    .parquet are written as Parquet.
+    """
+    from src.text_pipeline import TextPipeline
+
+    pipeline = TextPipeline() if pipeline is None else pipeline
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    df.to_csv(output_path, index=False)
-    print(f"✅ Preprocessed data saved to {output_path}")
+    if chunksize is None:
+        df = _clean_chunk(pd.read_csv(input_path), pipeline)
+        chunks = [df]
+    else:
+        chunks = _iter_cleaned_chunks(pd.read_csv(input_path, chunksize=chunksize), pipeline, n_jobs)
+
+    writer = TableWriter(output_path)
+    n_rows = 0
+    try:
+        for chunk in chunks:
+            writer.write(chunk)
+            n_rows += len(chunk)
+    finally:
+        writer.close()
+    print(f"✅ Preprocessed {n_rows} rows saved to {output_path}")
 
 if __name__ == "__main__":
     preprocess_dataset()
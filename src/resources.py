@@ -0,0 +1,76 @@
+# src/resources.py
+"""
+Lazily loaded NLP resources.
+
+Nothing heavy is imported or loaded when this module is imported. Each
+getter loads its resource on first use and caches it for the lifetime of
+the process, so every caller (and every worker process) pays the cost at
+most once and only if it actually needs the resource.
+"""
+
+import functools
+import threading
+
+# Only lemmas, stop flags and is_alpha/is_digit are used downstream, so the
+# dependency parser and entity recognizer are never loaded
+SPACY_EXCLUDE = ("parser", "ner")
+
+def _locked(func):
+    """
+    Cache func's result per arguments. Cache hits take no lock; a miss
+    locks only its own arguments, so one slow load does not block the
+    loading (or lookup) of any other resource, and each loads only once.
+    """
+    cache = {}
+    locks = {}
+    registry_lock = threading.Lock()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+        with registry_lock:
+            lock = locks.setdefault(key, threading.Lock())
+        with lock:
+            if key not in cache:
+                cache[key] = func(*args, **kwargs)
+            return cache[key]
+
+    def cache_clear():
+        with registry_lock:
+            cache.clear()
+            locks.clear()
+
+    wrapper.cache_clear = cache_clear
+    return wrapper
+
+
+@_locked
+def get_spacy_model(name="es_core_news_sm", exclude=SPACY_EXCLUDE):
+    """Return the spaCy pipeline, loading it on first use."""
+    import spacy
+    return spacy.load(name, exclude=list(exclude))
+
+
+@_locked
+def get_word_tokenizer():
+    """Return NLTK's word_tokenize, downloading punkt only if it is missing."""
+    import nltk
+    from nltk.tokenize import word_tokenize
+
+    for resource in ("punkt", "punkt_tab"):
+        try:
+            nltk.data.find(f"tokenizers/{resource}")
+        except LookupError:
+            nltk.download(resource, quiet=True)
+    return word_tokenize
+
+
+@_locked
+def get_sentence_transformer(model_name="all-MiniLM-L6-v2"):
+    """Return a SentenceTransformer, loading it on first use."""
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
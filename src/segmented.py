@@ -0,0 +1,190 @@
+# src/segmented.py
+"""
+One topic model per segment (e.g. per question, or per question and region).
+
+The distinct responses are embedded once. Each segment then fits its own
+model on its share of those embeddings, and the fits run concurrently in a
+process pool. Every segment writes its model and topic table to
+outputs/segments/<segment>/. The combined outputs label every response
+with its segment, its segment-local Topic and a Global_Topic that is
+unique across segments, plus a segment_topics index of all topics. A
+segment whose fit fails is reported and its responses labeled -1; the
+other segments are still modeled.
+"""
+
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from src.incremental import AnalysisState
+from src.instrumentation import collect_traced, run_traced, span
+from src.modeling import DEFAULT_EMBEDDING_MODEL, resolve_embeddings, save_topic_model, train_topic_model
+from src.post_process_topic_model import extract_topic_info
+from src.preprocessing import STOP_WORDS
+from src.table_io import table_path, write_table
+
+SEGMENTS_DIR = "outputs/segments"
+
+logger = logging.getLogger("surveynlp.segments")
+
+
+def segment_slug(key) -> str:
+    """Directory-safe name of a segment key, e.g. ("Caribe", "Que ...?") -> "caribe__que_..."."""
+    parts = key if isinstance(key, tuple) else (key,)
+    return "__".join(re.sub(r"[^a-z0-9]+", "_", str(part).lower()).strip("_")[:40].rstrip("_")
+                      for part in parts)
+
+
+def segment_documents(df: pd.DataFrame, inverse, by=("question",)):
+    """
+    Split a deduplicated corpus into segments.
+
+    inverse maps each row of df to its distinct document. Yields
+    (key, rows, doc_ids, local_inverse, counts) per segment, where doc_ids
+    are the distinct documents in the segment, local_inverse maps the
+    segment's rows onto doc_ids and counts is the number of rows per document.
+    """
+    inverse = np.asarray(inverse)
+    groups = df.groupby(list(by), sort=True, observed=True).indices
+    for key, rows in groups.items():
+        doc_ids, local_inverse, counts = np.unique(inverse[rows], return_inverse=True, return_counts=True)
+        yield key, rows, doc_ids, local_inverse, counts
+
+
+def _fit_segment(key, docs, embeddings, counts, embedder, model_dir, stop_words):
+    """
+    Fit and save one segment's model; runs in a worker process. The
+    segment's embeddings are passed in, so the worker fits without an
+    embedding model and never loads a transformer; embedder is only saved
+    with the model for later transforms.
+    """
+    topic_model, topics, probs = train_topic_model(
+        docs, embeddings=embeddings, weights=counts, embedding_model=embedder, stop_words=stop_words
+    )
+    save_topic_model(topic_model, os.path.join(model_dir, "bertopic_model"))
+    return key, np.asarray(topics), np.asarray(probs), extract_topic_info(topic_model)
+
+
+def _fit_segment_or_error(key, *args):
+    """(result of _fit_segment, None), or (None, error) if the fit raised, so one segment cannot stop the others."""
+    try:
+        return _fit_segment(key, *args), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def fit_segments(df, embedding_docs, docs, inverse, by=("question",), model_name=DEFAULT_EMBEDDING_MODEL,
+                 cache_dir=None, n_jobs=None, min_docs=10, output_dir=SEGMENTS_DIR, stop_words=STOP_WORDS):
+    """
+    Fit one topic model per segment of df, concurrently.
+
+    embedding_docs, docs and inverse come from TextPipeline.unique_documents,
+    and stop_words from the same TextPipeline.
+    Segments with fewer than min_docs distinct documents are not modeled and
+    their responses are labeled -1, as are those of segments whose fit
+    failed. n_jobs=1 fits serially in this process.
+    Returns (df_with_topics, segment_topics, failed), where failed maps the
+    slug of each failed segment to its error.
+    """
+    with span("embed", rows=len(embedding_docs)):
+        embedder, _, embeddings = resolve_embeddings(embedding_docs, model_name, cache_dir=cache_dir)
+    embeddings = np.asarray(embeddings)
+
+    segments = {}
+    jobs = []
+    for key, rows, doc_ids, local_inverse, counts in segment_documents(df, inverse, by):
+        segments[key] = (rows, local_inverse)
+        if len(doc_ids) >= min_docs:
+            model_dir = os.path.join(output_dir, segment_slug(key))
+            jobs.append((key, [docs[i] for i in doc_ids], embeddings[doc_ids], counts, embedder, model_dir, stop_words))
+
+    # Largest segments first, so the pool is not left waiting on one late start
+    jobs.sort(key=lambda job: len(job[1]), reverse=True)
+    with span("fit_segments", rows=len(docs), segments=len(jobs)):
+        if n_jobs == 1:
+            outputs = [_fit_segment_or_error(*job) for job in jobs]
+        else:
+            # Spawned rather than forked workers, so they do not inherit the
+            # parent's loaded models or BLAS and tokenizer thread pools
+            with ProcessPoolExecutor(max_workers=n_jobs, mp_context=multiprocessing.get_context("spawn")) as executor:
+                # Workers send their spans back with each result
+                outputs = executor.map(partial(run_traced, _fit_segment_or_error), *zip(*jobs)) if jobs else []
+                outputs = list(collect_traced(outputs))
+
+    results, failed = [], {}
+    for job, (result, error) in zip(jobs, outputs):
+        if error is None:
+            results.append(result)
+        else:
+            failed[segment_slug(job[0])] = error
+            logger.warning("Segment %s failed, its responses are labeled -1: %s", segment_slug(job[0]), error)
+    return (*combine_segments(df, segments, results, by, output_dir), failed)
+
+
+def combine_segments(df, segments, results, by, output_dir=SEGMENTS_DIR):
+    """
+    Label every row with its segment, segment-local Topic and a Global_Topic
+    unique across segments, and build the segment_topics index.
+
+    segments maps each key to (rows, local_inverse); results holds the
+    (key, topics, probs, topic_info) of the segments that were modeled.
+    """
+    segment = np.empty(len(df), dtype=object)
+    for key, (rows, _) in segments.items():
+        segment[rows] = segment_slug(key)
+
+    topic = np.full(len(df), -1, dtype=np.int64)
+    probability = np.zeros(len(df), dtype=np.float32)
+    global_topic = np.full(len(df), -1, dtype=np.int64)
+    tables = []
+    next_id = 0
+    for key, topics, probs, topic_info in sorted(results, key=lambda result: segment_slug(result[0])):
+        rows, local_inverse = segments[key]
+        row_topics = topics[local_inverse]
+        topic[rows] = row_topics
+        probability[rows] = probs[local_inverse]
+
+        # Number the segment's topics after those of the previous segments
+        ids = np.unique(topics[topics != -1])
+        global_topic[rows] = np.where(row_topics == -1, -1, next_id + np.searchsorted(ids, row_topics))
+        table = topic_info.assign(Global_Topic=next_id + np.searchsorted(ids, topic_info["Topic"]))
+        next_id += len(ids)
+
+        parts = key if isinstance(key, tuple) else (key,)
+        table.insert(0, "Segment", segment_slug(key))
+        for position, (column, value) in enumerate(zip(by, parts), start=1):
+            table.insert(position, column, value)
+        write_table(table, os.path.join(output_dir, segment_slug(key), "topic_info.csv"))
+        tables.append(table)
+
+    df_with_topics = df.assign(Segment=segment, Topic=topic, Topic_Probability=probability,
+                               Global_Topic=global_topic)
+    columns = ["Segment", *by, "Topic", "Top_Words", "Count", "Global_Topic"]
+    segment_topics = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(columns=columns)
+    return df_with_topics, segment_topics
+
+
+def segments_fingerprint(segment_topics) -> str:
+    """Short hash of a segmented fit's topic index, the counterpart of modeling.model_fingerprint."""
+    columns = [column for column in ("Segment", "Topic", "Global_Topic", "Top_Words") if column in segment_topics]
+    hashes = pd.util.hash_pandas_object(segment_topics[columns], index=False).to_numpy()
+    return hashlib.sha1(hashes.tobytes()).hexdigest()[:16]
+
+
+def save_segments(df_with_topics, segment_topics, output_format="csv", output_dir="outputs"):
+    """
+    Save the labeled responses and the topic index, and rebuild the analysis
+    state of the global topics under segments/analysis_state for this fit.
+    """
+    write_table(df_with_topics, table_path("df_with_segment_topics", output_format, output_dir))
+    write_table(segment_topics, table_path("segment_topics", output_format, output_dir))
+    state = AnalysisState(fingerprint=segments_fingerprint(segment_topics))
+    state.update(df_with_topics.assign(Topic=df_with_topics["Global_Topic"]))
+    state.save(os.path.join(output_dir, "segments", "analysis_state"))
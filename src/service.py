@@ -0,0 +1,314 @@
+# src/service.py
+"""
+Local assignment service for live survey intake.
+
+The saved topic model is loaded once. Responses arrive as HTTP/JSON and
+each one is queued individually. A MicroBatcher coalesces queued
+responses, across requests, into batches of at most max_batch_size. A
+batch is dispatched when it is full or when its oldest response has waited
+max_wait_ms. Embedding and transform then run once per batch in a worker
+thread, so the event loop keeps accepting requests. The queue is bounded:
+a request that does not fit is rejected with 503 instead of queueing
+without limit behind a slow model.
+
+    POST /assign   {"responses": ["No hay agua", ...]}   or   {"response": "..."}
+                   items may also be objects with a "response" key plus metadata
+    GET  /metrics  batch sizes, queue wait and end-to-end latency percentiles
+    GET  /health
+
+Spans are not recorded while serving: /metrics covers the batches, and a
+long-running service would grow the trace without bound. Embeddings are
+not cached on disk by default either, since live responses are rarely
+repeated and every batch would reload and append to the cache.
+
+Only the standard library is used for HTTP.
+"""
+
+import asyncio
+import collections
+import json
+import time
+
+import numpy as np
+
+from src.instrumentation import tracer
+
+MAX_BODY_BYTES = 10 * 2**20
+MAX_QUEUE = 10_000
+
+
+class MicroBatcher:
+    """
+    Coalesces submitted items into batches for process_batch(items) -> results,
+    which runs in a thread so it may block. At most max_queue items wait at
+    once; submitting more raises asyncio.QueueFull.
+    """
+
+    def __init__(self, process_batch, max_batch_size=64, max_wait_ms=20, max_queue=MAX_QUEUE, history=10_000):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self._queue = None
+        self._worker = None
+        self._batch = []
+        self.batch_sizes = collections.deque(maxlen=history)
+        self.queue_waits = collections.deque(maxlen=history)
+        self.latencies = collections.deque(maxlen=history)
+        self.items = 0
+        self.errors = 0
+        self.rejected = 0
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the worker; items still queued or in its batch fail instead of waiting forever."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        stopped = RuntimeError("The batcher was stopped before this item was processed")
+        pending = self._batch
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        self._fail(pending, stopped)
+        self._batch = []
+
+    def _fail(self, batch, error):
+        for _, future, _ in batch:
+            if not future.done():
+                self.errors += 1
+                future.set_exception(error)
+
+    async def submit(self, item):
+        """Queue one item and wait for its result."""
+        return (await self.submit_many([item]))[0]
+
+    async def submit_many(self, items):
+        """
+        Queue all items, or none of them if they do not all fit (raising
+        asyncio.QueueFull), and wait for their results.
+        """
+        if self._worker is None:
+            raise RuntimeError("The batcher is not running")
+        if self._queue.maxsize and self._queue.qsize() + len(items) > self._queue.maxsize:
+            self.rejected += len(items)
+            raise asyncio.QueueFull(f"The queue is full ({self._queue.qsize()} waiting)")
+        loop = asyncio.get_running_loop()
+        enqueued = time.perf_counter()
+        futures = [loop.create_future() for _ in items]
+        for item, future in zip(items, futures):
+            self._queue.put_nowait((item, future, enqueued))
+        try:
+            return await asyncio.gather(*futures)
+        finally:
+            self.latencies.extend([time.perf_counter() - enqueued] * len(items))
+
+    async def _next_batch(self, batch):
+        """Fill batch (which stop() can see) with queued items; returns it."""
+        batch.append(await self._queue.get())
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                # Take whatever is already queued without waiting further
+                while len(batch) < self.max_batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._batch = []
+            batch = await self._next_batch(self._batch)
+            started = time.perf_counter()
+            self.batch_sizes.append(len(batch))
+            self.queue_waits.extend(started - enqueued for _, _, enqueued in batch)
+            try:
+                results = await loop.run_in_executor(None, self.process_batch, [item for item, _, _ in batch])
+            except Exception as e:
+                self._fail(batch, e)
+                continue
+            results = list(results)
+            done = min(len(results), len(batch))
+            self.items += done
+            for (_, future, _), result in zip(batch[:done], results):
+                if not future.done():
+                    future.set_result(result)
+            # A short result list must not leave the remaining callers waiting
+            self._fail(batch[done:], RuntimeError(
+                f"process_batch returned {len(results)} results for a batch of {len(batch)}"
+            ))
+
+    def metrics(self):
+        def percentiles(values):
+            if not values:
+                return None
+            p50, p95, p99 = np.percentile(np.asarray(values) * 1000, [50, 95, 99])
+            return {"p50_ms": round(p50, 2), "p95_ms": round(p95, 2), "p99_ms": round(p99, 2)}
+
+        return {
+            "items": self.items,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches": len(self.batch_sizes),
+            "mean_batch_size": round(float(np.mean(self.batch_sizes)), 2) if self.batch_sizes else None,
+            "queue_wait": percentiles(self.queue_waits),
+            "latency": percentiles(self.latencies),
+        }
+
+
+def topic_labeler(topic_model, cache_dir=None):
+    """process_batch function labeling responses with a fitted topic model."""
+    import pandas as pd
+
+    from src.modeling import assign_topics
+    from src.text_pipeline import TextPipeline
+    from src.topic_labels import get_topic_label
+
+    pipeline = TextPipeline()
+
+    def label(items):
+        responses = pd.Series([item["response"] for item in items], dtype=object)
+        embedding_docs, docs = pipeline.transform(responses)
+        topics, probs = assign_topics(topic_model, docs.tolist(), embedding_docs=embedding_docs.tolist(),
+                                      cache_dir=cache_dir)
+        return [{
+            "topic": int(topic),
+            "label": get_topic_label(int(topic)),
+            "confidence": None if probs is None else float(probs[i]),
+        } for i, topic in enumerate(topics)]
+
+    return label
+
+
+def _parse_items(payload):
+    items = payload.get("responses", [payload.get("response")] if "response" in payload else None)
+    if not isinstance(items, list) or not items:
+        raise ValueError('Expected {"responses": [...]} or {"response": "..."}')
+    parsed = []
+    for item in items:
+        item = {"response": item} if isinstance(item, str) else item
+        if not isinstance(item, dict) or not isinstance(item.get("response"), str):
+            raise ValueError("Each response must be a string or an object with a string 'response'")
+        parsed.append(item)
+    return parsed
+
+
+class AssignmentServer:
+    """Minimal HTTP/1.1 JSON server in front of a MicroBatcher."""
+
+    def __init__(self, batcher: MicroBatcher):
+        self.batcher = batcher
+        self.started = time.time()
+
+    async def _assign(self, payload):
+        items = _parse_items(payload)
+        start = time.perf_counter()
+        results = await self.batcher.submit_many(items)
+        latency_ms = round((time.perf_counter() - start) * 1000, 2)
+        # Echo metadata such as region or group alongside each assignment
+        merged = [{**{k: v for k, v in item.items() if k != "response"}, **result}
+                  for item, result in zip(items, results)]
+        return {"results": merged, "latency_ms": latency_ms}
+
+    async def _route(self, method, path, body):
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok", "uptime_s": round(time.time() - self.started, 1)}
+        if method == "GET" and path == "/metrics":
+            return 200, self.batcher.metrics()
+        if method == "POST" and path == "/assign":
+            try:
+                payload = json.loads(body or b"{}")
+                if not isinstance(payload, dict):
+                    raise ValueError("Expected a JSON object")
+                return 200, await self._assign(payload)
+            except ValueError as e:
+                return 400, {"error": str(e)}
+            except asyncio.QueueFull as e:
+                return 503, {"error": f"Overloaded, retry later: {e}"}
+            except Exception as e:
+                return 500, {"error": f"{type(e).__name__}: {e}"}
+        return 404, {"error": f"No route for {method} {path}"}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    status, response = 413, {"error": "Request body too large"}
+                    body = b""
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, response = await self._route(method, path.split("?", 1)[0], body)
+
+                data = json.dumps(response).encode("utf-8")
+                keep_alive = headers.get("connection", "").lower() != "close" and status != 413
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(process_batch, host="127.0.0.1", port=8080, max_batch_size=64, max_wait_ms=20, ready=None,
+                max_queue=MAX_QUEUE):
+    """Run the service until cancelled. ready, if given, is set once the socket is listening."""
+    batcher = MicroBatcher(process_batch, max_batch_size, max_wait_ms, max_queue)
+    await batcher.start()
+    server = await asyncio.start_server(AssignmentServer(batcher).handle, host, port)
+    if ready is not None:
+        ready.set_result(server.sockets[0].getsockname()[1])
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await batcher.stop()
+
+
+def run_service(model_path=None, host="127.0.0.1", port=8080, max_batch_size=64, max_wait_ms=20,
+                cache_dir=None, max_queue=MAX_QUEUE):
+    """
+    Load the saved topic model once and serve assignments until interrupted,
+    with tracing off. cache_dir, if given, caches the embeddings on disk.
+    """
+    from src.modeling import MODEL_PATH, load_topic_model
+
+    topic_model = load_topic_model(model_path or MODEL_PATH)
+    print(f"✅ Serving topic assignments on http://{host}:{port} "
+          f"(batches of up to {max_batch_size}, {max_wait_ms} ms max wait)")
+    enabled, tracer.enabled = tracer.enabled, False
+    try:
+        asyncio.run(serve(topic_labeler(topic_model, cache_dir), host, port, max_batch_size, max_wait_ms,
+                          max_queue=max_queue))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        tracer.enabled = enabled
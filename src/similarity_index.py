@@ -0,0 +1,288 @@
+# src/similarity_index.py
+"""
+"Show me responses like this one": nearest-neighbour search over the
+embeddings of the distinct survey responses.
+
+Exact search scores every response with blocked matrix multiplies, keeping
+a running top-k per query. For large corpora an IVF index can be built: the
+vectors are clustered with spherical k-means and only the n_probe clusters
+closest to a query are scored.
+
+The index stores one row per distinct response (the same deduplication the
+topic model uses) with its metadata and how many respondents gave it. The
+same response can come from respondents in several regions or groups, so
+those respondent-level columns are also kept as facets: one row per
+document and distinct (region, group, question) with its respondent count.
+Filters match a document if any of its respondents match.
+"""
+
+import copy
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from src.instrumentation import span
+from src.embedding_backends import get_backend
+from src.modeling import (DEFAULT_EMBEDDING_MODEL, document_strata, embed_documents, nearest_topics,
+                          normalize_rows, topic_centroids)
+from src.table_io import read_table, write_table
+from src.text_pipeline import TextPipeline
+
+INDEX_PATH = "outputs/similarity_index"
+# Corpora with more distinct responses than this also get IVF lists
+IVF_THRESHOLD = 100_000
+METADATA_COLUMNS = ("response", "region", "group", "question", "Topic", "Topic_Probability")
+# Respondent-level columns, which can differ between respondents who gave the same response
+FACET_COLUMNS = ("region", "group", "question")
+
+
+def _top_k(scores, k):
+    """Column indices of the k largest scores per row, best first."""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.empty((len(scores), 0), dtype=np.int64)
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1)
+
+
+class SimilarityIndex:
+    """
+    Cosine-similarity index over response embeddings.
+
+    metadata has one row per vector (response text, region, group, question,
+    Topic, Count). facets has one row per vector and distinct combination
+    of the FACET_COLUMNS among its respondents ("doc" is the vector's row,
+    "Count" its respondents); filters on those columns use it when given.
+    backend is the embedding backend used to embed text queries; it must be
+    the one that produced the vectors. Text queries are cleaned by pipeline
+    (a default TextPipeline if None) the way the indexed responses were.
+    """
+
+    def __init__(self, vectors, metadata: pd.DataFrame, backend=None, facets: pd.DataFrame = None,
+                 pipeline: TextPipeline = None):
+        self.vectors = vectors
+        self.metadata = metadata.reset_index(drop=True)
+        self.backend = backend
+        self.facets = facets
+        # Queries are only embedded, so they never need the lemmas
+        self.pipeline = copy.copy(pipeline) if pipeline is not None else TextPipeline()
+        self.pipeline.lemmatize = False
+        self.centroids = None
+        self.list_offsets = None
+        self.list_members = None
+
+    @classmethod
+    def from_labeled(cls, embeddings, df_with_topics: pd.DataFrame, inverse, backend=None, pipeline=None):
+        """
+        Index built from the unique-document embeddings of a fit, with the
+        metadata of the first response per document and its respondent count.
+        The facet columns shown in metadata are the most common combination
+        among the document's respondents; all of them are kept in facets.
+        """
+        inverse = np.asarray(inverse)
+        first_rows = np.unique(inverse, return_index=True)[1]
+        columns = [column for column in METADATA_COLUMNS if column in df_with_topics]
+        metadata = df_with_topics.iloc[first_rows][columns].assign(Count=np.bincount(inverse))
+        facet_columns = [column for column in FACET_COLUMNS if column in df_with_topics]
+        facets = None
+        if facet_columns:
+            metadata[facet_columns] = document_strata(df_with_topics[facet_columns], inverse).to_numpy()
+            facets = (df_with_topics[facet_columns].assign(doc=inverse)
+                      .groupby(["doc", *facet_columns], observed=True, dropna=False)
+                      .size().rename("Count").reset_index())
+        return cls(normalize_rows(embeddings), metadata, backend, facets, pipeline)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def build_ivf(self, n_lists=None, n_iter=10, sample_size=100_000, seed=0):
+        """Cluster the vectors into n_lists inverted lists (default about sqrt(n))."""
+        n = len(self.vectors)
+        n_lists = min(n_lists or max(1, int(np.sqrt(n))), n)
+        rng = np.random.default_rng(seed)
+        sample = self.vectors[np.sort(rng.choice(n, min(sample_size, n), replace=False))]
+        list_ids = np.arange(n_lists)
+
+        with span("ivf_kmeans", rows=len(sample), lists=n_lists):
+            centroids = normalize_rows(sample[rng.choice(len(sample), n_lists, replace=False)])
+            for _ in range(n_iter):
+                assigned, _ = nearest_topics(sample, list_ids, centroids)
+                # Empty lists keep their previous centroid
+                filled, means = topic_centroids(sample, assigned)
+                centroids[filled] = means
+
+        assigned, _ = nearest_topics(self.vectors, list_ids, centroids)
+        self.centroids = centroids
+        self.list_members = np.argsort(assigned, kind="stable")
+        self.list_offsets = np.concatenate(([0], np.cumsum(np.bincount(assigned, minlength=n_lists))))
+        return self
+
+    def _facet_counts(self, filters):
+        """
+        Respondents per vector who match all the facet filters, or None if
+        no filter is on a facet column.
+        """
+        if self.facets is None:
+            return None
+        facet_filters = {column: value for column, value in filters.items() if column in self.facets}
+        if not facet_filters:
+            return None
+        matches = np.ones(len(self.facets), dtype=bool)
+        for column, value in facet_filters.items():
+            matches &= self.facets[column].isin(np.atleast_1d(value)).to_numpy()
+        return np.bincount(self.facets["doc"].to_numpy()[matches],
+                           weights=self.facets["Count"].to_numpy()[matches], minlength=len(self))
+
+    def _mask(self, filters):
+        if not filters:
+            return None
+        mask = np.ones(len(self), dtype=bool)
+        counts = self._facet_counts(filters)
+        if counts is not None:
+            mask &= counts > 0
+        for column, value in filters.items():
+            if counts is None or column not in self.facets:
+                mask &= self.metadata[column].isin(np.atleast_1d(value)).to_numpy()
+        return mask
+
+    def _search_exact(self, queries, k, mask, block_size):
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_ids = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(self), block_size):
+            block = queries @ np.asarray(self.vectors[start:start + block_size]).T
+            if mask is not None:
+                block[:, ~mask[start:start + block_size]] = -np.inf
+            block_ids = np.broadcast_to(np.arange(start, start + block.shape[1]), block.shape)
+            # Merge the block with the best hits so far
+            scores = np.hstack([best_scores, block])
+            ids = np.hstack([best_ids, block_ids])
+            top = _top_k(scores, k)
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_ids = np.take_along_axis(ids, top, axis=1)
+        return best_ids, best_scores
+
+    def _search_ivf(self, queries, k, mask, n_probe):
+        probes = _top_k(queries @ self.centroids.T, n_probe)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for i, lists in enumerate(probes):
+            candidates = np.concatenate([
+                self.list_members[self.list_offsets[j]:self.list_offsets[j + 1]] for j in lists
+            ])
+            if mask is not None:
+                candidates = candidates[mask[candidates]]
+            candidate_scores = np.asarray(self.vectors[candidates]) @ queries[i]
+            top = _top_k(candidate_scores[None, :], k)[0]
+            ids[i, :len(top)] = candidates[top]
+            scores[i, :len(top)] = candidate_scores[top]
+        return ids, scores
+
+    def search(self, query_vectors, k=10, n_probe=None, block_size=65_536, **filters):
+        """
+        Top-k most similar responses for each query vector.
+
+        Exact unless the IVF lists are built and n_probe is given. filters
+        restrict the candidates by metadata, e.g. region="Caribe". Returns
+        (ids, scores) arrays of shape (n_queries, k); missing hits are -1.
+        """
+        queries = normalize_rows(np.atleast_2d(query_vectors))
+        mask = self._mask(filters)
+        with span("similarity_search", rows=len(queries), k=k, n_probe=n_probe):
+            if n_probe is not None and self.centroids is not None:
+                ids, scores = self._search_ivf(queries, k, mask, n_probe)
+            else:
+                ids, scores = self._search_exact(queries, k, mask, block_size)
+        found = np.isfinite(scores)
+        return np.where(found, ids, -1), np.where(found, scores, np.nan)
+
+    def query(self, texts, k=10, n_probe=None, **filters) -> pd.DataFrame:
+        """
+        Responses most similar to each text, with their metadata.
+        One row per hit; "query" and "rank" identify the text and position.
+        With region, group or question filters, Count is the number of
+        respondents who gave the response and match the filters.
+        """
+        if self.backend is None:
+            raise ValueError("This index has no embedding backend; use search() with vectors")
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        # Embed the same cleaned text (response_clean) the index was built from
+        embedding_text, _ = self.pipeline.transform(pd.Series(texts, dtype=object))
+        ids, scores = self.search(self.backend.encode(embedding_text.astype(str).tolist()),
+                                  k=k, n_probe=n_probe, **filters)
+        counts = self._facet_counts(filters)
+        rows = []
+        for text, hit_ids, hit_scores in zip(texts, ids, scores):
+            hits = hit_ids >= 0
+            result = self.metadata.iloc[hit_ids[hits]].reset_index(drop=True)
+            if counts is not None:
+                result["Count"] = counts[hit_ids[hits]].astype(np.int64)
+            result.insert(0, "similarity", hit_scores[hits])
+            result.insert(0, "rank", np.arange(1, hits.sum() + 1))
+            result.insert(0, "query", text)
+            rows.append(result)
+        return pd.concat(rows, ignore_index=True)
+
+    def save(self, path=INDEX_PATH):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "vectors.npy"), np.asarray(self.vectors, dtype=np.float32))
+        write_table(self.metadata, os.path.join(path, "metadata.csv"))
+        if self.facets is not None:
+            write_table(self.facets, os.path.join(path, "facets.csv"))
+        elif os.path.exists(os.path.join(path, "facets.csv")):
+            os.remove(os.path.join(path, "facets.csv"))
+        if self.centroids is not None:
+            np.savez(os.path.join(path, "ivf.npz"), centroids=self.centroids,
+                     list_members=self.list_members, list_offsets=self.list_offsets)
+        if self.backend is not None:
+            with open(os.path.join(path, "backend.pkl"), "wb") as f:
+                pickle.dump(self.backend, f, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(os.path.join(path, "pipeline.pkl"), "wb") as f:
+            pickle.dump(self.pipeline, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path=INDEX_PATH) -> "SimilarityIndex":
+        """Load an index; vectors are memory-mapped rather than read into memory."""
+        if not os.path.exists(os.path.join(path, "vectors.npy")):
+            raise FileNotFoundError(f"No similarity index at {path}, run a fit first")
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        backend = None
+        if os.path.exists(os.path.join(path, "backend.pkl")):
+            with open(os.path.join(path, "backend.pkl"), "rb") as f:
+                backend = pickle.load(f)
+        pipeline = None
+        if os.path.exists(os.path.join(path, "pipeline.pkl")):
+            with open(os.path.join(path, "pipeline.pkl"), "rb") as f:
+                pipeline = pickle.load(f)
+        facets = None
+        if os.path.exists(os.path.join(path, "facets.csv")):
+            facets = read_table(os.path.join(path, "facets.csv"))
+        index = cls(vectors, read_table(os.path.join(path, "metadata.csv")), backend, facets, pipeline)
+        if os.path.exists(os.path.join(path, "ivf.npz")):
+            with np.load(os.path.join(path, "ivf.npz")) as ivf:
+                index.centroids = ivf["centroids"]
+                index.list_members = ivf["list_members"]
+                index.list_offsets = ivf["list_offsets"]
+        return index
+
+
+def build_index(topic_model, embedding_docs, df_with_topics, inverse, cache_dir=None,
+                ivf_threshold=IVF_THRESHOLD, pipeline=None):
+    """
+    Index the documents a topic model was fitted on.
+
+    Embeddings are read back from the embedding cache the fit wrote to
+    (cache_dir), so nothing is re-encoded; without a cache they are
+    recomputed with the model's backend. pipeline is the TextPipeline that
+    produced embedding_docs, kept to clean text queries the same way.
+    """
+    model_name = getattr(topic_model, "embedding_model_name_", DEFAULT_EMBEDDING_MODEL)
+    backend = getattr(topic_model, "embedding_backend_", None) or get_backend(model_name)
+    embeddings = embed_documents(embedding_docs, backend, model_name, cache_dir)
+    index = SimilarityIndex.from_labeled(embeddings, df_with_topics, inverse, backend, pipeline)
+    if len(index) > ivf_threshold:
+        index.build_ivf()
+    return index
+
@@ -0,0 +1,291 @@
+# src/stage_graph.py
+"""
+Minimal stage-graph runner with content-hash caching.
+
+Each Stage declares the artifacts it consumes and produces. A stage's cache
+key hashes its name, code, parameters and the fingerprints of its inputs;
+source inputs are fingerprinted by content (files by their bytes) and stage
+outputs by the key of the stage that produced them. The code covers the
+stage function and the source of every project module it uses, directly or
+through the modules they import. A stage whose key is already in the cache
+is skipped, and its outputs are only unpickled when a stage that actually
+runs needs them.
+
+A cached stage still runs when it is forced, or when one of the files it
+writes as a side effect is missing or was changed since it ran (its size
+and modification time are stored with the cache entry), e.g. by a fit or
+assign run outside the graph. Its outputs may then differ from the cached
+ones under the same key, so every stage downstream of it runs too.
+"""
+
+import ast
+import glob
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+import pickle
+import sys
+import time
+import types
+
+from src.instrumentation import span
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def fingerprint(value) -> str:
+    """Content hash of a source input; existing file paths hash the file bytes."""
+    if isinstance(value, str) and os.path.isfile(value):
+        digest = hashlib.sha256()
+        with open(value, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    return _sha256(pickle.dumps(value))
+
+
+def _file_stamp(path):
+    """[mtime_ns, size] of a file, one such entry per file for a directory, None if missing."""
+    if os.path.isdir(path):
+        return [[os.path.relpath(os.path.join(root, name), path), *_file_stamp(os.path.join(root, name))]
+                for root, _, names in sorted(os.walk(path)) for name in sorted(names)]
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _code_names(code) -> set:
+    """Names a code object, and the functions nested in it, look up or import."""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _code_names(const)
+    return names
+
+
+def _module_file(name):
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError, AttributeError):
+        return None
+    origin = getattr(spec, "origin", None)
+    return origin if origin and origin.endswith(".py") else None
+
+
+def _imported_modules(path) -> set:
+    """Absolute module names a source file imports, at any level of nesting."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module)
+            names.update(f"{node.module}.{alias.name}" for alias in node.names)
+    return names
+
+
+def _project_modules(func) -> dict:
+    """
+    Source files of the project modules func uses: those referenced by its
+    code, plus everything they import in turn. Project modules are the ones
+    under the directory that holds func's top-level package.
+    """
+    module = sys.modules.get(func.__module__)
+    if getattr(module, "__file__", None) is None:
+        return {}
+    root = os.path.dirname(os.path.abspath(module.__file__))
+    for _ in range(func.__module__.count(".")):
+        root = os.path.dirname(root)
+
+    pending = set()
+    for name in _code_names(func.__code__):
+        value = func.__globals__.get(name)
+        if isinstance(value, types.ModuleType):
+            pending.add(value.__name__)
+        elif value is not None and getattr(value, "__module__", None):
+            pending.add(value.__module__)
+        elif value is None:
+            pending.add(name)  # a module imported inside the function
+
+    files = {}
+    while pending:
+        name = pending.pop()
+        path = _module_file(name)
+        if (name in files or path is None or "site-packages" in path
+                or not os.path.abspath(path).startswith(root + os.sep)):
+            continue
+        files[name] = path
+        pending |= _imported_modules(path) - set(files)
+    return files
+
+
+def _code_hash(func) -> str:
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        source = f"{func.__module__}.{func.__qualname__}"
+    digest = hashlib.sha256(source.encode("utf-8"))
+    if hasattr(func, "__code__"):
+        # Module-level constants the function reads (e.g. a threshold)
+        for name in sorted(_code_names(func.__code__)):
+            value = func.__globals__.get(name)
+            if isinstance(value, (bool, int, float, str, bytes, tuple, frozenset)):
+                digest.update(f"{name}={value!r}".encode("utf-8"))
+        for name, path in sorted(_project_modules(func).items()):
+            digest.update(name.encode("utf-8"))
+            digest.update(fingerprint(path).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class Stage:
+    """
+    A pipeline step: func(**inputs, **params) returns a dict with one entry
+    per declared output. files lists the paths it writes as side effects
+    (tables, plots); the stage reruns when any of them is missing.
+    """
+
+    def __init__(self, name, func, inputs=(), outputs=(), params=None, files=()):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = dict(params or {})
+        self.files = list(files)
+
+    def key(self, input_fingerprints) -> str:
+        payload = json.dumps({
+            "stage": self.name,
+            "code": _code_hash(self.func),
+            "params": self.params,
+            "inputs": input_fingerprints,
+        }, sort_keys=True, default=repr)
+        return _sha256(payload.encode("utf-8"))
+
+
+class StageGraph:
+    def __init__(self, stages, cache_dir="data/cache/stages"):
+        self.stages = list(stages)
+        self.cache_dir = cache_dir
+        self.producers = {}
+        for stage in self.stages:
+            for output in stage.outputs:
+                if output in self.producers:
+                    raise ValueError(f"Artifact '{output}' is produced by more than one stage")
+                self.producers[output] = stage
+        self.report = []
+
+    def _ordered(self, sources, targets=None):
+        """Stages needed for targets, in dependency order."""
+        wanted = [self.producers[t] for t in targets] if targets else self.stages
+        ordered, visiting, done = [], set(), set()
+
+        def visit(stage):
+            if stage.name in done:
+                return
+            if stage.name in visiting:
+                raise ValueError(f"Cycle detected at stage '{stage.name}'")
+            visiting.add(stage.name)
+            for name in stage.inputs:
+                if name in self.producers:
+                    visit(self.producers[name])
+                elif name not in sources:
+                    raise KeyError(f"Stage '{stage.name}' needs '{name}', which no stage or source provides")
+            visiting.discard(stage.name)
+            done.add(stage.name)
+            ordered.append(stage)
+
+        for stage in wanted:
+            visit(stage)
+        return ordered
+
+    def _cache_path(self, stage, key):
+        return os.path.join(self.cache_dir, stage.name, f"{key}.pkl")
+
+    def _stamps_path(self, stage, key):
+        return os.path.join(self.cache_dir, stage.name, f"{key}.files.json")
+
+    def _files_changed(self, stage, key):
+        """Whether a side-effect file is missing or differs from when the stage last ran."""
+        if not stage.files:
+            return False
+        try:
+            with open(self._stamps_path(stage, key)) as f:
+                recorded = json.load(f)
+        except (OSError, ValueError):
+            return True
+        return any(_file_stamp(path) is None or _file_stamp(path) != recorded.get(path) for path in stage.files)
+
+    def _load(self, stage, key):
+        with open(self._cache_path(stage, key), "rb") as f:
+            return pickle.load(f)
+
+    def _store(self, stage, key, results):
+        path = self._cache_path(stage, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Only the latest result per stage is kept
+        for stale in glob.glob(os.path.join(os.path.dirname(path), "*.pkl")) + \
+                glob.glob(os.path.join(os.path.dirname(path), "*.files.json")):
+            os.remove(stale)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(results, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        if stage.files:
+            with open(self._stamps_path(stage, key), "w") as f:
+                json.dump({path: _file_stamp(path) for path in stage.files}, f)
+
+    def run(self, sources, targets=None, force=()):
+        """
+        Run the graph and return the requested artifacts (the outputs no other
+        stage consumes when targets is None). Stages named in force, and every
+        stage downstream of them, run even if cached.
+        """
+        fingerprints = {name: fingerprint(value) for name, value in sources.items()}
+        values = dict(sources)
+        keys = {}
+        rerun = set()  # stages run under a key that was already cached
+        self.report = []
+
+        def value_of(name):
+            if name not in values:
+                stage = self.producers[name]
+                values.update(self._load(stage, keys[stage.name]))
+            return values[name]
+
+        for stage in self._ordered(sources, targets):
+            key = stage.key({name: fingerprints[name] for name in stage.inputs})
+            keys[stage.name] = key
+            for output in stage.outputs:
+                fingerprints[output] = f"{key}:{output}"
+
+            cached = os.path.exists(self._cache_path(stage, key))
+            upstream_rerun = any(self.producers[name].name in rerun
+                                 for name in stage.inputs if name in self.producers)
+            if cached and not (stage.name in force or upstream_rerun or self._files_changed(stage, key)):
+                self.report.append((stage.name, "cached", 0.0))
+                continue
+            if cached:
+                rerun.add(stage.name)
+
+            start = time.perf_counter()
+            kwargs = {name: value_of(name) for name in stage.inputs}
+            with span(stage.name, kind="stage"):
+                results = stage.func(**kwargs, **stage.params) or {}
+            missing = set(stage.outputs) - set(results)
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' did not return {sorted(missing)}")
+            self._store(stage, key, results)
+            values.update(results)
+            self.report.append((stage.name, "ran", time.perf_counter() - start))
+
+        if targets is None:
+            consumed = {name for stage in self.stages for name in stage.inputs}
+            targets = [output for output in self.producers if output not in consumed]
+        return {name: value_of(name) for name in targets}
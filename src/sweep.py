@@ -0,0 +1,191 @@
+# src/sweep.py
+"""
+Hyperparameter sweeps over the topic model's reduction, clustering and
+vectorizer settings, without a full refit per configuration.
+
+A BERTopic fit is embed -> UMAP -> HDBSCAN -> vectorizer + c-TF-IDF. The
+sweep runs each stage once per distinct setting of the parameters it
+depends on. Documents are embedded once. They are reduced once per UMAP
+setting, and clustered once per UMAP x HDBSCAN setting, with the
+clusterings running in parallel in a process pool. Every vectorizer
+setting is then scored against each clustering from one shared
+document-term matrix.
+
+    grid = {"min_topic_size": [5, 10, 20], "min_df": [1, 2], "n_neighbors": [10, 15]}
+    results = sweep(docs, grid, embedding_docs=embedding_docs, weights=counts)
+
+Each configuration is reported with its topic count, outlier share (of
+respondents, when weights are the duplicate counts), vocabulary size and
+the NPMI coherence of its topics' top words.
+"""
+
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.instrumentation import span
+from src.modeling import DEFAULT_EMBEDDING_MODEL, ctfidf_top_terms, make_vectorizer, resolve_embeddings
+from src.preprocessing import STOP_WORDS
+
+# BERTopic's defaults, and this repo's vectorizer settings
+UMAP_PARAMS = {"n_neighbors": 15, "n_components": 5, "min_dist": 0.0}
+HDBSCAN_PARAMS = {"min_topic_size": 5, "min_samples": None, "cluster_selection_method": "eom"}
+VECTORIZER_PARAMS = {"min_df": 2, "max_df": 0.95}
+
+
+def expand_grid(grid, defaults):
+    """Every combination of the grid's values for the keys of defaults; other keys keep their default."""
+    values = []
+    for key, default in defaults.items():
+        value = grid.get(key, [default])
+        values.append(value if isinstance(value, (list, tuple)) else [value])
+    return [dict(zip(defaults, combination)) for combination in itertools.product(*values)]
+
+
+def make_umap(params, seed=42):
+    from umap import UMAP
+
+    return UMAP(n_neighbors=params["n_neighbors"], n_components=params["n_components"],
+                min_dist=params["min_dist"], metric="cosine", random_state=seed)
+
+
+def make_hdbscan(params):
+    import hdbscan
+
+    return hdbscan.HDBSCAN(min_cluster_size=params["min_topic_size"], min_samples=params["min_samples"],
+                           metric="euclidean", cluster_selection_method=params["cluster_selection_method"],
+                           prediction_data=True)
+
+
+def term_mask(topic_term, min_df=2, max_df=0.95):
+    """
+    Terms a CountVectorizer with min_df and max_df would keep when fitted,
+    as BERTopic does, on one concatenated document per topic.
+    Integers count topics, floats are shares of topics; with too few topics
+    for both limits every term is kept, as TopicVectorizer does.
+    """
+    from src.topic_vectorizer import document_limits
+
+    topic_freq = np.bincount(topic_term.tocsr().indices, minlength=topic_term.shape[1])
+    min_count, max_count = document_limits(min_df, max_df, topic_term.shape[0])
+    if max_count < min_count:
+        min_count, max_count = 1, topic_term.shape[0]
+    return (topic_freq >= min_count) & (topic_freq <= max_count)
+
+
+def npmi_coherence(presence, top_terms, weights=None):
+    """
+    Mean over topics of the average normalized PMI of their top term pairs,
+    from document co-occurrence. presence is a CSC binary document-term
+    matrix; weights count each document that many times.
+    """
+    weights = np.ones(presence.shape[0]) if weights is None else np.asarray(weights, dtype=np.float64)
+    total = weights.sum()
+    scores = []
+    for terms in top_terms:
+        if len(terms) < 2:
+            continue
+        columns = presence[:, terms]
+        joint = (columns.T.multiply(weights) @ columns).toarray() / total
+        first, second = np.triu_indices(len(terms), 1)
+        p_joint = joint[first, second]
+        p_first, p_second = joint[first, first], joint[second, second]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            npmi = np.log(p_joint / (p_first * p_second)) / -np.log(p_joint)
+        # Never co-occurring is -1; always co-occurring is 1
+        npmi = np.where(p_joint == 0, -1.0, np.where(p_joint >= 1, 1.0, npmi))
+        scores.append(npmi.mean())
+    return float(np.mean(scores)) if scores else np.nan
+
+
+_shared = {}
+
+
+def _init_worker(doc_term, weights, vectorizer_grid, top_n):
+    """Share the document-term matrix with a worker once, not once per job."""
+    _shared.update(doc_term=doc_term, presence=(doc_term > 0).astype(np.float64).tocsc(),
+                   weights=weights, vectorizer_grid=vectorizer_grid, top_n=top_n)
+
+
+def _score(labels, vectorizer_params):
+    from scipy import sparse
+
+    doc_term, weights = _shared["doc_term"], _shared["weights"]
+    topic_ids, codes = np.unique(labels, return_inverse=True)
+    # Like the fit, the vectorizer and c-TF-IDF count each distinct document
+    # once; weights only count respondents in the outlier share and coherence
+    membership = sparse.csr_matrix((np.ones(len(codes)), (codes, np.arange(len(codes)))),
+                                   shape=(len(topic_ids), len(codes)))
+    topic_term = (membership @ doc_term).tocsr()
+
+    terms = np.flatnonzero(term_mask(topic_term, **vectorizer_params))
+    top_terms = [terms[top] for top in ctfidf_top_terms(topic_term[:, terms], _shared["top_n"])] if len(terms) else []
+    topic_terms = [top for topic_id, top in zip(topic_ids, top_terms) if topic_id != -1]
+    return {
+        "n_topics": int(np.count_nonzero(topic_ids != -1)),
+        "outlier_share": round(float(weights[labels == -1].sum() / weights.sum()), 4),
+        "vocabulary": len(terms),
+        "coherence": round(npmi_coherence(_shared["presence"], topic_terms, weights), 4),
+    }
+
+
+def _cluster_and_score(hdbscan_params, reduced):
+    """Cluster one reduction and score every vectorizer setting against it."""
+    labels = make_hdbscan(hdbscan_params).fit(reduced).labels_
+    return [_score(labels, params) for params in _shared["vectorizer_grid"]]
+
+
+def sweep(docs, grid, embedding_docs=None, weights=None, model_name=DEFAULT_EMBEDDING_MODEL,
+          embedding_model=None, embeddings=None, cache_dir=None, n_jobs=None, top_n=10, seed=42,
+          reducer=make_umap, stop_words=STOP_WORDS) -> pd.DataFrame:
+    """
+    Score every configuration of grid, a dict mapping parameter names of
+    UMAP_PARAMS, HDBSCAN_PARAMS and VECTORIZER_PARAMS to lists of values.
+
+    docs, embedding_docs and embedding arguments are as for
+    train_topic_model. reducer(params, seed) builds the dimensionality
+    reduction for one UMAP setting; stop_words are the TextPipeline's, as
+    for train_topic_model. n_jobs=1 clusters serially in this
+    process. Returns one row per configuration; coherence is NaN when a
+    vectorizer setting leaves no terms.
+    """
+    unknown = set(grid) - set(UMAP_PARAMS) - set(HDBSCAN_PARAMS) - set(VECTORIZER_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {sorted(unknown)}")
+    reductions = expand_grid(grid, UMAP_PARAMS)
+    clusterings = expand_grid(grid, HDBSCAN_PARAMS)
+    vectorizers = expand_grid(grid, VECTORIZER_PARAMS)
+    weights = np.ones(len(docs)) if weights is None else np.asarray(weights, dtype=np.float64)
+
+    with span("embed", rows=len(docs)):
+        _, _, embeddings = resolve_embeddings(docs if embedding_docs is None else embedding_docs,
+                                              model_name, embedding_model, embeddings, cache_dir)
+    with span("vectorize", rows=len(docs)):
+        doc_term = make_vectorizer(min_df=1, max_df=1.0, stop_words=stop_words).fit_transform(docs).tocsr()
+
+    jobs = []
+    for umap_params in reductions:
+        with span("reduce", rows=len(docs), **umap_params):
+            reduced = reducer(umap_params, seed).fit_transform(embeddings)
+        jobs += [(umap_params, hdbscan_params, reduced) for hdbscan_params in clusterings]
+
+    shared = (doc_term, weights, vectorizers, top_n)
+    with span("cluster", rows=len(docs), configurations=len(jobs) * len(vectorizers)):
+        if n_jobs == 1:
+            _init_worker(*shared)
+            results = [_cluster_and_score(hdbscan_params, reduced) for _, hdbscan_params, reduced in jobs]
+        else:
+            # Spawned, not forked: forking after UMAP has started its numba threads can deadlock
+            with ProcessPoolExecutor(max_workers=n_jobs, mp_context=multiprocessing.get_context("spawn"),
+                                     initializer=_init_worker, initargs=shared) as executor:
+                results = list(executor.map(_cluster_and_score, *zip(*[job[1:] for job in jobs])))
+
+    rows = [
+        {**umap_params, **hdbscan_params, **vectorizer_params, **scores}
+        for (umap_params, hdbscan_params, _), configuration_scores in zip(jobs, results)
+        for vectorizer_params, scores in zip(vectorizers, configuration_scores)
+    ]
+    return pd.DataFrame(rows)
@@ -1,6 +1,9 @@
+import numpy as np
 import pandas as pd
 import random
 import os
+import itertools
+from functools import lru_cache
 
 # Define possible responses and metadata
 regions = ['Pacifico', 'Amazonas', 'Andina', 'Orinoquia', 'Caribe']
@@ -40,26 +43,113 @@ answers_by_theme = {
     ]
 }
 
+# Paraphrase noise: openings, filler endings and time details added to a phrase
+prefixes = ["", "Creo que ", "Pienso que ", "La verdad, ", "Para mi, "]
+noise_suffixes = ["", " (segun mi experiencia)", " en mi comunidad", " personalmente hablando"]
+details = [""] + [f" desde hace {years} anos" for years in range(1, 31)]
+
 def generate_response():
     theme = random.choice(list(answers_by_theme.keys()))
     phrase = random.choice(answers_by_theme[theme])
     noise = random.choice(["", "", " (segun mi experiencia)", " en mi comunidad", " personalmente hablando"])
     return f"{phrase}{noise}"
 
-def generate_dataset(n=200):
-    data = []
-    for _ in range(n):
-        region = random.choice(regions)
-        group = random.choice(groups)
-        question = random.choice(questions)
-        response = generate_response()
-        data.append({
-            "region": region,
-            "group": group,
-            "question": question,
-            "response": response
-        })
-    return pd.DataFrame(data)
+def _probabilities(skew, k):
+    """
+    Sampling probabilities for k categories. skew is either explicit weights
+    or a Zipf exponent: 0 is uniform, larger values favor the first categories.
+    """
+    if np.ndim(skew):
+        weights = np.asarray(skew, dtype=float)
+        if len(weights) != k:
+            raise ValueError(f"Expected {k} weights, got {len(weights)}")
+    else:
+        weights = np.arange(1, k + 1, dtype=float) ** -float(skew)
+    return weights / weights.sum()
+
+@lru_cache(maxsize=1)
+def _response_catalog():
+    """Every phrase/noise combination, and the theme of each phrase."""
+    themes = list(answers_by_theme)
+    phrases = [phrase for theme in themes for phrase in answers_by_theme[theme]]
+    phrase_theme = np.repeat(np.arange(len(themes)), [len(answers_by_theme[t]) for t in themes])
+    catalog = []
+    for prefix, phrase, suffix, detail in itertools.product(prefixes, phrases, noise_suffixes, details):
+        # Lowercase the phrase after an opening so the sentence reads naturally
+        body = phrase[0].lower() + phrase[1:] if prefix else phrase
+        catalog.append(f"{prefix}{body}{detail}{suffix}")
+    return np.array(catalog, dtype=object), phrase_theme
+
+def generate_chunk(n, rng, theme_skew=0.0, region_skew=0.0, group_skew=0.0,
+                   noise_rate=0.4, duplicate_rate=0.0):
+    """
+    Draw n survey rows with NumPy.
+
+    noise_rate is the share of responses that get paraphrase noise (an
+    opening, a filler ending and/or a time detail); duplicate_rate is the
+    share of rows whose response repeats another row's response verbatim.
+    """
+    catalog, phrase_theme = _response_catalog()
+    n_themes = phrase_theme.max() + 1
+
+    region = rng.choice(len(regions), size=n, p=_probabilities(region_skew, len(regions)))
+    group = rng.choice(len(groups), size=n, p=_probabilities(group_skew, len(groups)))
+    question = rng.integers(len(questions), size=n)
+
+    # Pick a theme, then a phrase within it
+    theme = rng.choice(n_themes, size=n, p=_probabilities(theme_skew, n_themes))
+    theme_start = np.searchsorted(phrase_theme, np.arange(n_themes))
+    theme_size = np.bincount(phrase_theme)
+    phrase = theme_start[theme] + (rng.random(n) * theme_size[theme]).astype(np.intp)
+
+    noisy = rng.random(n) < noise_rate
+    prefix = np.where(noisy, rng.integers(len(prefixes), size=n), 0)
+    suffix = np.where(noisy, rng.integers(len(noise_suffixes), size=n), 0)
+    detail = np.where(noisy, rng.integers(len(details), size=n), 0)
+    codes = np.ravel_multi_index(
+        (prefix, phrase, suffix, detail),
+        (len(prefixes), len(phrase_theme), len(noise_suffixes), len(details))
+    )
+
+    duplicated = np.flatnonzero(rng.random(n) < duplicate_rate)
+    if len(duplicated):
+        codes[duplicated] = codes[rng.integers(n, size=len(duplicated))]
+
+    return pd.DataFrame({
+        "region": pd.Categorical.from_codes(region, categories=regions),
+        "group": pd.Categorical.from_codes(group, categories=groups),
+        "question": pd.Categorical.from_codes(question, categories=questions),
+        "response": catalog[codes],
+    })
+
+def iter_chunks(n, chunksize=100_000, seed=None, **options):
+    """
+    Yield generate_chunk frames totalling n rows. A given seed and chunksize
+    always produce the same rows.
+    """
+    rng = np.random.default_rng(seed)
+    for start in range(0, n, chunksize):
+        yield generate_chunk(min(chunksize, n - start), rng, **options)
+
+def generate_dataset(n=200, seed=None, **options):
+    """Synthetic survey of n rows with categorical metadata, see generate_chunk for the options."""
+    return generate_chunk(n, np.random.default_rng(seed), **options)
+
+def write_dataset(n, out_path="data/raw/survey_data.csv", chunksize=100_000, seed=None, **options):
+    """
+    Stream n synthetic rows to a CSV or Parquet file, one chunk at a time,
+    so memory stays bounded by chunksize.
+    """
+    from src.table_io import TableWriter
+
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    writer = TableWriter(out_path)
+    try:
+        for chunk in iter_chunks(n, chunksize=chunksize, seed=seed, **options):
+            writer.write(chunk)
+    finally:
+        writer.close()
+    print(f"✅ {n} synthetic rows saved to {out_path}")
 
 def save_dataset(df, out_path="data/raw/survey_data.csv"):
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
@@ -67,5 +157,19 @@ def save_dataset(df, out_path="data/raw/survey_data.csv"):
     print(f"✅ Synthetic data saved to {out_path}")
 
 if __name__ == "__main__":
-    df = generate_dataset(n=300)
-    save_dataset(df)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic survey")
+    parser.add_argument("-n", type=int, default=300, help="Number of rows")
+    parser.add_argument("--out", default="data/raw/survey_data.csv", help="CSV or .parquet output path")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--chunksize", type=int, default=100_000)
+    parser.add_argument("--theme-skew", type=float, default=0.0)
+    parser.add_argument("--region-skew", type=float, default=0.0)
+    parser.add_argument("--group-skew", type=float, default=0.0)
+    parser.add_argument("--noise-rate", type=float, default=0.4)
+    parser.add_argument("--duplicate-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    write_dataset(args.n, args.out, chunksize=args.chunksize, seed=args.seed,
+                  theme_skew=args.theme_skew, region_skew=args.region_skew, group_skew=args.group_skew,
+                  noise_rate=args.noise_rate, duplicate_rate=args.duplicate_rate)
@@ -0,0 +1,165 @@
+# src/table_io.py
+"""
+Reading and writing pipeline tables as CSV or Parquet.
+
+Parquet output keeps dtypes: metadata columns are stored as categoricals
+(dictionary encoded), topic IDs as compact integers and confidences as
+float32. Reads support column projection. A Parquet table that waves are
+appended to becomes a dataset directory with one part file per wave.
+"""
+
+import glob
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+FORMATS = ("csv", "parquet")
+CATEGORICAL_COLUMNS = ("region", "group", "question")
+
+
+def table_path(name, output_format="csv", output_dir="outputs"):
+    """Path of a named output table, e.g. table_path("df_with_topics", "parquet")."""
+    if output_format not in FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}', expected one of {FORMATS}")
+    return os.path.join(output_dir, f"{name}.{output_format}")
+
+
+def optimize_dtypes(df: pd.DataFrame, categorical=CATEGORICAL_COLUMNS) -> pd.DataFrame:
+    """Categorical metadata columns, smallest integer topic IDs, float32 confidences."""
+    converted = {}
+    for column in categorical:
+        if column in df and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            converted[column] = df[column].astype("category")
+    if "Topic" in df and pd.api.types.is_integer_dtype(df["Topic"]):
+        converted["Topic"] = pd.to_numeric(df["Topic"], downcast="integer")
+    for column in ("Topic_Probability", "Probability"):
+        if column in df and pd.api.types.is_float_dtype(df[column]):
+            converted[column] = df[column].astype(np.float32)
+    return df.assign(**converted) if converted else df
+
+
+def as_categorical(values, index=None, name=None) -> pd.Series:
+    """
+    Series of values stored as a categorical: one copy of each distinct value
+    plus integer codes, for text columns with many repeats.
+    """
+    codes, uniques = pd.factorize(values)
+    categorical = pd.Categorical.from_codes(codes, categories=pd.Index(uniques, dtype=object))
+    return pd.Series(categorical, index=index, name=name, copy=False)
+
+
+def write_table(df: pd.DataFrame, path):
+    """
+    Write a table, as Parquet when the path ends in .parquet and CSV otherwise.
+    An existing Parquet dataset directory at path is replaced.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if str(path).endswith(".parquet"):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        optimize_dtypes(df).to_parquet(path, engine="pyarrow", index=False)
+    else:
+        df.to_csv(path, index=False)
+
+
+def read_table(path, columns=None, memory_map=True, categorical=()) -> pd.DataFrame:
+    """
+    Read a table written by write_table or append_table, loading only the
+    given columns. CSVs get the same compact dtypes as Parquet, with metadata
+    columns parsed straight into categoricals. categorical names further
+    columns to load as categoricals, e.g. a response column with many
+    repeated answers.
+
+    Parquet files are read through a memory map, which saves a read buffer
+    but not the conversion: the columns are still copied into pandas memory.
+    Arrow buffers are released column by column as they are converted, so
+    the peak stays near one copy of the table. The parts of a dataset
+    directory are read as one table, with their column types widened to a
+    common schema.
+    """
+    categorical = (*CATEGORICAL_COLUMNS, *categorical)
+    if str(path).endswith(".parquet"):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+
+        if os.path.isdir(path):
+            parts = _parts(path)
+            schema = pa.unify_schemas([pq.read_schema(part) for part in parts], promote_options="permissive")
+            table = ds.dataset(parts, schema=schema, format="parquet").to_table(columns=columns)
+        else:
+            table = pq.read_table(path, columns=columns, memory_map=memory_map)
+        df = table.to_pandas(split_blocks=True, self_destruct=True)
+        del table
+    else:
+        df = pd.read_csv(path, usecols=columns, dtype={column: "category" for column in categorical})
+    return optimize_dtypes(df, categorical)
+
+
+def append_table(df: pd.DataFrame, path):
+    """
+    Append rows to a table, matching the columns of an existing file.
+
+    CSVs are appended in place. Parquet tables become a dataset directory at
+    path: the first append moves an existing file to its first part, and each
+    append writes only its own rows as a new part file. read_table reads the
+    directory as one table.
+    """
+    if not os.path.exists(path):
+        write_table(df, path)
+        return
+    if str(path).endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        if os.path.isfile(path):
+            moved = f"{path}.moving"
+            os.replace(path, moved)
+            os.makedirs(path)
+            os.replace(moved, _part_path(path, 0))
+        parts = _parts(path)
+        columns = pq.read_schema(parts[0]).names
+        write_table(df.reindex(columns=columns), _part_path(path, len(parts)))
+    else:
+        columns = pd.read_csv(path, nrows=0).columns
+        df.reindex(columns=columns).to_csv(path, mode="a", header=False, index=False)
+
+
+def _part_path(path, number):
+    return os.path.join(path, f"part-{number:05d}.parquet")
+
+
+def _parts(path):
+    return sorted(glob.glob(os.path.join(path, "part-*.parquet")))
+
+
+class TableWriter:
+    """Appends DataFrame chunks to a CSV or Parquet file."""
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.parquet = output_path.endswith(".parquet")
+        self._writer = None
+        self._header = True
+
+    def write(self, chunk):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if self._writer is None:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                self._writer = pq.ParquetWriter(self.output_path, table.schema)
+            else:
+                # Cast to the first chunk's schema so all-null columns stay consistent
+                table = pa.Table.from_pandas(chunk, schema=self._writer.schema, preserve_index=False)
+            self._writer.write_table(table)
+        else:
+            chunk.to_csv(self.output_path, mode="w" if self._header else "a",
+                         header=self._header, index=False)
+            self._header = False
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
@@ -0,0 +1,82 @@
+# src/text_pipeline.py
+
+import numpy as np
+import pandas as pd
+
+from src.instrumentation import span
+from src.modeling import deduplicate_docs, make_vectorizer, preprocess_texts
+from src.preprocessing import KEEP_WORDS, STOP_WORDS, clean_responses
+from src.table_io import as_categorical, read_table
+
+
+class TextPipeline:
+    """
+    Single-pass text processing shared by every entry point.
+
+    Raw responses are read once; noise removal, tokenization and stop-wording
+    produce the text that gets embedded (``response_clean``), and spaCy
+    lemmatization of that text produces the tokens the topic vectorizer
+    counts (``response_tokens``). Each distinct response is lemmatized once.
+    Both columns are categoricals, so repeated answers are stored once.
+
+    stop_words is the one stop list for the whole run: cleaning drops it and
+    the topic vectorizer (make_vectorizer, or train_topic_model given
+    ``stop_words=pipeline.stop_words``) ignores it. keep_words are never
+    stop words, neither in that list nor in spaCy's during lemmatization.
+    """
+
+    def __init__(self, text_column="response", lemmatize=True, batch_size=1000, n_process=1,
+                 stop_words=STOP_WORDS, keep_words=KEEP_WORDS):
+        self.text_column = text_column
+        self.lemmatize = lemmatize
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.keep_words = frozenset(keep_words)
+        self.stop_words = frozenset(stop_words) - self.keep_words
+
+    def clean(self, responses: pd.Series) -> pd.Series:
+        """Noise removal, tokenization and stop-wording; the text that gets embedded."""
+        return clean_responses(responses, self.stop_words).fillna("")
+
+    def make_vectorizer(self, min_df=2, max_df=0.95):
+        """The topic vectorizer, with this pipeline's stop words."""
+        return make_vectorizer(min_df, max_df, stop_words=self.stop_words)
+
+    def transform(self, responses: pd.Series):
+        """Returns (embedding_text, vectorizer_tokens) aligned with responses."""
+        with span("clean", rows=len(responses)):
+            clean = as_categorical(self.clean(responses), index=responses.index)
+        if not self.lemmatize:
+            return clean, clean
+
+        # Lemmatize each distinct cleaned text once and map the lemmas back by code
+        uniques = clean.cat.categories
+        with span("lemmatize", rows=len(uniques)):
+            lemmas = preprocess_texts(uniques, batch_size=self.batch_size, n_process=self.n_process,
+                                      keep_words=self.keep_words)
+        lemma_codes, lemma_uniques = pd.factorize(pd.Series(lemmas, dtype=object))
+        tokens = pd.Categorical.from_codes(lemma_codes[clean.cat.codes.to_numpy()],
+                                           categories=pd.Index(lemma_uniques, dtype=object))
+        return clean, pd.Series(tokens, index=responses.index, copy=False)
+
+    def process(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Adds response_clean and response_tokens columns to the survey frame."""
+        clean, tokens = self.transform(df[self.text_column])
+        return df.assign(response_clean=clean, response_tokens=tokens)
+
+    def load(self, path="data/raw/survey_data.csv") -> pd.DataFrame:
+        """Reads raw survey data, with compact dtypes, and processes it in one pass."""
+        return self.process(read_table(path, categorical=(self.text_column,)))
+
+    @staticmethod
+    def unique_documents(df: pd.DataFrame):
+        """
+        Collapse a processed frame to its distinct documents.
+
+        Returns (embedding_docs, vectorizer_docs, inverse, counts), see
+        modeling.deduplicate_docs.
+        """
+        embedding_docs, inverse, counts = deduplicate_docs(df["response_clean"])
+        first_rows = np.unique(inverse, return_index=True)[1]
+        vectorizer_docs = df["response_tokens"].iloc[first_rows].tolist()
+        return embedding_docs, vectorizer_docs, inverse, counts
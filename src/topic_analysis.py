@@ -1,16 +1,21 @@
+import os
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 import numpy as np
 from collections import defaultdict
+from src.post_process_topic_model import top_k_per_topic
+from src.topic_cube import TopicCube
+from src.table_io import read_table
+from src.incremental import CUBE_PATH, STATE_PATH, update_analysis
 
 def analyze_regional_distribution(df):
-    """Create a heatmap of topic distribution across regions."""
-    # Create pivot table of topic counts by region
-    topic_region = pd.crosstab(df['region'], df['Topic'])
-    
-    # Normalize by region
-    topic_region_norm = topic_region.div(topic_region.sum(axis=1), axis=0)
+    """Create a heatmap of topic distribution across regions.
+
+    df can be the labeled responses or a prebuilt TopicCube.
+    """
+    # Topic counts by region, normalized by region
+    topic_region_norm = TopicCube.coerce(df).crosstab('region', normalize='index')
     
     # Create heatmap
     plt.figure(figsize=(15, 8))
@@ -44,7 +49,11 @@ def evaluate_topic_quality(df):
         'diversity': topic_diversity
     }).round(3)
     
-    # Visualize metrics
+    plot_topic_quality(topic_metrics)
+    return topic_metrics
+
+def plot_topic_quality(topic_metrics):
+    """Bar charts of the topic quality metrics."""
     fig, axes = plt.subplots(1, 3, figsize=(18, 5))
     
     # Plot average probabilities
@@ -65,42 +74,44 @@ def evaluate_topic_quality(df):
     plt.tight_layout()
     plt.savefig('visuals/topic_quality_metrics.png')
     plt.close()
-    
-    return topic_metrics
 
-def get_representative_responses(df, top_n=3):
+def get_representative_responses(df, top_n=3, tie_breaker=None):
     """Get most representative responses for each topic based on probability."""
-    representative_responses = {}
-    
-    for topic in df['Topic'].unique():
-        # Get responses for this topic, sorted by probability
-        topic_responses = df[df['Topic'] == topic].sort_values(
-            'Topic_Probability', ascending=False
-        )[['response', 'Topic_Probability']].head(top_n)
-        
-        representative_responses[topic] = topic_responses
-    
-    # Save to CSV
-    result_rows = []
-    for topic, responses in representative_responses.items():
-        for _, row in responses.iterrows():
-            result_rows.append({
-                'Topic': topic,
-                'Response': row['response'],
-                'Probability': row['Topic_Probability']
-            })
-    
-    rep_df = pd.DataFrame(result_rows)
+    top_responses = top_k_per_topic(df, k=top_n, tie_breaker=tie_breaker)
+    return save_representative_responses(top_responses)
+
+def save_representative_responses(top_responses):
+    """Write the top responses per topic to CSV and return them by topic."""
+    rep_df = pd.DataFrame({
+        'Topic': top_responses['Topic'].to_numpy(),
+        'Response': top_responses['response'].to_numpy(),
+        'Probability': top_responses['Topic_Probability'].to_numpy()
+    })
     rep_df.to_csv('outputs/representative_responses.csv', index=False)
+
+    representative_responses = {
+        topic: responses[['response', 'Topic_Probability']]
+        for topic, responses in top_responses.groupby('Topic', sort=False)
+    }
     return representative_responses
 
-def run_analysis(input_path='outputs/df_with_topics.csv'):
-    """Run all analyses and generate visualizations."""
-    print("Loading data...")
-    df = pd.read_csv(input_path)
+def run_analysis(input_path='outputs/df_with_topics.csv', df=None, cube=None, cube_path=CUBE_PATH):
+    """Run all analyses and generate visualizations.
+
+    Pass df to analyze an in-memory frame instead of reading input_path (CSV
+    or Parquet), and cube to reuse already aggregated counts. Without either,
+    the cube of the analysis state at cube_path is loaded and only the columns the
+    per-response analyses need are read from input_path.
+    """
+    if df is None:
+        print("Loading data...")
+        if cube is None and os.path.exists(cube_path):
+            cube = TopicCube.load(cube_path)
+        columns = None if cube is None else ['response', 'Topic', 'Topic_Probability']
+        df = read_table(input_path, columns=columns)
     
     print("Analyzing regional distribution...")
-    region_dist = analyze_regional_distribution(df)
+    region_dist = analyze_regional_distribution(df if cube is None else cube)
     
     print("Evaluating topic quality...")
     topic_metrics = evaluate_topic_quality(df)
@@ -109,3 +120,23 @@ def run_analysis(input_path='outputs/df_with_topics.csv'):
     rep_responses = get_representative_responses(df)
     
     print("✅ Analysis complete! Check visuals/ and outputs/ directories for results.")
+    return region_dist, topic_metrics, rep_responses
+
+def run_incremental_analysis(delta, input_path='outputs/df_with_topics.csv', state_path=STATE_PATH,
+                             fingerprint=None):
+    """Update the analyses with delta, the rows just appended to input_path.
+
+    Only the delta is read: the saved AnalysisState holds the aggregates of
+    every earlier wave. Without a saved state, or one saved for another fit
+    than fingerprint, it is built from input_path.
+    """
+    print("Updating analysis state...")
+    state = update_analysis(delta, input_path, state_path, fingerprint)
+
+    region_dist = analyze_regional_distribution(state.cube)
+    topic_metrics = state.topic_metrics()
+    plot_topic_quality(topic_metrics)
+    rep_responses = save_representative_responses(state.representative_responses())
+
+    print(f"✅ Analysis updated with {len(delta)} new rows ({state.rows_seen} in total).")
+    return region_dist, topic_metrics, rep_responses
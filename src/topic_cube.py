@@ -0,0 +1,116 @@
+# src/topic_cube.py
+
+import numpy as np
+import pandas as pd
+
+DIMENSIONS = ("region", "group", "question", "Topic")
+
+
+class TopicCube:
+    """
+    Response counts per (region, group, question, topic).
+
+    Counts live in a dense integer array with one axis per dimension, and
+    each axis has a sorted array of its category values. The cube is built
+    once from the labeled responses and is enough for every distribution
+    table and plot, including arbitrary roll-ups and normalizations.
+    """
+
+    def __init__(self, categories: dict, counts: np.ndarray):
+        self.dimensions = tuple(categories)
+        self.categories = {dim: np.asarray(values) for dim, values in categories.items()}
+        self.counts = counts
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, dimensions=DIMENSIONS) -> "TopicCube":
+        """Count rows per combination of dimensions; rows with missing values are skipped."""
+        codes, categories = [], {}
+        for dim in dimensions:
+            dim_codes, values = pd.factorize(df[dim], sort=True)
+            codes.append(dim_codes)
+            categories[dim] = np.asarray(values)
+        codes = np.vstack(codes)
+        complete = (codes >= 0).all(axis=0)
+
+        shape = tuple(len(values) for values in categories.values())
+        flat = np.ravel_multi_index(codes[:, complete], shape) if complete.any() else np.empty(0, dtype=np.intp)
+        counts = np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape)
+        return cls(categories, counts.astype(np.min_scalar_type(max(int(counts.max(initial=0)), 1))))
+
+    @classmethod
+    def coerce(cls, data) -> "TopicCube":
+        """Accept either a cube or a labeled responses frame."""
+        return data if isinstance(data, cls) else cls.from_frame(data)
+
+    @property
+    def total(self) -> int:
+        return int(self.counts.sum())
+
+    def select(self, **selections) -> "TopicCube":
+        """Sub-cube restricted to the given category values, e.g. question="..."."""
+        index, categories = [], {}
+        for dim in self.dimensions:
+            values = self.categories[dim]
+            if dim in selections:
+                wanted = np.atleast_1d(selections[dim])
+                positions = np.flatnonzero(np.isin(values, wanted))
+                index.append(positions)
+                categories[dim] = values[positions]
+            else:
+                index.append(np.arange(len(values)))
+                categories[dim] = values
+        return TopicCube(categories, self.counts[np.ix_(*index)])
+
+    def rollup(self, *dimensions) -> pd.Series:
+        """Counts summed over every dimension not listed, as a Series."""
+        axes = tuple(i for i, dim in enumerate(self.dimensions) if dim not in dimensions)
+        kept = [dim for dim in self.dimensions if dim in dimensions]
+        summed = self.counts.sum(axis=axes, dtype=np.int64)
+        if len(kept) == 1:
+            index = pd.Index(self.categories[kept[0]], name=kept[0])
+        else:
+            index = pd.MultiIndex.from_product([self.categories[dim] for dim in kept], names=kept)
+        series = pd.Series(summed.ravel(), index=index, name="Count")
+        return series.reorder_levels(list(dimensions)) if len(kept) > 1 else series
+
+    def crosstab(self, index: str, columns: str = "Topic", normalize=None) -> pd.DataFrame:
+        """
+        Equivalent of pd.crosstab(df[index], df[columns]) over the cube.
+        normalize can be None, "index", "columns" or "all".
+        """
+        table = self.rollup(index, columns).unstack(columns, fill_value=0)
+        table = table.loc[table.sum(axis=1) > 0, table.sum(axis=0) > 0]
+        table.columns.name = columns
+        if normalize == "index":
+            return table.div(table.sum(axis=1), axis=0)
+        if normalize == "columns":
+            return table.div(table.sum(axis=0), axis=1)
+        if normalize == "all":
+            return table / table.to_numpy().sum()
+        return table
+
+    def merge(self, other: "TopicCube") -> "TopicCube":
+        """Cube with the counts of both cubes, aligning their categories."""
+        categories = {
+            dim: np.union1d(self.categories[dim], other.categories[dim]) for dim in self.dimensions
+        }
+        shape = tuple(len(values) for values in categories.values())
+        counts = np.zeros(shape, dtype=np.int64)
+        for cube in (self, other):
+            index = [np.searchsorted(categories[dim], cube.categories[dim]) for dim in self.dimensions]
+            counts[np.ix_(*index)] += cube.counts
+        return TopicCube(categories, counts)
+
+    def save(self, path):
+        arrays = {"counts": self.counts, "dimensions": np.array(self.dimensions)}
+        for i, dim in enumerate(self.dimensions):
+            values = self.categories[dim]
+            arrays[f"dim_{i}"] = values.astype(str) if values.dtype == object else values
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path) -> "TopicCube":
+        with np.load(path, allow_pickle=False) as data:
+            dimensions = [str(dim) for dim in data["dimensions"]]
+            categories = {dim: data[f"dim_{i}"] for i, dim in enumerate(dimensions)}
+            return cls(categories, data["counts"])
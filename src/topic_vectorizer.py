@@ -0,0 +1,37 @@
+# src/topic_vectorizer.py
+"""
+The CountVectorizer behind the topic words.
+
+BERTopic fits its vectorizer on one concatenated document per topic, so
+min_df and max_df count topics. A fit that finds only a topic or two (a
+small segment, a narrow question) can leave max_df below min_df, which
+CountVectorizer rejects; TopicVectorizer keeps every term instead. This
+module imports scikit-learn, so modeling.make_vectorizer loads it lazily.
+"""
+
+import numbers
+
+from sklearn.feature_extraction.text import CountVectorizer
+
+
+def document_limits(min_df, max_df, n_documents):
+    """(min, max) document counts of min_df and max_df; integers are counts, floats shares."""
+    min_count = min_df if isinstance(min_df, numbers.Integral) else min_df * n_documents
+    max_count = max_df if isinstance(max_df, numbers.Integral) else max_df * n_documents
+    return min_count, max_count
+
+
+class TopicVectorizer(CountVectorizer):
+    """CountVectorizer that drops its document-frequency limits when there are too few documents for them."""
+
+    def fit_transform(self, raw_documents, y=None):
+        documents = list(raw_documents)
+        min_count, max_count = document_limits(self.min_df, self.max_df, len(documents))
+        if max_count >= min_count:
+            return super().fit_transform(documents, y)
+        limits = self.min_df, self.max_df
+        self.min_df, self.max_df = 1, 1.0
+        try:
+            return super().fit_transform(documents, y)
+        finally:
+            self.min_df, self.max_df = limits
@@ -3,7 +3,10 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from wordcloud import WordCloud
 import os
-from topic_labels import get_topic_label, get_topic_category, get_category_color
+from src.topic_labels import get_topic_label, get_topic_category, get_category_color
+from src.topic_cube import DIMENSIONS, TopicCube
+from src.incremental import CUBE_PATH
+from src.table_io import read_table
 import numpy as np
 
 class InsightVisualizer:
@@ -23,11 +26,15 @@ class InsightVisualizer:
         return path
 
     def plot_topic_distribution(self, df):
-        """Create bar plot of topic distribution with labels."""
+        """Create bar plot of topic distribution with labels.
+
+        Like the other plots, accepts the labeled responses or a TopicCube.
+        """
         plt.figure(figsize=(15, 8))
         
         # Get topic counts and create DataFrame with labels
-        topic_counts = df['Topic'].value_counts().sort_index()
+        topic_counts = TopicCube.coerce(df).rollup('Topic')
+        topic_counts = topic_counts[topic_counts > 0]
         plot_data = pd.DataFrame({
             'Topic': topic_counts.index,
             'Count': topic_counts.values,
@@ -67,7 +74,7 @@ class InsightVisualizer:
         plt.figure(figsize=(15, 10))
         
         # Create pivot table of regions and topics
-        topic_by_region = pd.crosstab(df['region'], df['Topic'])
+        topic_by_region = TopicCube.coerce(df).crosstab('region')
         
         # Rename columns with topic labels
         topic_by_region.columns = [get_topic_label(t) for t in topic_by_region.columns]
@@ -96,8 +103,7 @@ class InsightVisualizer:
     def plot_group_insights(self, df):
         """Create grouped bar plot of topics by population group."""
         plt.figure(figsize=(15, 6))
-        group_topic = pd.crosstab(df['group'], df['Topic'])
-        group_topic_norm = group_topic.div(group_topic.sum(axis=1), axis=0)
+        group_topic_norm = TopicCube.coerce(df).crosstab('group', normalize='index')
         
         group_topic_norm.plot(kind='bar', stacked=True)
         plt.title('Topic Distribution by Population Group')
@@ -125,19 +131,33 @@ class InsightVisualizer:
             self._save_plot(f'wordcloud_topic_{topic_id}')
 
 def create_all_visualizations(df_path="outputs/df_with_topics.csv", 
-                            topic_info_path="outputs/topic_info.csv"):
-    """Main function to create all visualizations."""
+                            topic_info_path="outputs/topic_info.csv",
+                            df=None, topic_info=None, cube=None, cube_path=CUBE_PATH):
+    """Main function to create all visualizations.
+
+    In-memory df / topic_info frames take precedence over the paths (CSV or
+    Parquet, only the needed columns are loaded), and
+    a prebuilt TopicCube takes precedence over df. Without either, the cube
+    of the analysis state at cube_path is loaded, and df_path is only aggregated
+    when there is none. The counts are shared by all plots.
+    """
     # Load data
-    df = pd.read_csv(df_path)
-    topic_info = pd.read_csv(topic_info_path)
+    if cube is None and df is None and os.path.exists(cube_path):
+        cube = TopicCube.load(cube_path)
+    if cube is None:
+        if df is None:
+            df = read_table(df_path, columns=list(DIMENSIONS))
+        cube = TopicCube.from_frame(df)
+    if topic_info is None:
+        topic_info = read_table(topic_info_path, columns=['Topic', 'Top_Words'])
     
     # Initialize visualizer
     viz = InsightVisualizer()
     
     # Generate all plots
-    viz.plot_topic_distribution(df)
-    viz.plot_region_topic_heatmap(df)
-    viz.plot_group_insights(df)
+    viz.plot_topic_distribution(cube)
+    viz.plot_region_topic_heatmap(cube)
+    viz.plot_group_insights(cube)
     
     # For word clouds, we need to process topic info
     # Convert comma-separated words into frequency dictionaries
@@ -146,7 +166,7 @@ def create_all_visualizations(df_path="outputs/df_with_topics.csv",
         words = row['Top_Words'].split(', ')
         # Create a simple frequency dict (all words equal weight for now)
         topic_words[row['Topic']] = {word: 1 for word in words}
-    viz.generate_wordclouds(df, topic_words)
+    viz.generate_wordclouds(cube, topic_words)
     
     print("✅ All visualizations saved in /visuals directory")
 
@@ -0,0 +1,52 @@
+import numpy as np
+from benchmarks.stage_benchmarks import StageTimer, StubEmbedder, compare
+
+def test_stub_embedder_is_deterministic():
+    embedder = StubEmbedder(dim=8)
+    first = embedder.encode(["no hay agua", "cortes de luz", "no hay agua"])
+    second = StubEmbedder(dim=8).encode(["no hay agua"])
+
+    assert first.shape == (3, 8)
+    np.testing.assert_allclose(first[0], first[2])
+    np.testing.assert_allclose(first[0], second[0])
+    np.testing.assert_allclose(np.linalg.norm(first, axis=1), 1.0, rtol=1e-6)
+
+def test_stage_timer_skips_missing_dependencies_and_records_errors():
+    def fails():
+        raise OSError("disk full")
+
+    timer = StageTimer()
+    assert timer.run("ok", sum, [1, 2]) == 3
+    assert timer.run("missing", sum, [1, 2], requires=("module_that_does_not_exist",)) is None
+    assert timer.run("broken", fails) is None
+    assert timer.results["ok"]["status"] == "ok"
+    assert timer.results["missing"]["status"] == "skipped"
+    assert timer.results["broken"]["status"] == "error"
+    assert "disk full" in timer.results["broken"]["traceback"]
+
+def test_fit_passes_no_embedding_model_to_bertopic(monkeypatch):
+    import sys
+    import types
+    from src.modeling import train_topic_model
+
+    created = {}
+    class FakeBERTopic:
+        def __init__(self, **kwargs):
+            created.update(kwargs)
+        def fit_transform(self, docs, embeddings=None):
+            return np.arange(len(docs)) % 2, None
+    monkeypatch.setitem(sys.modules, "bertopic", types.SimpleNamespace(BERTopic=FakeBERTopic))
+
+    embedder = StubEmbedder(dim=8)
+    docs = ["agua luz", "empleo jovenes", "agua potable", "empleo local"]
+    timer = StageTimer(trace_memory=False)
+    timer.run("fit", train_topic_model, docs, model_name="stub", embeddings=embedder.encode(docs),
+              embedding_model=embedder)
+    assert timer.results["fit"]["status"] == "ok"
+    assert created["embedding_model"] is None
+
+def test_compare_flags_slower_stages():
+    previous = {"clean": {"status": "ok", "seconds": 1.0}, "fit": {"status": "skipped"}}
+    current = {"clean": {"status": "ok", "seconds": 1.5}, "fit": {"status": "ok", "seconds": 9.0}}
+    assert compare(current, previous, threshold=1.2) == {"clean": 1.5}
+    assert compare(current, previous, threshold=2.0) == {}
@@ -0,0 +1,66 @@
+import numpy as np
+from src.embedding_backends import HashingBackend, TransformerBackend, get_backend
+
+DOCS = [
+    "No hay empleo local", "Los jovenes migran por falta de oportunidades",
+    "Cortes de luz frecuentes", "Falta de acceso al agua potable",
+    "No hay atencion medica cerca", "Faltan medicamentos esenciales",
+]
+
+def test_get_backend_selects_by_name():
+    assert isinstance(get_backend("hashing"), HashingBackend)
+    backend = get_backend("all-MiniLM-L6-v2")
+    assert isinstance(backend, TransformerBackend) and backend.name == "all-MiniLM-L6-v2"
+
+def test_hashing_backend_is_deterministic_and_normalized():
+    first = HashingBackend(n_components=4).fit(DOCS)
+    second = HashingBackend(n_components=4).fit(DOCS)
+    embeddings = first.encode(DOCS)
+
+    assert first.name == second.name and first.name.startswith("hashing-svd4-")
+    assert embeddings.shape == (len(DOCS), 4) and embeddings.dtype == np.float32
+    np.testing.assert_allclose(embeddings, second.encode(DOCS), atol=1e-6)
+    np.testing.assert_allclose(np.linalg.norm(embeddings, axis=1), 1.0, rtol=1e-5)
+    assert HashingBackend(n_components=4).fit(DOCS[:4]).name != first.name
+
+def test_hashing_backend_places_paraphrases_together():
+    backend = HashingBackend(n_components=5, batch_size=2).fit(DOCS)
+    query = backend.encode(["Creo que no hay empleo local en mi comunidad", "Cortes de luz"])
+    similarity = query @ backend.encode(DOCS).T
+    assert similarity[0].argmax() == 0
+    assert similarity[1].argmax() == 2
+
+def test_resolve_embeddings_caches_under_fitted_name(tmp_path):
+    import os
+    from src.modeling import resolve_embeddings
+    backend, name, embeddings = resolve_embeddings(DOCS, "hashing", cache_dir=str(tmp_path))
+
+    assert name == backend.name
+    assert os.path.isdir(os.path.join(str(tmp_path), name))
+    _, _, cached = resolve_embeddings(DOCS, embedding_model=backend, cache_dir=str(tmp_path))
+    np.testing.assert_allclose(cached, embeddings)
+
+def test_cached_embeddings_never_load_the_transformer(monkeypatch, tmp_path):
+    import sys
+    import types
+    import src.embedding_backends as embedding_backends
+    from src.embedding_cache import EmbeddingCache
+    from src.modeling import train_topic_model
+
+    def load(name):
+        raise AssertionError("transformer loaded")
+    monkeypatch.setattr(embedding_backends, "get_sentence_transformer", load)
+    created = {}
+    class FakeBERTopic:
+        def __init__(self, **kwargs):
+            created.update(kwargs)
+        def fit_transform(self, docs, embeddings=None):
+            return np.arange(len(docs)) % 2, None
+    monkeypatch.setitem(sys.modules, "bertopic", types.SimpleNamespace(BERTopic=FakeBERTopic))
+
+    vectors = np.random.default_rng(0).standard_normal((len(DOCS), 8)).astype(np.float32)
+    EmbeddingCache(str(tmp_path), "all-MiniLM-L6-v2").add(DOCS, vectors)
+    model, topics, _ = train_topic_model(DOCS, model_name="all-MiniLM-L6-v2", cache_dir=str(tmp_path))
+
+    assert created["embedding_model"] is None
+    assert model.embedding_model_name_ == "all-MiniLM-L6-v2" and not hasattr(model, "embedding_backend_")
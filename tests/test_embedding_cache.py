@@ -0,0 +1,81 @@
+import numpy as np
+from src.embedding_cache import EmbeddingCache, normalize_text
+
+def fake_encoder(calls):
+    def encode(texts):
+        calls.append(list(texts))
+        return np.array([[len(t), t.count("a"), 1.0] for t in texts], dtype=np.float32)
+    return encode
+
+def test_normalize_text():
+    assert normalize_text("  No HAY   agua ") == "no hay agua"
+
+def test_cache_only_encodes_misses(tmp_path):
+    calls = []
+    cache = EmbeddingCache(tmp_path, "dummy-model")
+    first = cache.encode(["no hay agua", "cortes de luz"], fake_encoder(calls))
+
+    # Reopen from disk: known texts (after normalization) are not re-encoded
+    cache = EmbeddingCache(tmp_path, "dummy-model")
+    second = cache.encode(["No hay  agua", "faltan medicamentos", "cortes de luz"], fake_encoder(calls))
+
+    assert calls == [["no hay agua", "cortes de luz"], ["faltan medicamentos"]]
+    assert len(cache) == 3
+    np.testing.assert_array_equal(second[0], first[0])
+    np.testing.assert_array_equal(second[2], first[1])
+
+def test_cache_is_keyed_by_model(tmp_path):
+    calls = []
+    EmbeddingCache(tmp_path, "model-a").encode(["no hay agua"], fake_encoder(calls))
+    EmbeddingCache(tmp_path, "model-b").encode(["no hay agua"], fake_encoder(calls))
+    assert len(calls) == 2
+
+def test_rows_left_by_a_crashed_writer_are_discarded(tmp_path):
+    calls = []
+    cache = EmbeddingCache(tmp_path, "dummy-model")
+    cache.encode(["a"], fake_encoder(calls))
+
+    # Crash after writing vectors (and half a key line) but before the key
+    with open(cache.vectors_path, "ab") as f:
+        f.write(np.full(3, 99, dtype=np.float32).tobytes())
+    with open(cache.keys_path, "a") as f:
+        f.write("deadbeef")
+
+    cache = EmbeddingCache(tmp_path, "dummy-model")
+    assert len(cache) == 1
+    cache.encode(["b"], fake_encoder(calls))
+    embeddings, missing = EmbeddingCache(tmp_path, "dummy-model").lookup(["b", "a"])
+    assert missing == []
+    np.testing.assert_array_equal(embeddings, fake_encoder([])(["b", "a"]))
+
+def test_writers_see_each_others_rows(tmp_path):
+    calls = []
+    first = EmbeddingCache(tmp_path, "dummy-model")
+    second = EmbeddingCache(tmp_path, "dummy-model")
+    first.encode(["a"], fake_encoder(calls))
+    second.encode(["a", "bb"], fake_encoder(calls))
+    first.encode(["bb", "ccc"], fake_encoder(calls))
+
+    assert calls == [["a"], ["bb"], ["ccc"]]
+    embeddings, missing = EmbeddingCache(tmp_path, "dummy-model").lookup(["ccc", "bb", "a"])
+    assert missing == []
+    np.testing.assert_array_equal(embeddings, fake_encoder([])(["ccc", "bb", "a"]))
+
+def test_open_cache_reuses_one_instance_per_directory_and_model(tmp_path):
+    import shutil
+    from src.embedding_cache import open_cache
+
+    calls = []
+    cache = open_cache(str(tmp_path), "dummy-model")
+    assert open_cache(str(tmp_path / "." ), "dummy-model") is cache
+    assert open_cache(str(tmp_path), "model-b") is not cache
+
+    # Rows written through another instance are picked up without reopening
+    EmbeddingCache(tmp_path, "dummy-model").encode(["a"], fake_encoder(calls))
+    cache.encode(["a", "bb"], fake_encoder(calls))
+    assert calls == [["a"], ["bb"]]
+
+    # A cache deleted on disk is not served from memory
+    shutil.rmtree(cache.path)
+    cache.encode(["a"], fake_encoder(calls))
+    assert calls[-1] == ["a"] and len(cache) == 1
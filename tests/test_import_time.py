@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+# Importing the pipeline modules must not load models or touch the network
+IMPORT_BUDGET_SECONDS = 1.5
+HEAVY_MODULES = ["spacy", "nltk", "bertopic", "sentence_transformers", "torch", "sklearn"]
+
+def test_pipeline_imports_are_lightweight():
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import src.modeling, src.preprocessing, src.post_process_topic_model\n"
+        "print(time.perf_counter() - start)\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", code], cwd=repo_root,
+                            capture_output=True, text=True, check=True)
+    lines = result.stdout.splitlines()
+    elapsed = float(lines[0])
+    loaded = lines[1] if len(lines) > 1 else ""
+
+    assert loaded == "", f"Heavy modules imported at import time: {loaded}"
+    assert elapsed < IMPORT_BUDGET_SECONDS
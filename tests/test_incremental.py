@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+from src.incremental import AnalysisState, DistinctSketch, update_analysis
+from src.post_process_topic_model import top_k_per_topic
+from src.table_io import write_table
+
+def make_df(n, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "response": [f"respuesta {i}" for i in rng.integers(0, n // 2, n)],
+        "region": rng.choice(["Caribe", "Andina", "Amazonas"], n),
+        "group": rng.choice(["Mujeres", "Jovenes"], n),
+        "question": rng.choice(["q1", "q2"], n),
+        "Topic": rng.integers(-1, 4, n),
+        # Rounded so that ties in the top-k ranking occur
+        "Topic_Probability": rng.random(n).round(1),
+    })
+
+def full_metrics(df):
+    sizes = df["Topic"].value_counts()
+    return pd.DataFrame({
+        "avg_probability": df.groupby("Topic")["Topic_Probability"].mean(),
+        "size": sizes,
+        "diversity": df.groupby("Topic")["response"].nunique() / sizes,
+    }).round(3)
+
+def test_updates_match_full_recomputation(tmp_path):
+    waves = [make_df(2000, seed) for seed in range(3)]
+    full = pd.concat(waves, ignore_index=True)
+
+    state = AnalysisState().update(waves[0])
+    state.save(tmp_path / "state")
+    for wave in waves[1:]:
+        state = AnalysisState.load(tmp_path / "state").update(wave)
+        state.save(tmp_path / "state")
+
+    expected_regions = pd.crosstab(full["region"], full["Topic"], normalize="index")
+    pd.testing.assert_frame_equal(state.regional_distribution(), expected_regions,
+                                  check_dtype=False, check_names=False)
+
+    metrics = state.topic_metrics()
+    expected = full_metrics(full)
+    pd.testing.assert_series_equal(metrics["avg_probability"], expected["avg_probability"], check_names=False)
+    pd.testing.assert_series_equal(metrics["size"], expected["size"], check_names=False, check_dtype=False)
+    assert np.allclose(metrics["diversity"], expected["diversity"], atol=0.02)
+
+    top = state.representative_responses()
+    expected_top = top_k_per_topic(full, k=3)
+    assert top["response"].tolist() == expected_top["response"].tolist()
+    assert top["Topic_Probability"].tolist() == expected_top["Topic_Probability"].tolist()
+    assert state.rows_seen == len(full)
+
+def test_distinct_sketch_estimates():
+    sketch = DistinctSketch()
+    values = np.array([f"r{i}" for i in range(50_000)], dtype=object)
+    keys = np.repeat([0, 1], 25_000)
+    sketch.update(keys, values).update(keys, values)  # duplicates do not count
+    sketch.update(np.full(10, 2), values[:10])
+
+    assert abs(sketch.estimate(0) - 25_000) / 25_000 < 0.03
+    assert abs(sketch.estimate(1) - 25_000) / 25_000 < 0.03
+    assert round(sketch.estimate(2)) == 10
+    assert sketch.estimate(3) == 0
+
+def test_update_analysis_builds_state_once(tmp_path):
+    first, delta = make_df(300, 0), make_df(100, 1)
+    table = tmp_path / "df_with_topics.csv"
+    write_table(pd.concat([first, delta], ignore_index=True), table)
+
+    # Without a saved state the full table (already containing delta) is read
+    state = update_analysis(delta, table, tmp_path / "state")
+    assert state.rows_seen == 400
+    state = update_analysis(make_df(50, 2), table, tmp_path / "state")
+    assert state.rows_seen == 450
+    assert state.topic_metrics()["size"].sum() == 450
+
+def test_state_round_trips_literal_responses_and_fingerprint(tmp_path):
+    df = make_df(50, 3)
+    df.loc[:3, "response"] = ["NA", "", "null", "None"]
+    df.loc[:3, "Topic_Probability"] = 1.0
+    state = AnalysisState(fingerprint="abc123").update(df)
+    state.save(tmp_path / "state")
+
+    loaded = AnalysisState.load(tmp_path / "state")
+    assert loaded.fingerprint == "abc123"
+    pd.testing.assert_frame_equal(loaded.top, state.top, check_dtype=False)
+    assert {"NA", "", "null", "None"} <= set(loaded.top["response"])
+    assert not (tmp_path / "state" / "top_responses.csv").exists()
+
+def test_update_analysis_rebuilds_state_of_another_fit(tmp_path):
+    first, delta = make_df(300, 0), make_df(100, 1)
+    table = tmp_path / "df_with_topics.csv"
+    write_table(first, table)
+    update_analysis(first, table, tmp_path / "state", fingerprint="old")
+
+    # The model was refitted and its table rewritten; the old state is discarded
+    write_table(pd.concat([first, delta], ignore_index=True), table)
+    state = update_analysis(delta, table, tmp_path / "state", fingerprint="new")
+    assert state.rows_seen == 400 and state.fingerprint == "new"
+    state = update_analysis(make_df(50, 2), table, tmp_path / "state", fingerprint="new")
+    assert state.rows_seen == 450
+    assert AnalysisState.saved_fingerprint(tmp_path / "state") == "new"
@@ -0,0 +1,79 @@
+import json
+import pytest
+from src.instrumentation import Tracer, span
+
+def test_span_records_nesting_rows_and_errors():
+    tracer = Tracer()
+    with span("stage", tracer=tracer) as outer:
+        with span("inner", rows=10, tracer=tracer):
+            pass
+        outer.rows = 3
+    with pytest.raises(ValueError):
+        with span("broken", tracer=tracer):
+            raise ValueError("bad input")
+
+    inner, stage, broken = tracer.records
+    assert (inner["name"], inner["parent"], inner["rows"]) == ("inner", "stage", 10)
+    assert stage["rows"] == 3 and stage["wall_s"] >= inner["wall_s"]
+    assert broken["status"] == "error" and "bad input" in broken["error"]
+
+def test_span_as_decorator_and_exports(tmp_path):
+    tracer = Tracer()
+
+    @span("double", tracer=tracer, kind="stage")
+    def double(x):
+        return 2 * x
+
+    assert double(2) == 4 and double(3) == 6
+    log_path, trace_path = tracer.export(str(tmp_path), "fit")
+
+    with open(log_path) as f:
+        records = [json.loads(line) for line in f]
+    assert [r["name"] for r in records] == ["double", "double"]
+    assert records[0]["kind"] == "stage"
+    with open(trace_path) as f:
+        events = json.load(f)["traceEvents"]
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in events)
+
+def test_span_records_memory_growth_within_the_span():
+    import numpy as np
+    tracer = Tracer()
+    with span("allocate", tracer=tracer):
+        block = np.ones(64 * 2**20 // 8)
+    record = tracer.records[0]
+    assert record["rss_delta_mb"] >= 48
+    assert record["process_peak_rss_mb"] >= record["rss_mb"] - 1
+    del block
+
+def test_span_records_peak_of_memory_freed_within_the_span():
+    import time
+    import numpy as np
+    tracer = Tracer()
+    with span("temporary", tracer=tracer):
+        block = np.ones(64 * 2**20 // 8)
+        time.sleep(0.1)
+        del block
+    record = tracer.records[0]
+    assert record["peak_rss_mb"] - record["rss_mb"] >= 48
+
+def _traced_work(n):
+    with span("work", rows=n):
+        return n * 2
+
+def test_worker_spans_are_merged_into_the_parent_trace():
+    import multiprocessing
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+    from src.instrumentation import collect_traced, run_traced
+
+    tracer = Tracer()
+    with span("pool", tracer=tracer):
+        with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn")) as executor:
+            outputs = executor.map(partial(run_traced, _traced_work), [1, 2, 3])
+            results = list(collect_traced(outputs, tracer=tracer))
+
+    assert results == [2, 4, 6]
+    work = [record for record in tracer.records if record["name"] == "work"]
+    assert sorted(record["rows"] for record in work) == [1, 2, 3]
+    assert all(record["parent"] == "pool" and record["pid"] != os.getpid() for record in work)
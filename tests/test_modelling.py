@@ -6,3 +6,143 @@ def test_bertopic_runs():
     
     assert len(topics) == len(docs), "Topic assignment failed"
     assert hasattr(model, "get_topic_info"), "BERTopic model object is invalid"
+
+def test_deduplicate_docs():
+    from src.modeling import deduplicate_docs
+    docs = ["No hay agua", "cortes de luz", "no hay  agua", "Cortes de luz", "No hay agua"]
+    unique_docs, inverse, counts = deduplicate_docs(docs)
+
+    assert unique_docs == ["No hay agua", "cortes de luz"]
+    assert list(inverse) == [0, 1, 0, 1, 0]
+    assert list(counts) == [3, 2]
+
+def test_preprocess_texts_matches_single_document_path():
+    from src.modeling import preprocess_text, preprocess_texts
+    texts = ["Falta de acceso al agua potable", "No hay atencion medica cerca", "Cortes de luz frecuentes"]
+    assert preprocess_texts(texts, batch_size=2) == [preprocess_text(text) for text in texts]
+
+def test_topic_confidence_is_similarity_to_centroid():
+    import numpy as np
+    from src.modeling import topic_centroids, topic_confidence
+    embeddings = np.array([[1.0, 0.0], [1.0, 0.2], [0.0, 1.0], [0.1, 1.0], [1.0, 1.0]])
+    topics = [0, 0, 1, 1, -1]
+
+    topic_ids, centroids = topic_centroids(embeddings, topics)
+    confidence = topic_confidence(embeddings, topics, topic_ids, centroids)
+
+    assert list(topic_ids) == [0, 1]
+    np.testing.assert_allclose(np.linalg.norm(centroids, axis=1), 1.0, rtol=1e-6)
+    assert confidence[4] == 0
+    assert np.all(confidence[:4] > 0.98)
+    assert topic_confidence(embeddings[:2], [1, 7], topic_ids, centroids)[1] == 0
+
+def test_topic_keywords_ranks_distinctive_words():
+    from sklearn.feature_extraction.text import CountVectorizer
+    from src.modeling import topic_keywords
+    docs = ["agua potable agua", "agua luz", "empleo local", "empleo jovenes empleo", "luz"]
+    topics = [0, 0, 1, 1, -1]
+    vectorizer = CountVectorizer().fit(docs)
+
+    keywords = topic_keywords(docs, topics, vectorizer, top_n=2)
+
+    assert set(keywords) == {-1, 0, 1}
+    assert keywords[0][0] == "agua"
+    assert keywords[1][0] == "empleo"
+    assert keywords[-1] == ["luz"]
+
+def test_stratified_sample_keeps_strata_proportions():
+    import numpy as np
+    import pandas as pd
+    from src.modeling import stratified_sample
+    strata = pd.DataFrame({
+        "region": np.repeat(["Andina", "Caribe", "Amazonas"], [700, 200, 100]),
+        "group": ["Mujeres", "Jovenes"] * 500,
+    })
+
+    sample = stratified_sample(strata, 100, seed=1)
+
+    assert len(sample) == 100 and len(np.unique(sample)) == 100
+    counts = strata.iloc[sample]["region"].value_counts()
+    assert counts.to_dict() == {"Andina": 70, "Caribe": 20, "Amazonas": 10}
+    np.testing.assert_array_equal(sample, stratified_sample(strata, 100, seed=1))
+
+def test_nearest_topics_matches_unbatched_argmax():
+    import numpy as np
+    from src.modeling import nearest_topics, topic_centroids
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((50, 8))
+    topic_ids, centroids = topic_centroids(embeddings[:10], [0, 1, 2, 3, 4] * 2)
+
+    topics, similarity = nearest_topics(embeddings, topic_ids, centroids, batch_size=7)
+
+    normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    expected = (normalized @ centroids.T).argmax(axis=1)
+    np.testing.assert_array_equal(topics, topic_ids[expected])
+    np.testing.assert_allclose(similarity, (normalized @ centroids.T).max(axis=1), rtol=1e-5)
+
+def test_stratified_sample_weights_strata_and_never_exceeds_size():
+    import numpy as np
+    from src.modeling import stratified_sample
+    strata = np.repeat(["Andina", "Caribe"], [50, 50])
+    weights = np.where(strata == "Andina", 3, 1)
+
+    sample = stratified_sample(strata, 20, weights=weights)
+    assert list(np.unique(strata[sample], return_counts=True)[1]) == [15, 5]
+
+    # More strata than slots: one row each from as many strata as fit
+    many = np.arange(100) % 30
+    for size in (1, 10, 29, 31):
+        assert len(stratified_sample(many, size)) == size
+
+def test_document_strata_uses_most_common_stratum():
+    import pandas as pd
+    from src.modeling import document_strata
+    strata = pd.DataFrame({"region": ["Caribe", "Andina", "Andina", "Caribe", "Amazonas"]})
+    inverse = [0, 0, 0, 1, 1]
+    assert list(document_strata(strata, inverse)["region"]) == ["Andina", "Caribe"]
+
+def test_nearest_topics_marks_dissimilar_documents_as_outliers():
+    import numpy as np
+    from src.modeling import nearest_topics
+    centroids = np.eye(2, dtype=np.float32)
+    embeddings = np.array([[1.0, 0.1], [0.1, 1.0], [1.0, 1.0]])
+    topics, similarity = nearest_topics(embeddings, np.array([0, 1]), centroids, min_similarity=0.9)
+    assert list(topics) == [0, 1, -1]
+    assert similarity[2] < 0.9
+
+def test_model_fingerprint_changes_with_the_fit():
+    import types
+    import numpy as np
+    from src.modeling import model_fingerprint
+
+    def fit(centroids):
+        return types.SimpleNamespace(embedding_model_name_="hashing", topic_ids_=np.array([0, 1]),
+                                     topic_centroids_=np.asarray(centroids, dtype=np.float32))
+
+    assert model_fingerprint(fit([[1, 0], [0, 1]])) == model_fingerprint(fit([[1, 0], [0, 1]]))
+    assert model_fingerprint(fit([[1, 0], [0, 1]])) != model_fingerprint(fit([[0, 1], [1, 0]]))
+    assert model_fingerprint(types.SimpleNamespace()) is None
+
+def test_train_topic_model_clusters_every_row_given_inverse(monkeypatch):
+    import sys
+    import types
+    import numpy as np
+    from src.modeling import train_topic_model
+
+    fitted = {}
+    class FakeBERTopic:
+        def __init__(self, **kwargs):
+            pass
+        def fit_transform(self, docs, embeddings=None):
+            fitted.update(docs=list(docs), embeddings=embeddings)
+            return np.array([0 if "agua" in doc else 1 for doc in docs]), None
+    monkeypatch.setitem(sys.modules, "bertopic", types.SimpleNamespace(BERTopic=FakeBERTopic))
+
+    docs = ["agua", "luz"]
+    embeddings = np.array([[1, 0], [0, 1]], dtype=np.float32)
+    inverse = np.array([0, 1, 0, 0])
+    model, topics, probs = train_topic_model(docs, embeddings=embeddings, embedding_model=object(), inverse=inverse)
+
+    assert fitted["docs"] == ["agua", "luz", "agua", "agua"]
+    np.testing.assert_array_equal(fitted["embeddings"], embeddings[inverse])
+    assert list(topics) == [0, 1, 0, 0] and len(probs) == 4
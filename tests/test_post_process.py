@@ -33,3 +33,24 @@ def test_summarize_topics():
     assert "Topic" in result.columns
     assert "Summary" in result.columns
     assert len(result) == len(df["Topic"].unique())  # No need to subtract 1 since we don't have topic -1 in test data
+
+def test_assign_topics_broadcasts_unique_assignments():
+    df = pd.DataFrame({"response": ["a", "b", "a", "a"]})
+    result = assign_topics_to_docs(df, [3, 7], [0.5, 0.6], inverse=[0, 1, 0, 0])
+
+    assert list(result["Topic"]) == [3, 7, 3, 3]
+    assert list(result["Topic_Probability"]) == [0.5, 0.6, 0.5, 0.5]
+
+def test_top_k_per_topic_orders_by_score_with_stable_ties():
+    from src.post_process_topic_model import top_k_per_topic
+    df = pd.DataFrame({
+        "response": ["a", "b", "c", "d", "e", "f"],
+        "Topic": [1, 0, 1, 0, 1, -1],
+        "Topic_Probability": [0.5, 0.9, 0.7, None, 0.7, 0.3]
+    })
+
+    result = top_k_per_topic(df, k=2, exclude=(-1,))
+    assert list(result["response"]) == ["b", "d", "c", "e"]
+
+    result = top_k_per_topic(df.assign(key=["z", "z", "y", "z", "x", "z"]), k=1, tie_breaker="key")
+    assert list(result["response"]) == ["f", "b", "e"]
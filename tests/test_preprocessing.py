@@ -0,0 +1,46 @@
+import pandas as pd
+import pytest
+from src.preprocessing import preprocess_dataset
+
+RAW_PATH = "data/raw/survey_data.csv"
+
+@pytest.fixture(scope="module")
+def full_output(tmp_path_factory):
+    out_path = str(tmp_path_factory.mktemp("full") / "survey_clean.csv")
+    preprocess_dataset(RAW_PATH, out_path)
+    return pd.read_csv(out_path)
+
+def test_streaming_matches_full_read(tmp_path, full_output):
+    out_path = str(tmp_path / "survey_clean.csv")
+    preprocess_dataset(RAW_PATH, out_path, chunksize=64)
+    pd.testing.assert_frame_equal(pd.read_csv(out_path), full_output)
+
+def test_streaming_parquet_with_process_pool(tmp_path, full_output):
+    pytest.importorskip("pyarrow")
+    out_path = str(tmp_path / "survey_clean.parquet")
+    preprocess_dataset(RAW_PATH, out_path, chunksize=50, n_jobs=2)
+    pd.testing.assert_frame_equal(pd.read_parquet(out_path), full_output)
+
+def test_clean_responses_matches_clean_response():
+    from src.preprocessing import clean_response, clean_responses
+    responses = pd.read_csv(RAW_PATH)["response"]
+    extra = pd.Series([
+        "No hay agua, ni luz (segun mi experiencia)!",
+        '"Nadie responde" a nuestras solicitudes...',
+        "Cortes de luz: 3,5 horas al dia; en mi comunidad.",
+        "¿Donde esta el centro de salud?",
+        "No hay agua. Tampoco luz.",
+        "¿Y el hospital? Esta cerrado!",
+    ])
+    responses = pd.concat([responses, extra], ignore_index=True)
+
+    expected = responses.apply(clean_response)
+    pd.testing.assert_series_equal(clean_responses(responses), expected, check_dtype=False)
+
+def test_clean_responses_sends_multi_sentence_answers_to_clean_response(monkeypatch):
+    import src.preprocessing as preprocessing
+    monkeypatch.setattr(preprocessing, "clean_response", lambda text, stop_words: "<slow>")
+    responses = pd.Series(["No hay agua. Tampoco luz.", "Sin agua.", "3.5 horas", "¿Hay luz? No", None])
+    cleaned = preprocessing.clean_responses(responses)
+    assert cleaned.tolist()[:4] == ["<slow>", "sin agua .", "3.5 horas", "<slow>"]
+    assert pd.isna(cleaned.iloc[4])
@@ -0,0 +1,24 @@
+import threading
+from src.resources import _locked
+
+def test_slow_load_does_not_block_other_resources():
+    release = threading.Event()
+    calls = []
+
+    @_locked
+    def load(name):
+        calls.append(name)
+        if name == "slow":
+            release.wait(5)
+        return name.upper()
+
+    slow = threading.Thread(target=load, args=("slow",))
+    slow.start()
+    # Loaded and then served from the cache while "slow" is still loading
+    assert load("fast") == "FAST"
+    assert load("fast") == "FAST"
+    release.set()
+    slow.join()
+
+    assert load("slow") == "SLOW"
+    assert sorted(calls) == ["fast", "slow"]
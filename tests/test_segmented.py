@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+from src.segmented import combine_segments, segment_documents, segment_slug
+
+def _corpus():
+    df = pd.DataFrame({
+        "question": ["q1", "q1", "q2", "q2", "q2", "q1"],
+        "region": ["Caribe", "Andina", "Caribe", "Caribe", "Andina", "Caribe"],
+        "response": ["agua", "luz", "agua", "empleo", "empleo", "agua"],
+    })
+    inverse = np.array([0, 1, 0, 2, 2, 0])  # distinct documents shared across questions
+    return df, inverse
+
+def test_segment_documents_dedupes_within_each_segment():
+    df, inverse = _corpus()
+    segments = {key: rest for key, *rest in segment_documents(df, inverse, by=["question"])}
+
+    rows, doc_ids, local_inverse, counts = segments["q1"]
+    assert list(rows) == [0, 1, 5]
+    assert list(doc_ids) == [0, 1] and list(counts) == [2, 1]
+    assert list(doc_ids[local_inverse]) == [0, 1, 0]
+    assert list(segments["q2"][1]) == [0, 2]
+
+def test_combine_segments_numbers_topics_globally(tmp_path):
+    df, inverse = _corpus()
+    segments, results = {}, []
+    for key, rows, doc_ids, local_inverse, counts in segment_documents(df, inverse, by=["question"]):
+        segments[key] = (rows, local_inverse)
+        topics = np.array([0, 1]) if key == "q1" else np.array([-1, 0])
+        info = pd.DataFrame({"Topic": [t for t in topics if t != -1], "Top_Words": "w", "Count": 1})
+        results.append((key, topics, np.full(len(topics), 0.5), info))
+
+    labeled, segment_topics = combine_segments(df, segments, results, ["question"], output_dir=str(tmp_path))
+
+    assert list(labeled["Topic"]) == [0, 1, -1, 0, 0, 0]
+    assert list(labeled["Global_Topic"]) == [0, 1, -1, 2, 2, 0]
+    assert list(labeled["Segment"]) == ["q1", "q1", "q2", "q2", "q2", "q1"]
+    assert list(segment_topics["Global_Topic"]) == [0, 1, 2]
+    assert list(segment_topics.columns[:2]) == ["Segment", "question"]
+    assert (tmp_path / "q2" / "topic_info.csv").exists()
+
+def test_segment_slug_is_directory_safe():
+    assert segment_slug(("Caribe", "Que necesidades prioritarias existen?")) == \
+        "caribe__que_necesidades_prioritarias_existen"
+
+def test_fit_segments_uses_spawned_workers(monkeypatch, tmp_path):
+    import src.segmented as segmented
+
+    created = {}
+    class InlineExecutor:
+        def __init__(self, **kwargs):
+            created.update(kwargs)
+        def __enter__(self):
+            return self
+        def __exit__(self, *exc):
+            return False
+        def map(self, func, *iterables):
+            return map(func, *iterables)
+
+    def fake_fit(key, docs, embeddings, counts, embedder, model_dir, stop_words):
+        topics = np.zeros(len(docs), dtype=np.int64)
+        return key, topics, np.ones(len(docs)), pd.DataFrame({"Topic": [0], "Top_Words": "w", "Count": len(docs)})
+
+    monkeypatch.setattr(segmented, "ProcessPoolExecutor", InlineExecutor)
+    monkeypatch.setattr(segmented, "_fit_segment", fake_fit)
+    df, inverse = _corpus()
+    docs = ["agua", "luz", "empleo"]
+    labeled, _, failed = segmented.fit_segments(df, docs, docs, inverse, model_name="hashing", n_jobs=2,
+                                                min_docs=1, output_dir=str(tmp_path))
+
+    assert created["mp_context"].get_start_method() == "spawn"
+    assert list(labeled["Global_Topic"]) == [0, 0, 1, 1, 1, 0]
+    assert failed == {}
+
+def test_failed_segment_is_reported_and_labeled_outlier(monkeypatch, tmp_path):
+    import src.segmented as segmented
+
+    def fake_fit(key, docs, embeddings, counts, embedder, model_dir, stop_words):
+        if key == "q2":
+            raise ValueError("max_df corresponds to < documents than min_df")
+        topics = np.zeros(len(docs), dtype=np.int64)
+        return key, topics, np.ones(len(docs)), pd.DataFrame({"Topic": [0], "Top_Words": "w", "Count": len(docs)})
+
+    monkeypatch.setattr(segmented, "_fit_segment", fake_fit)
+    df, inverse = _corpus()
+    docs = ["agua", "luz", "empleo"]
+    labeled, segment_topics, failed = segmented.fit_segments(df, docs, docs, inverse, model_name="hashing",
+                                                             n_jobs=1, min_docs=1, output_dir=str(tmp_path))
+
+    assert list(failed) == ["q2"] and "min_df" in failed["q2"]
+    assert list(labeled["Topic"]) == [0, 0, -1, -1, -1, 0]
+    assert list(segment_topics["Segment"]) == ["q1"]
+
+def test_save_segments_rebuilds_the_analysis_state(tmp_path):
+    from src.incremental import AnalysisState
+    from src.segmented import save_segments, segments_fingerprint
+
+    df, _ = _corpus()
+    labeled = df.assign(group="Mujeres", Segment=df["question"], Topic=[0, 1, -1, 0, 0, 0],
+                        Topic_Probability=0.5, Global_Topic=[0, 1, -1, 2, 2, 0])
+    segment_topics = pd.DataFrame({"Segment": ["q1", "q1", "q2"], "Topic": [0, 1, 0],
+                                   "Top_Words": "w", "Count": 1, "Global_Topic": [0, 1, 2]})
+    save_segments(labeled, segment_topics, output_dir=str(tmp_path))
+
+    state = AnalysisState.load(tmp_path / "segments" / "analysis_state")
+    assert state.fingerprint == segments_fingerprint(segment_topics)
+    assert state.topic_metrics()["size"].to_dict() == {-1: 1, 0: 2, 1: 1, 2: 2}
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import pytest
+from src.service import MicroBatcher, serve
+
+def _upper(items):
+    return [{"topic": len(item["response"]), "text": item["response"].upper()} for item in items]
+
+def test_micro_batcher_respects_max_batch_size():
+    async def run():
+        batcher = MicroBatcher(lambda items: [item * 2 for item in items], max_batch_size=4, max_wait_ms=50)
+        await batcher.start()
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+        await batcher.stop()
+        return results, list(batcher.batch_sizes), batcher.metrics()
+
+    results, sizes, metrics = asyncio.run(run())
+    assert results == [i * 2 for i in range(10)]
+    assert sizes == [4, 4, 2]
+    assert metrics["items"] == 10 and metrics["latency"]["p50_ms"] >= 0
+
+def test_micro_batcher_reports_errors_to_every_caller():
+    async def run():
+        def fail(items):
+            raise RuntimeError("model unavailable")
+        batcher = MicroBatcher(fail, max_wait_ms=1)
+        await batcher.start()
+        outcomes = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+        await batcher.stop()
+        return outcomes, batcher.errors
+
+    outcomes, errors = asyncio.run(run())
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes) and errors == 2
+
+def test_micro_batcher_rejects_items_beyond_the_queue_bound():
+    import threading
+
+    async def run():
+        release = threading.Event()
+        def slow(items):
+            release.wait(5)
+            return items
+        batcher = MicroBatcher(slow, max_batch_size=1, max_wait_ms=1, max_queue=2)
+        await batcher.start()
+        first = asyncio.ensure_future(batcher.submit(0))
+        await asyncio.sleep(0.05)  # item 0 is in the blocked batch, the queue is empty
+        queued = asyncio.ensure_future(batcher.submit_many([1, 2]))
+        await asyncio.sleep(0)
+        with pytest.raises(asyncio.QueueFull):
+            await batcher.submit(3)
+        release.set()
+        results = await first, await queued
+        await batcher.stop()
+        return results, batcher.metrics()
+
+    results, metrics = asyncio.run(run())
+    assert results == (0, [1, 2])
+    assert metrics["rejected"] == 1 and metrics["items"] == 3
+
+def test_micro_batcher_fails_items_without_a_result_and_on_stop():
+    import threading
+
+    async def run():
+        short = MicroBatcher(lambda items: items[:1], max_batch_size=3, max_wait_ms=20)
+        await short.start()
+        short_outcomes = await asyncio.gather(*(short.submit(i) for i in range(3)), return_exceptions=True)
+        await short.stop()
+
+        release = threading.Event()
+        def blocked(items):
+            release.wait(5)
+            return items
+        stopped = MicroBatcher(blocked, max_batch_size=1, max_wait_ms=1)
+        await stopped.start()
+        pending = [asyncio.ensure_future(stopped.submit(i)) for i in range(3)]
+        await asyncio.sleep(0.05)
+        await stopped.stop()
+        release.set()
+        stop_outcomes = await asyncio.gather(*pending, return_exceptions=True)
+        return short_outcomes, short.errors, stop_outcomes
+
+    short_outcomes, short_errors, stop_outcomes = asyncio.run(run())
+    assert short_outcomes[0] == 0 and short_errors == 2
+    assert all(isinstance(outcome, RuntimeError) for outcome in short_outcomes[1:])
+    assert all(isinstance(outcome, RuntimeError) for outcome in stop_outcomes)
+
+async def _request(port, method, path, payload=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    while (await reader.readline()) != b"\r\n":
+        pass
+    data = json.loads(await reader.read())
+    writer.close()
+    return status, data
+
+def test_http_requests_are_coalesced_into_batches():
+    async def run():
+        ready = asyncio.get_running_loop().create_future()
+        server = asyncio.create_task(serve(_upper, port=0, max_batch_size=8, max_wait_ms=30, ready=ready,
+                                           max_queue=8))
+        port = await ready
+        responses = await asyncio.gather(*(
+            _request(port, "POST", "/assign", {"responses": [{"response": f"r{i}", "region": "Caribe"}]})
+            for i in range(6)
+        ))
+        bad = await _request(port, "POST", "/assign", {"responses": []})
+        too_many = await _request(port, "POST", "/assign", {"responses": ["r"] * 9})
+        metrics = await _request(port, "GET", "/metrics")
+        server.cancel()
+        return responses, bad, too_many, metrics
+
+    responses, bad, too_many, metrics = asyncio.run(run())
+    status, data = responses[0]
+    assert status == 200
+    assert data["results"] == [{"region": "Caribe", "topic": 2, "text": "R0"}]
+    assert "latency_ms" in data
+    assert bad[0] == 400
+    assert too_many[0] == 503 and metrics[1]["rejected"] == 9
+    assert metrics[1]["items"] == 6 and metrics[1]["batches"] < 6
+
+def test_run_service_records_no_spans(monkeypatch):
+    import src.modeling
+    import src.service
+    from src.instrumentation import span, tracer
+
+    async def fake_serve(process_batch, *args, **kwargs):
+        with span("service_batch"):
+            pass
+
+    monkeypatch.setattr(src.modeling, "load_topic_model", lambda path: object())
+    monkeypatch.setattr(src.service, "serve", fake_serve)
+    recorded = len(tracer.records)
+    src.service.run_service()
+    assert len(tracer.records) == recorded and tracer.enabled
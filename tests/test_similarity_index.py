@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+from src.similarity_index import SimilarityIndex
+from src.text_pipeline import TextPipeline
+
+def _index(n=500, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((n, dim)).astype(np.float32)
+    inverse = np.concatenate([np.arange(n), [0, 0, 1]])
+    df = pd.DataFrame({
+        "response": [f"respuesta {i}" for i in inverse],
+        "region": np.where(inverse % 2 == 0, "Caribe", "Andina"),
+        "Topic": inverse % 5,
+    })
+    return SimilarityIndex.from_labeled(embeddings, df, inverse), embeddings
+
+def test_exact_search_matches_brute_force():
+    index, embeddings = _index()
+    queries = embeddings[:3] + 0.01
+
+    ids, scores = index.search(queries, k=5, block_size=64)
+
+    normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    expected = np.argsort(-(queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ normalized.T, axis=1)[:, :5]
+    np.testing.assert_array_equal(ids, expected)
+    assert ids[0, 0] == 0 and np.all(np.diff(scores, axis=1) <= 0)
+    assert list(index.metadata["Count"][:3]) == [3, 2, 1]
+
+def test_ivf_search_with_all_lists_is_exact():
+    index, embeddings = _index()
+    index.build_ivf(n_lists=8)
+    exact_ids, _ = index.search(embeddings[:10], k=4)
+    ivf_ids, _ = index.search(embeddings[:10], k=4, n_probe=8)
+    np.testing.assert_array_equal(ivf_ids, exact_ids)
+    assert sorted(index.list_members) == list(range(len(index)))
+
+def test_search_filters_by_metadata():
+    index, embeddings = _index()
+    ids, _ = index.search(embeddings[:4], k=6, region="Andina")
+    assert set(index.metadata["region"].iloc[ids.ravel()]) == {"Andina"}
+
+def test_query_by_text_after_save_and_load(tmp_path):
+    from src.embedding_backends import HashingBackend
+    docs = ["No hay empleo local", "Cortes de luz frecuentes", "Falta de acceso al agua potable",
+            "No hay atencion medica cerca"]
+    # The index embeds the cleaned text, as a fit does
+    clean = TextPipeline(lemmatize=False).clean(pd.Series(docs)).tolist()
+    backend = HashingBackend(n_components=3).fit(clean)
+    df = pd.DataFrame({"response": docs, "region": ["Caribe", "Andina", "Caribe", "Pacifico"], "Topic": [0, 1, 1, 2]})
+    SimilarityIndex.from_labeled(backend.encode(clean), df, np.arange(4), backend).save(str(tmp_path))
+
+    results = SimilarityIndex.load(str(tmp_path)).query("no hay empleo", k=2)
+
+    assert list(results["rank"]) == [1, 2]
+    assert results["response"].iloc[0] == "No hay empleo local"
+    assert results["region"].iloc[0] == "Caribe"
+
+def test_filters_match_any_respondent_of_a_response(tmp_path):
+    embeddings = np.eye(3, dtype=np.float32)
+    inverse = np.array([0, 0, 0, 1, 2])
+    df = pd.DataFrame({
+        "response": ["no hay agua"] * 3 + ["cortes de luz", "falta empleo"],
+        "region": ["Caribe", "Andina", "Andina", "Caribe", "Pacifico"],
+        "group": ["A", "B", "B", "A", "B"],
+    })
+    index = SimilarityIndex.from_labeled(embeddings, df, inverse)
+    assert list(index.metadata["region"]) == ["Andina", "Caribe", "Pacifico"]
+
+    ids, _ = index.search(embeddings[0], k=3, region="Caribe")
+    assert sorted(ids[0][ids[0] >= 0]) == [0, 1]
+    ids, _ = index.search(embeddings[0], k=3, region="Caribe", group="A")
+    assert sorted(ids[0][ids[0] >= 0]) == [0, 1]
+    ids, _ = index.search(embeddings[0], k=3, region="Andina", group="A")
+    assert (ids == -1).all()
+
+    index.save(str(tmp_path))
+    loaded = SimilarityIndex.load(str(tmp_path))
+    ids, _ = loaded.search(embeddings[0], k=3, region="Caribe")
+    assert sorted(ids[0][ids[0] >= 0]) == [0, 1]
+    assert loaded._facet_counts({"region": "Andina"}).tolist() == [2, 0, 0]
+
+def test_query_embeds_the_cleaned_text():
+    class RecordingBackend:
+        def encode(self, texts):
+            self.texts = list(texts)
+            return np.ones((len(texts), 2), dtype=np.float32)
+
+    backend = RecordingBackend()
+    df = pd.DataFrame({"response": ["a", "b"], "Topic": [0, 1]})
+    index = SimilarityIndex.from_labeled(np.eye(2, dtype=np.float32), df, np.arange(2), backend)
+    index.query("¡No hay AGUA en el barrio!", k=1)
+    assert backend.texts == TextPipeline(lemmatize=False).clean(pd.Series(["¡No hay AGUA en el barrio!"])).tolist()
@@ -0,0 +1,115 @@
+from src.stage_graph import Stage, StageGraph
+
+CALLS = []
+
+def double(numbers):
+    CALLS.append("double")
+    return {"doubled": [n * 2 for n in numbers]}
+
+def total(doubled, offset=0):
+    CALLS.append("total")
+    return {"total": sum(doubled) + offset}
+
+def make_graph(cache_dir, offset=0):
+    return StageGraph([
+        Stage("double", double, inputs=["numbers"], outputs=["doubled"]),
+        Stage("total", total, inputs=["doubled"], outputs=["total"], params={"offset": offset}),
+    ], cache_dir=str(cache_dir))
+
+def test_unchanged_stages_are_skipped(tmp_path):
+    CALLS.clear()
+    assert make_graph(tmp_path).run({"numbers": [1, 2, 3]}) == {"total": 12}
+    graph = make_graph(tmp_path)
+    assert graph.run({"numbers": [1, 2, 3]}) == {"total": 12}
+
+    assert CALLS == ["double", "total"]
+    assert [status for _, status, _ in graph.report] == ["cached", "cached"]
+
+def test_parameter_change_only_reruns_downstream_stage(tmp_path):
+    CALLS.clear()
+    make_graph(tmp_path).run({"numbers": [1, 2, 3]})
+    assert make_graph(tmp_path, offset=10).run({"numbers": [1, 2, 3]}) == {"total": 22}
+    assert CALLS == ["double", "total", "total"]
+
+def test_input_change_reruns_everything(tmp_path):
+    CALLS.clear()
+    make_graph(tmp_path).run({"numbers": [1, 2, 3]})
+    assert make_graph(tmp_path).run({"numbers": [1, 2, 4]}) == {"total": 14}
+    assert CALLS == ["double", "total", "double", "total"]
+
+def test_force_reruns_downstream_stages(tmp_path):
+    CALLS.clear()
+    make_graph(tmp_path).run({"numbers": [1, 2, 3]})
+    graph = make_graph(tmp_path)
+    graph.run({"numbers": [1, 2, 3]}, force=["double"])
+    assert CALLS == ["double", "total", "double", "total"]
+    assert [status for _, status, _ in graph.report] == ["ran", "ran"]
+
+def test_missing_output_file_reruns_stage(tmp_path):
+    CALLS.clear()
+    written = tmp_path / "total.txt"
+
+    def write_total(doubled):
+        CALLS.append("write")
+        written.write_text(str(sum(doubled)))
+        return {"written": str(written)}
+
+    def graph():
+        return StageGraph([
+            Stage("double", double, inputs=["numbers"], outputs=["doubled"]),
+            Stage("write", write_total, inputs=["doubled"], outputs=["written"], files=[str(written)]),
+        ], cache_dir=str(tmp_path / "cache"))
+
+    graph().run({"numbers": [1, 2]})
+    graph().run({"numbers": [1, 2]})
+    written.unlink()
+    graph().run({"numbers": [1, 2]})
+    assert CALLS == ["double", "write", "write"]
+    assert written.read_text() == "6"
+
+def test_key_covers_code_of_called_modules(tmp_path, monkeypatch):
+    import sys
+    package = tmp_path / "stagepkg"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    (package / "helpers.py").write_text("def scale(x):\n    return x * 2\n")
+    (package / "stages.py").write_text(
+        "from stagepkg.helpers import scale\n\n"
+        "def run(numbers):\n    return {'scaled': [scale(n) for n in numbers]}\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    from stagepkg.stages import run
+
+    stage = Stage("scale", run, inputs=["numbers"], outputs=["scaled"])
+    before = stage.key({})
+    (package / "helpers.py").write_text("def scale(x):\n    return x * 3\n")
+    assert stage.key({}) != before
+    for name in ("stagepkg", "stagepkg.stages", "stagepkg.helpers"):
+        sys.modules.pop(name, None)
+
+def test_output_file_changed_outside_the_graph_reruns_stage(tmp_path):
+    import os
+    CALLS.clear()
+    written = tmp_path / "total.txt"
+
+    def write_total(doubled):
+        CALLS.append("write")
+        written.write_text(str(sum(doubled)))
+        return {"written": str(written)}
+
+    def graph():
+        return StageGraph([
+            Stage("double", double, inputs=["numbers"], outputs=["doubled"]),
+            Stage("write", write_total, inputs=["doubled"], outputs=["written"], files=[str(written)]),
+        ], cache_dir=str(tmp_path / "cache"))
+
+    graph().run({"numbers": [1, 2]})
+    graph().run({"numbers": [1, 2]})
+    # Another command overwrites the file
+    written.write_text("overwritten")
+    os.utime(written, ns=(0, 0))
+    second = graph()
+    second.run({"numbers": [1, 2]})
+    assert CALLS == ["double", "write", "write"]
+    assert [status for _, status, _ in second.report] == ["cached", "ran"]
+    assert written.read_text() == "6"
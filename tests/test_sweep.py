@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+from src.sweep import expand_grid, npmi_coherence, sweep, term_mask, HDBSCAN_PARAMS
+
+def test_expand_grid_fills_defaults():
+    combinations = expand_grid({"min_topic_size": [5, 10], "min_df": [1]}, HDBSCAN_PARAMS)
+    assert combinations == [
+        {"min_topic_size": 5, "min_samples": None, "cluster_selection_method": "eom"},
+        {"min_topic_size": 10, "min_samples": None, "cluster_selection_method": "eom"},
+    ]
+
+def test_term_mask_matches_vectorizer_fitted_per_topic():
+    from sklearn.feature_extraction.text import CountVectorizer
+
+    topic_docs = ["agua luz agua", "agua salud", "luz vias", "agua empleo vias"]
+    counts = CountVectorizer().fit_transform(topic_docs)
+    for min_df, max_df in ((1, 1.0), (2, 0.95), (2, 0.7), (0.5, 3)):
+        expected = CountVectorizer(min_df=min_df, max_df=max_df).fit(topic_docs).get_feature_names_out()
+        kept = CountVectorizer().fit(topic_docs).get_feature_names_out()[term_mask(counts, min_df, max_df)]
+        assert list(kept) == list(expected)
+
+def test_npmi_coherence_bounds():
+    presence = sparse.csc_matrix(np.array([[1, 1, 0], [1, 1, 0], [0, 0, 1]], dtype=float))
+    assert npmi_coherence(presence, [np.array([0, 1])]) == pytest.approx(1.0)
+    assert npmi_coherence(presence, [np.array([0, 2])]) == -1.0
+    assert np.isnan(npmi_coherence(presence, [np.array([0])]))
+
+def test_sweep_reduces_once_per_setting_and_reports_every_configuration():
+    from sklearn.decomposition import PCA
+
+    rng = np.random.default_rng(0)
+    themes = ["agua potable cortes", "empleo jovenes oportunidades", "salud medicamentos hospital"]
+    docs = [f"{themes[i % 3]} {word}" for i, word in enumerate(rng.choice(["zona", "barrio", "vereda"], 90))]
+    embeddings = np.vstack([np.eye(3)[i % 3] + rng.normal(0, 0.05, 3) for i in range(90)]).astype(np.float32)
+
+    reductions = []
+    def reducer(params, seed):
+        reductions.append(params)
+        return PCA(params["n_components"], random_state=seed)
+
+    grid = {"n_components": [2, 3], "min_topic_size": [5, 10], "min_df": 1, "max_df": [0.95, 1.0]}
+    results = sweep(docs, grid, embeddings=embeddings, embedding_model=object(), n_jobs=1, reducer=reducer)
+
+    assert [params["n_components"] for params in reductions] == [2, 3]
+    assert len(results) == 8
+    assert {"n_topics", "outlier_share", "vocabulary", "coherence"} <= set(results.columns)
+    assert (results["n_topics"] == 3).all()
+    assert (results["outlier_share"] == 0).all()
+    # Words shared by every topic only pass max_df=1.0, and dilute coherence
+    strict, loose = results[results["max_df"] == 0.95], results[results["max_df"] == 1.0]
+    assert (strict["vocabulary"] == 9).all() and (loose["vocabulary"] == 12).all()
+    assert (strict["coherence"] == 1.0).all()
+    assert (loose["coherence"] < 1.0).all()
+
+def test_sweep_rejects_unknown_parameters():
+    with pytest.raises(ValueError, match="min_topics"):
+        sweep(["a"], {"min_topics": [5]})
+
+def test_score_counts_each_distinct_document_once(monkeypatch):
+    import src.sweep as sweep_module
+
+    seen = []
+    def top_terms(topic_term, top_n):
+        seen.append(topic_term.toarray())
+        return [np.arange(min(top_n, topic_term.shape[1]))] * topic_term.shape[0]
+    monkeypatch.setattr(sweep_module, "ctfidf_top_terms", top_terms)
+
+    doc_term = sparse.csr_matrix(np.array([[1, 0], [0, 1], [1, 1]], dtype=float))
+    labels = np.array([0, 0, -1])
+    sweep_module._init_worker(doc_term, np.array([100.0, 1.0, 1.0]), [{"min_df": 1, "max_df": 1.0}], 2)
+    scores = sweep_module._score(labels, {"min_df": 1, "max_df": 1.0})
+
+    np.testing.assert_array_equal(seen[0], [[1, 1], [1, 1]])
+    assert scores["outlier_share"] == round(1 / 102, 4)
+
+def test_topic_vectorizer_keeps_every_term_with_too_few_topics():
+    from src.modeling import make_vectorizer
+
+    topic_docs = ["agua luz", "agua salud"]
+    vectorizer = make_vectorizer(min_df=2, max_df=0.95, stop_words=())
+    assert list(vectorizer.fit(topic_docs).get_feature_names_out()) == ["agua", "luz", "salud"]
+    assert (vectorizer.min_df, vectorizer.max_df) == (2, 0.95)
+    counts = vectorizer.transform(topic_docs)
+    assert term_mask(counts, 2, 0.95).all()
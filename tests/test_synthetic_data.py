@@ -0,0 +1,25 @@
+import pandas as pd
+from src.synthetic_data_generator import generate_dataset, regions, write_dataset
+
+def test_generate_dataset_is_seeded():
+    first = generate_dataset(500, seed=7)
+    second = generate_dataset(500, seed=7)
+    pd.testing.assert_frame_equal(first, second)
+    assert list(first.columns) == ["region", "group", "question", "response"]
+
+def test_region_skew_favors_first_region():
+    df = generate_dataset(5000, seed=0, region_skew=2.0)
+    counts = df["region"].value_counts()
+    assert counts.idxmax() == regions[0]
+
+def test_duplicate_rate_repeats_responses():
+    unique_share = generate_dataset(2000, seed=0, noise_rate=1.0)["response"].nunique()
+    duplicated_share = generate_dataset(2000, seed=0, noise_rate=1.0, duplicate_rate=0.5)["response"].nunique()
+    assert duplicated_share < unique_share
+
+def test_write_dataset_streams_chunks(tmp_path):
+    path = str(tmp_path / "survey.csv")
+    write_dataset(1050, path, chunksize=200, seed=3)
+    df = pd.read_csv(path)
+    assert len(df) == 1050
+    assert df["response"].notna().all()
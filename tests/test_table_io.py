@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+from src.table_io import append_table, read_table, table_path, write_table
+
+def _labeled_frame():
+    return pd.DataFrame({
+        "response": ["a", "b", "c"],
+        "region": ["Norte", "Sur", "Norte"],
+        "group": ["g1", "g2", "g1"],
+        "question": ["q1", "q1", "q2"],
+        "Topic": [0, -1, 2],
+        "Topic_Probability": [0.9, 0.0, 0.5],
+    })
+
+def test_append_table_keeps_existing_header(tmp_path):
+    path = str(tmp_path / "df_with_topics.csv")
+    append_table(pd.DataFrame({"response": ["a"], "Topic": [0]}), path)
+    append_table(pd.DataFrame({"Topic": [3], "response": ["b"]}), path)
+
+    result = pd.read_csv(path)
+    assert list(result.columns) == ["response", "Topic"]
+    assert list(result["Topic"]) == [0, 3]
+
+def test_parquet_round_trip_keeps_compact_dtypes(tmp_path):
+    pytest.importorskip("pyarrow")
+    path = table_path("df_with_topics", "parquet", str(tmp_path))
+    write_table(_labeled_frame(), path)
+
+    result = read_table(path)
+    assert isinstance(result["region"].dtype, pd.CategoricalDtype)
+    assert result["Topic"].dtype == "int8"
+    assert result["Topic_Probability"].dtype == "float32"
+    assert list(result["response"]) == ["a", "b", "c"]
+
+    projected = read_table(path, columns=["region", "Topic"])
+    assert list(projected.columns) == ["region", "Topic"]
+
+def test_parquet_append(tmp_path):
+    pytest.importorskip("pyarrow")
+    path = table_path("df_with_topics", "parquet", str(tmp_path))
+    append_table(_labeled_frame(), path)
+    append_table(_labeled_frame().iloc[:1], path)
+
+    result = read_table(path)
+    assert len(result) == 4
+    assert list(result["region"].astype(str)) == ["Norte", "Sur", "Norte", "Norte"]
+
+def test_parquet_append_writes_one_part_per_wave(tmp_path):
+    pytest.importorskip("pyarrow")
+    import os
+    path = table_path("df_with_topics", "parquet", str(tmp_path))
+    write_table(_labeled_frame(), path)
+    append_table(_labeled_frame().iloc[:2], path)
+    first_part = open(os.path.join(path, "part-00000.parquet"), "rb").read()
+    append_table(_labeled_frame().iloc[[2]].assign(Topic=300), path)
+
+    assert sorted(os.listdir(path)) == ["part-00000.parquet", "part-00001.parquet", "part-00002.parquet"]
+    assert open(os.path.join(path, "part-00000.parquet"), "rb").read() == first_part
+    result = read_table(path)
+    assert list(result["Topic"]) == [0, -1, 2, 0, -1, 300]
+    assert list(result["response"]) == ["a", "b", "c", "a", "b", "c"]
+
+    write_table(_labeled_frame(), path)
+    assert os.path.isfile(path) and len(read_table(path)) == 3
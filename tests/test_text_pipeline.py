@@ -0,0 +1,64 @@
+import pandas as pd
+from src.text_pipeline import TextPipeline
+
+def test_process_adds_embedding_text_and_tokens():
+    df = pd.DataFrame({
+        "region": ["Caribe", "Andina", "Caribe"],
+        "response": ["No hay empleo local en mi comunidad", "Cortes de luz frecuentes", "No hay empleo local"]
+    })
+    result = TextPipeline(lemmatize=False).process(df)
+
+    assert list(result["response_clean"]) == ["no hay empleo local", "cortes luz frecuentes", "no hay empleo local"]
+    assert list(result["response_tokens"]) == list(result["response_clean"])
+    assert "response_clean" not in df.columns
+
+def test_stop_words_are_shared_by_cleaning_and_vectorizer():
+    pipeline = TextPipeline(lemmatize=False, stop_words={"de", "luz", "no"}, keep_words={"no"})
+    clean, tokens = pipeline.transform(pd.Series(["No hay cortes de luz"]))
+
+    assert pipeline.stop_words == {"de", "luz"}
+    assert list(clean) == ["no hay cortes"]
+    vectorizer = pipeline.make_vectorizer(min_df=1, max_df=1.0).fit(["cortes de luz en la vereda"])
+    assert list(vectorizer.get_feature_names_out()) == ["cortes", "en", "la", "vereda"]
+
+def test_unique_documents_aligns_tokens_with_embedding_text():
+    df = pd.DataFrame({
+        "response_clean": ["no hay agua", "cortes luz", "no hay agua"],
+        "response_tokens": ["hay agua", "corte luz", "hay agua"]
+    })
+    embedding_docs, vectorizer_docs, inverse, counts = TextPipeline.unique_documents(df)
+
+    assert embedding_docs == ["no hay agua", "cortes luz"]
+    assert vectorizer_docs == ["hay agua", "corte luz"]
+    assert list(inverse) == [0, 1, 0]
+    assert list(counts) == [2, 1]
+
+def test_peak_memory_stays_near_raw_size(tmp_path):
+    import os
+    import subprocess
+    import sys
+    from src.synthetic_data_generator import write_dataset
+
+    path = tmp_path / "survey.csv"
+    write_dataset(200_000, str(path), seed=0)
+    raw_mb = os.path.getsize(path) / 2**20
+
+    # A fresh interpreter, so the peak RSS covers only load, deduplication and labeling
+    script = (
+        "import sys, numpy as np\n"
+        "from src.instrumentation import peak_rss_mb\n"
+        "from src.text_pipeline import TextPipeline\n"
+        "from src.post_process_topic_model import assign_topics_to_docs\n"
+        "base = peak_rss_mb()\n"
+        "df = TextPipeline(lemmatize=False).load(sys.argv[1])\n"
+        "_, docs, inverse, _ = TextPipeline.unique_documents(df)\n"
+        "df = assign_topics_to_docs(df, np.arange(len(docs)) % 20, np.full(len(docs), 0.5), inverse=inverse)\n"
+        "print(peak_rss_mb() - base, df.memory_usage(deep=True).sum() / 2**20)\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", script, str(path)], cwd=root,
+                            capture_output=True, text=True, check=True)
+    peak_mb, frame_mb = map(float, result.stdout.split()[-2:])
+
+    assert frame_mb < 0.5 * raw_mb
+    assert peak_mb < 2.5 * raw_mb
@@ -0,0 +1,46 @@
+import pandas as pd
+from src.topic_cube import TopicCube
+
+def make_df():
+    return pd.DataFrame({
+        "region": ["Caribe", "Andina", "Caribe", "Amazonas", "Andina", "Caribe"],
+        "group": ["Mujeres", "Jovenes", "Jovenes", "Mujeres", "Mujeres", "Mujeres"],
+        "question": ["q1", "q1", "q2", "q2", "q1", "q1"],
+        "Topic": [0, 1, 0, -1, 1, 2]
+    })
+
+def test_crosstab_matches_pandas():
+    df = make_df()
+    cube = TopicCube.from_frame(df)
+
+    for dim in ("region", "group", "question"):
+        expected = pd.crosstab(df[dim], df["Topic"])
+        pd.testing.assert_frame_equal(cube.crosstab(dim), expected, check_dtype=False, check_names=False)
+    expected = pd.crosstab(df["region"], df["Topic"], normalize="index")
+    pd.testing.assert_frame_equal(cube.crosstab("region", normalize="index"), expected,
+                                  check_dtype=False, check_names=False)
+
+def test_rollup_select_and_merge(tmp_path):
+    df = make_df()
+    cube = TopicCube.from_frame(df)
+
+    assert cube.total == len(df)
+    assert cube.rollup("Topic").to_dict() == {-1: 1, 0: 2, 1: 2, 2: 1}
+    assert cube.select(question="q1").rollup("region").to_dict() == {"Amazonas": 0, "Andina": 2, "Caribe": 2}
+
+    cube.save(tmp_path / "cube.npz")
+    merged = TopicCube.load(tmp_path / "cube.npz").merge(TopicCube.from_frame(df.iloc[:2]))
+    assert merged.rollup("region").to_dict() == {"Amazonas": 1, "Andina": 3, "Caribe": 4}
+
+def test_run_analysis_uses_saved_cube(tmp_path, monkeypatch):
+    from src.topic_analysis import run_analysis
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "visuals").mkdir()
+    (tmp_path / "outputs").mkdir()
+    df = make_df().assign(response=list("abcdef"), Topic_Probability=0.5)
+    df.to_csv("outputs/df_with_topics.csv", index=False)
+    # A saved cube that differs from the table shows which one was used
+    (tmp_path / "outputs" / "analysis_state").mkdir()
+    TopicCube.from_frame(df.iloc[:3]).save("outputs/analysis_state/topic_cube.npz")
+    region_dist, _, _ = run_analysis()
+    assert list(region_dist.index) == ["Andina", "Caribe"]